@@ -1,9 +1,13 @@
 ## @file app_runner.py
 #  @brief Główna jednostka uruchamiająca aplikację GUI do podpisu cyfrowego.
-from gui import SignatureInterface
 
 ## @brief Punkt wejścia aplikacji.
-#  Tworzy i uruchamia interfejs użytkownika.
-if __name__ == "__main__":
+#  Tworzy i uruchamia interfejs użytkownika. GUI importowane jest dopiero tutaj, więc import modułu
+#  (np. przez narzędzia działające bez ekranu) nie ładuje tkinter.
+def main():
+    from gui import SignatureInterface
     app = SignatureInterface()
     app.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+## @file batch_signer.py
+#  @brief Wsadowe (bez GUI) podpisywanie wielu dokumentów PDF z użyciem puli wątków lub procesów.
+import argparse
+import functools
+import getpass
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_backends
+from cryptography.hazmat.primitives import serialization
+from utils import DigitalSigner, KeyDecryptor, MerkleProof, SignatureManifest, StreamHasher
+
+## @brief Klucz prywatny załadowany w procesie roboczym (tryb puli procesów).
+_worker_signer = None
+
+## @brief Inicjalizuje proces roboczy - ładuje klucz prywatny raz na proces.
+#  @param key_der Klucz prywatny w formacie DER (PKCS8).
+#  @param hash_name Algorytm skrótu treści dokumentów.
+def _init_worker(key_der, hash_name):
+    global _worker_signer
+    _worker_signer = DigitalSigner(serialization.load_der_private_key(key_der, password=None), hash_name=hash_name)
+
+## @brief Podpisuje pojedynczy plik w procesie roboczym.
+def _sign_in_worker(source_path, target_path, detached, incremental, verify_prefix):
+    return BatchSigner.sign_one(_worker_signer, source_path, target_path, detached, incremental, verify_prefix)
+
+## @class BatchSigner
+#  @brief Podpisuje wiele plików jednym, raz odszyfrowanym kluczem prywatnym.
+class BatchSigner:
+    ## @brief Konstruktor klasy.
+    #  @param private_key Odszyfrowany klucz prywatny RSA.
+    #  @param workers Liczba równoległych zadań (None - liczba rdzeni).
+    #  @param use_processes True - pula procesów, False - pula wątków.
+    #  @param output_dir Katalog na podpisane pliki (None - obok oryginałów).
+    #  @param detached True - zamiast podpisanej kopii zapisywany jest plik ".sig".
+    #  @param incremental True - plik ".sig" z podpisem łańcuchowym, przedłużanym o dopisane bajty.
+    #  @param hash_name Algorytm skrótu treści dokumentów (z rejestru hash_backends).
+    #  @param verify_prefix True - w trybie incremental przed podpisem sprawdzana jest niezmienność
+    #  już podpisanej części (pełny odczyt dokumentu).
+    def __init__(self, private_key, workers=None, use_processes=False, output_dir=None, detached=False,
+                 incremental=False, hash_name=hash_backends.DEFAULT_ALGORITHM, verify_prefix=False):
+        self.key = private_key
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.output_dir = output_dir
+        self.detached = detached
+        self.incremental = incremental
+        self.hash_name = hash_name
+        self.verify_prefix = verify_prefix
+
+    ## @brief Odszyfrowuje klucz z pliku (jednokrotnie) i tworzy obiekt BatchSigner.
+    #  @param key_path Ścieżka do pliku private_encrypted.pem.
+    #  @param pin Kod PIN.
+    #  @return Obiekt BatchSigner.
+    @classmethod
+    def from_encrypted_key(cls, key_path, pin, **options):
+        with open(key_path, 'rb') as enc_file:
+            encrypted_key = enc_file.read()
+        return cls(KeyDecryptor(encrypted_key, pin).get_private_key(), **options)
+
+    ## @brief Zbiera listę plików do podpisania.
+    #  @param directory Katalog z plikami PDF (bez podkatalogów).
+    #  @param pattern Wzorzec glob (obsługuje "**").
+    #  @param manifest Plik tekstowy z jedną ścieżką w wierszu; ścieżki względne liczone od katalogu manifestu.
+    #  @return Posortowana lista ścieżek bez duplikatów.
+    @staticmethod
+    def collect_inputs(directory=None, pattern=None, manifest=None):
+        paths = set()
+        if directory:
+            paths.update(p for p in glob.glob(os.path.join(directory, "*.pdf"))
+                         if not p.endswith("_signed.pdf"))
+        if pattern:
+            paths.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+        if manifest:
+            base = os.path.dirname(os.path.abspath(manifest))
+            with open(manifest, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        paths.add(os.path.join(base, line))
+        return sorted(paths)
+
+    ## @brief Wyznacza ścieżkę pliku wynikowego dla danego dokumentu.
+    #  W output_dir zachowywana jest ścieżka względna wobec katalogu wejściowego, więc pliki o tej samej
+    #  nazwie z różnych katalogów nie nadpisują się nawzajem.
+    #  @param source_path Ścieżka dokumentu źródłowego.
+    #  @param input_root Wspólny katalog dokumentów wejściowych (None - katalog samego dokumentu).
+    #  @return Ścieżka podpisanej kopii (lub pliku ".sig" w trybie detached).
+    def target_for(self, source_path, input_root=None):
+        if self.detached or self.incremental:
+            name = os.path.basename(SignatureManifest.sidecar_path(source_path))
+        else:
+            stem, ext = os.path.splitext(os.path.basename(source_path))
+            name = f"{stem}_signed{ext or '.pdf'}"
+        return os.path.join(self.output_directory(source_path, input_root), name)
+
+    ## @brief Wyznacza katalog pliku wynikowego dla danego dokumentu.
+    #  @param source_path Ścieżka dokumentu źródłowego.
+    #  @param input_root Wspólny katalog dokumentów wejściowych (None - katalog samego dokumentu).
+    #  @return Katalog w output_dir odpowiadający katalogowi dokumentu albo katalog dokumentu.
+    def output_directory(self, source_path, input_root=None):
+        source_dir = os.path.dirname(os.path.abspath(source_path))
+        if not self.output_dir:
+            return os.path.dirname(source_path)
+        relative = os.path.relpath(source_dir, input_root or source_dir)
+        return os.path.normpath(os.path.join(self.output_dir, relative))
+
+    ## @brief Zwraca najgłębszy katalog wspólny dla wszystkich dokumentów.
+    #  @param paths Lista ścieżek.
+    @staticmethod
+    def input_root(paths):
+        if not paths:
+            return None
+        return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+
+    ## @brief Wyznacza pliki wynikowe całej partii i tworzy potrzebne katalogi.
+    #  @param paths Lista ścieżek do podpisania.
+    #  @param target Funkcja (ścieżka, katalog wejściowy) -> ścieżka pliku wynikowego.
+    #  @return Lista ścieżek plików wynikowych w kolejności paths.
+    #  @throw ValueError gdy dwa dokumenty dają ten sam plik wynikowy (żaden plik nie jest wtedy podpisywany).
+    def plan_targets(self, paths, target=None):
+        target = target or self.target_for
+        root = self.input_root(paths)
+        targets = [target(p, root) for p in paths]
+        owners = {}
+        for path, output in zip(paths, targets):
+            previous = owners.setdefault(os.path.abspath(output), path)
+            if previous != path:
+                raise ValueError(f"{previous} and {path} would both be written to {output}")
+        for directory in {os.path.dirname(t) for t in targets}:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        return targets
+
+    ## @brief Podpisuje jeden plik i zwraca wynik operacji.
+    #  @param signer Obiekt DigitalSigner.
+    #  @param source_path Ścieżka dokumentu źródłowego.
+    #  @param target_path Ścieżka podpisanej kopii (lub pliku ".sig").
+    #  @param detached True - zapisywany jest podpis odłączony zamiast kopii dokumentu.
+    #  @param incremental True - podpis łańcuchowy przedłużany o bajty dopisane od poprzedniego podpisu.
+    #  @param verify_prefix True - przy incremental sprawdzana jest niezmienność już podpisanej części.
+    #  @return Słownik z polami path, output, bytes, seconds, error.
+    @staticmethod
+    def sign_one(signer, source_path, target_path, detached=False, incremental=False, verify_prefix=False):
+        started = time.perf_counter()
+        result = {"path": source_path, "output": target_path, "bytes": 0, "seconds": 0.0, "error": None}
+        try:
+            result["bytes"] = os.path.getsize(source_path)
+            if incremental:
+                signer.sign_incremental(source_path, target_path, verify_prefix=verify_prefix)
+            elif detached:
+                signer.sign_detached(source_path, target_path)
+            else:
+                signer.sign_file(source_path, target_path)
+        except Exception as error:
+            result["error"] = f"{type(error).__name__}: {error}"
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    ## @brief Podpisuje wszystkie podane pliki równolegle.
+    #  @param paths Lista ścieżek do podpisania.
+    #  @param on_result Opcjonalny callback wywoływany dla każdego zakończonego pliku.
+    #  @return Krotka (lista wyników, podsumowanie przepustowości).
+    #  @throw ValueError gdy dwa dokumenty dają ten sam plik wynikowy.
+    def sign_all(self, paths, on_result=None):
+        targets = self.plan_targets(paths)
+        results = []
+        started = time.perf_counter()
+
+        if self.use_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            key_der = self.key.private_bytes(
+                encoding=serialization.Encoding.DER,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption())
+            pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(key_der, self.hash_name))
+            job = _sign_in_worker
+        else:
+            signer = DigitalSigner(self.key, hash_name=self.hash_name)
+            pool = ThreadPoolExecutor(self.workers)
+            job = lambda src, dst, detached, incremental, verify_prefix: BatchSigner.sign_one(
+                signer, src, dst, detached, incremental, verify_prefix)
+
+        count = len(paths)
+        with pool:
+            for result in pool.map(job, paths, targets, [self.detached] * count, [self.incremental] * count,
+                                   [self.verify_prefix] * count):
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        return results, BatchSigner.summarize(results, time.perf_counter() - started)
+
+    ## @brief Podpisuje wszystkie pliki jednym manifestem podpisów odłączonych.
+    #  Pliki hashowane są równolegle, a podpisywany jest tylko manifest - jedna operacja RSA na partię.
+    #  @param paths Lista ścieżek do podpisania.
+    #  @param manifest_path Ścieżka pliku manifestu.
+    #  @return Krotka (obiekt SignatureManifest, podsumowanie przepustowości).
+    #  @throw ValueError gdy plik manifestu jest podpisem łańcuchowym.
+    def sign_manifest(self, paths, manifest_path):
+        SignatureManifest.ensure_replaceable(manifest_path)
+        started = time.perf_counter()
+        sizes, digests = self.hash_all(paths)
+        manifest = SignatureManifest(hash_name=self.hash_name)
+        for path, size, digest in zip(paths, sizes, digests):
+            manifest.add(SignatureManifest.entry_name(path, manifest_path), size, digest)
+        manifest.sign(DigitalSigner(self.key))
+        manifest.save(manifest_path)
+        results = [{"path": p, "output": manifest_path, "bytes": size, "error": None} for p, size in zip(paths, sizes)]
+        return manifest, BatchSigner.summarize(results, time.perf_counter() - started)
+
+    ## @brief Podpisuje wszystkie pliki drzewem Merkle - jedna operacja RSA nad korzeniem, a dla każdego
+    #  dokumentu plik ".sig" z dowodem przynależności (w output_dir lub obok dokumentu).
+    #  Dokument, którego plik ".sig" jest podpisem łańcuchowym, kończy się błędem zamiast zastąpienia łańcucha.
+    #  @param paths Lista ścieżek do podpisania.
+    #  @param on_result Opcjonalny callback wywoływany dla każdego zapisanego dowodu.
+    #  @return Krotka (lista wyników, podsumowanie przepustowości).
+    #  @throw ValueError gdy dwa dokumenty dają ten sam plik dowodu.
+    def sign_merkle(self, paths, on_result=None):
+        targets = self.plan_targets(paths, self.sidecar_for)
+        started = time.perf_counter()
+        sizes, digests = self.hash_all(paths)
+        proofs = MerkleProof.sign_batch(DigitalSigner(self.key, hash_name=self.hash_name), list(zip(sizes, digests)))
+        results = []
+        for path, target, size, proof in zip(paths, targets, sizes, proofs):
+            result = {"path": path, "output": target, "bytes": size, "seconds": 0.0, "error": None}
+            try:
+                SignatureManifest.ensure_replaceable(target)
+                proof.save(target)
+            except (OSError, ValueError) as error:
+                result["error"] = f"{type(error).__name__}: {error}"
+            results.append(result)
+            if on_result:
+                on_result(result)
+        return results, BatchSigner.summarize(results, time.perf_counter() - started)
+
+    ## @brief Wyznacza ścieżkę pliku ".sig" dokumentu (w output_dir lub obok dokumentu).
+    #  @param source_path Ścieżka dokumentu źródłowego.
+    #  @param input_root Wspólny katalog dokumentów wejściowych.
+    def sidecar_for(self, source_path, input_root=None):
+        return os.path.join(self.output_directory(source_path, input_root),
+                            os.path.basename(SignatureManifest.sidecar_path(source_path)))
+
+    ## @brief Hashuje pliki równolegle (pula wątków lub procesów).
+    #  @param paths Lista ścieżek.
+    #  @return Krotka (lista rozmiarów, lista skrótów algorytmem hash_name).
+    def hash_all(self, paths):
+        sizes = [os.path.getsize(p) for p in paths]
+        if self.use_processes:
+            from concurrent.futures import ProcessPoolExecutor as pool_class
+        else:
+            pool_class = ThreadPoolExecutor
+        with pool_class(self.workers) as pool:
+            digests = list(pool.map(functools.partial(StreamHasher.hash_file, algorithm=self.hash_name), paths))
+        return sizes, digests
+
+    ## @brief Liczy podsumowanie przepustowości dla wyników partii.
+    #  @param results Lista wyników zwróconych przez sign_one.
+    #  @param elapsed Całkowity czas trwania partii w sekundach.
+    #  @return Słownik z liczbą plików, błędów, bajtów oraz przepustowością w plikach/s i MB/s.
+    @staticmethod
+    def summarize(results, elapsed):
+        signed = [r for r in results if r["error"] is None]
+        total_bytes = sum(r["bytes"] for r in signed)
+        elapsed = max(elapsed, 1e-9)
+        return {
+            "files": len(results),
+            "signed": len(signed),
+            "failed": len(results) - len(signed),
+            "bytes": total_bytes,
+            "seconds": round(elapsed, 3),
+            "files_per_s": round(len(signed) / elapsed, 2),
+            "mb_per_s": round(total_bytes / elapsed / (1024 * 1024), 2),
+        }
+
+## @brief Punkt wejścia CLI do podpisywania wsadowego.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sign many PDF documents without the GUI.")
+    parser.add_argument("--key", required=True, help="path to private_encrypted.pem")
+    parser.add_argument("--dir", help="directory with PDF files to sign")
+    parser.add_argument("--glob", help="glob pattern of files to sign (supports **)")
+    parser.add_argument("--manifest", help="text file with one path per line")
+    parser.add_argument("--out", help="output directory (default: next to each source file)")
+    parser.add_argument("--workers", type=int, default=None, help="number of parallel workers")
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    parser.add_argument("--detached", action="store_true", help="write a .sig file next to each document")
+    parser.add_argument("--signature-manifest", help="write one signed manifest covering all documents")
+    parser.add_argument("--incremental", action="store_true",
+                        help="extend a chained .sig with a revision covering the bytes appended since the last signature")
+    parser.add_argument("--verify-prefix", action="store_true",
+                        help="with --incremental, re-read the already signed part and refuse to sign if it changed")
+    parser.add_argument("--merkle", action="store_true",
+                        help="sign a Merkle root once and write a .sig inclusion proof per document")
+    parser.add_argument("--hash", default=hash_backends.DEFAULT_ALGORITHM, choices=hash_backends.algorithms(),
+                        help="content hash algorithm recorded in the signatures")
+    args = parser.parse_args(argv)
+
+    paths = BatchSigner.collect_inputs(args.dir, args.glob, args.manifest)
+    if not paths:
+        parser.error("no input files found")
+
+    pin = getpass.getpass("PIN: ")
+    batch = BatchSigner.from_encrypted_key(
+        args.key, pin, workers=args.workers, use_processes=args.processes, output_dir=args.out,
+        detached=args.detached, incremental=args.incremental, hash_name=args.hash, verify_prefix=args.verify_prefix)
+    if args.signature_manifest:
+        _, summary = batch.sign_manifest(paths, args.signature_manifest)
+        print(json.dumps({"summary": summary}))
+        return 0
+    sign = batch.sign_merkle if args.merkle else batch.sign_all
+    try:
+        results, summary = sign(paths, on_result=lambda r: print(json.dumps(r), flush=True))
+    except ValueError as error:
+        parser.error(str(error))
+    print(json.dumps({"summary": summary}))
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,380 @@
+## @file benchmark.py
+#  @brief Powtarzalne testy wydajności ścieżek krytycznych (podpis, weryfikacja, generowanie, szyfrowanie
+#  i odszyfrowanie klucza) bez GUI i bez Windows, z porównaniem do zapisanego wyniku bazowego.
+#  Przypadek "hash" mierzy osobno każdą dostępną implementację z rejestru hash_backends
+#  (np. "hash:sha256=hashlib", "hash:blake3=blake3"), a przypadek "kdf" - koszt wyprowadzenia klucza
+#  z PIN-u dla każdego zestawu parametrów z --kdf (czas odblokowania kontra czas przeszukania wszystkich PIN-ów).
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_backends
+from cryptography.hazmat.primitives import serialization
+from utils import DigitalSigner, KeyContainer, KeyDecryptor, KeySecurity, RSAKeyHandler, StreamHasher
+from signature_checker import PDFSignatureChecker
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+## @brief Przypadki zależne od rozmiaru dokumentu.
+SIZED_CASES = ("sign_data", "sign_file", "verify", "verify_mmap", "hash")
+## @brief Przypadki niezależne od rozmiaru dokumentu.
+KEY_CASES = ("decrypt", "decrypt_legacy", "encrypt", "keygen", "kdf")
+## @brief Domyślne zestawy parametrów KDF mierzone w przypadku "kdf".
+DEFAULT_KDF_SPECS = "scrypt:n=16384,r=8,p=1;scrypt:n=65536,r=8,p=1;scrypt:n=262144,r=8,p=1;pbkdf2:iterations=600000"
+## @brief Kod PIN używany w syntetycznym kluczu.
+BENCH_PIN = "1234"
+## @brief Liczba możliwych 4-cyfrowych PIN-ów.
+PIN_SPACE = 10 ** 4
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+## @brief Zamienia przypadek "hash" na osobne przypadki dla dostępnych implementacji skrótu.
+#  @param cases Lista nazw przypadków.
+#  @return Lista z "hash" zastąpionym przez "hash:algorytm=implementacja".
+def expand_hash_cases(cases):
+    expanded = []
+    for case in cases:
+        if case != "hash":
+            expanded.append(case)
+            continue
+        for algorithm in hash_backends.ALGORITHM_IDS:
+            expanded.extend(f"hash:{algorithm}={backend.name}"
+                            for backend in hash_backends.implementations(algorithm) if backend.available())
+    return expanded
+
+## @brief Zamienia przypadek "kdf" na osobne przypadki dla każdego zestawu parametrów KDF.
+#  @param cases Lista nazw przypadków.
+#  @param specs Zestawy parametrów oddzielone średnikami (patrz KeyContainer.parse_kdf).
+#  @throw ValueError gdy zestaw parametrów jest nieprawidłowy.
+def expand_kdf_cases(cases, specs):
+    expanded = []
+    for case in cases:
+        if case != "kdf":
+            expanded.append(case)
+            continue
+        for spec in filter(None, (part.strip() for part in specs.split(";"))):
+            KeyContainer.parse_kdf(spec)
+            expanded.append(f"kdf:{spec}")
+    return expanded
+
+## @brief Szyfruje klucz w historycznym formacie (IV + AES-CFB, klucz = SHA-256 z PIN-u).
+def legacy_encrypt(private_data, pin):
+    from Cryptodome.Cipher import AES
+    iv = os.urandom(16)
+    return iv + AES.new(hashlib.sha256(pin.encode()).digest(), AES.MODE_CFB, iv).encrypt(private_data)
+
+## @brief Czy przypadek zależy od rozmiaru dokumentu.
+def is_sized(case):
+    return case in SIZED_CASES or case.startswith("hash:")
+
+## @brief Zamienia rozmiar w postaci "10K", "64M" lub "2G" na liczbę bajtów.
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+## @brief Zamienia liczbę bajtów na krótki zapis ("10K", "64M", "2G").
+def format_size(size):
+    for unit in ("G", "M", "K"):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return str(size)
+
+## @brief Tworzy syntetyczny plik PDF o dokładnie zadanym rozmiarze.
+#  Treść to losowy blok 1 MiB powtarzany do uzyskania rozmiaru, z nagłówkiem i znacznikiem końca PDF.
+#  @param path Ścieżka pliku.
+#  @param size Rozmiar w bajtach.
+def make_synthetic_pdf(path, size):
+    header, footer = b"%PDF-1.7\n", b"\n%%EOF\n"
+    block = os.urandom(1024 * 1024)
+    body = max(size - len(header) - len(footer), 0)
+    with open(path, 'wb') as f:
+        f.write(header[:size])
+        while body > 0:
+            f.write(block[:min(body, len(block))])
+            body -= len(block)
+        f.write(footer[:max(size - len(header), 0)])
+
+## @brief Zwraca percentyl metodą najbliższej rangi.
+#  @param values Posortowana lista wartości.
+#  @param fraction Percentyl z przedziału 0-1.
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+## @brief Zwraca szczytowe zużycie pamięci (RSS) bieżącego procesu w bajtach lub None.
+#  Na Linuksie odczytywane jest VmHWM z /proc/self/status (resetowalne przez reset_peak_rss),
+#  na pozostałych systemach ru_maxrss.
+def peak_rss():
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+## @brief Ustala punkt odniesienia dla pomiaru pamięci jednego przypadku.
+#  Proces roboczy ma już załadowane moduły i klucz, więc sam szczyt RSS mierzyłby głównie importy.
+#  Na Linuksie zapis "5" do /proc/self/clear_refs ustawia VmHWM na bieżące RSS; gdzie indziej
+#  punktem odniesienia jest dotychczasowy szczyt (przyrost ponad niego).
+#  @return Punkt odniesienia w bajtach lub None.
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+    except OSError:
+        pass
+    return peak_rss()
+
+## @brief Buduje operację do zmierzenia.
+#  @return Funkcja bez argumentów zwracająca liczbę przetworzonych bajtów.
+def _build_operation(case, fixture, private_key):
+    if case == "sign_data":
+        signer = DigitalSigner(private_key)
+        with open(fixture["pdf"], 'rb') as f:
+            data = f.read()
+        def sign_data():
+            signer.sign_data(data)
+            return len(data)
+        return sign_data
+    if case == "sign_file":
+        signer = DigitalSigner(private_key)
+        def sign_file():
+            signer.sign_file(fixture["pdf"], f"{fixture['pdf']}.{threading.get_ident()}.signed")
+            return fixture["size"]
+        return sign_file
+    if case == "verify":
+        public_key = private_key.public_key()
+        def verify():
+            PDFSignatureChecker(fixture["signed"], public_key).perform_streaming_check()
+            return fixture["size"]
+        return verify
+    if case.startswith("hash:"):
+        algorithm, _, name = case[len("hash:"):].partition("=")
+        hash_backends.select(algorithm, name)
+        hash_backends.get(algorithm)
+        def hash_file():
+            StreamHasher.hash_file(fixture["pdf"], algorithm=algorithm)
+            return fixture["size"]
+        return hash_file
+    if case == "verify_mmap":
+        public_key = private_key.public_key()
+        def verify_mmap():
+            PDFSignatureChecker(fixture["signed"], public_key).perform_mapped_check()
+            return fixture["size"]
+        return verify_mmap
+    if case in ("decrypt", "decrypt_legacy"):
+        encrypted = fixture["encrypted" if case == "decrypt" else "legacy"]
+        def decrypt():
+            KeyDecryptor(encrypted, BENCH_PIN).get_private_key()
+            return len(encrypted)
+        return decrypt
+    if case.startswith("kdf:"):
+        params = KeyContainer.parse_kdf(case[len("kdf:"):])
+        salt = os.urandom(16)
+        def kdf():
+            KeyContainer.derive_key(BENCH_PIN, salt, params)
+            return 0
+        return kdf
+    if case == "encrypt":
+        return lambda: len(KeySecurity.encrypt_private_data(fixture["private_pem"], BENCH_PIN))
+    if case == "keygen":
+        def keygen():
+            RSAKeyHandler()
+            return 0
+        return keygen
+    raise ValueError(f"Unknown benchmark case: {case}")
+
+## @brief Mierzy jeden przypadek w osobnym procesie (aby RSS szczytowy dotyczył tylko tego przypadku).
+#  @return Słownik z percentylami opóźnienia, przepustowością i szczytowym RSS.
+def _run_case(case, fixture, workers, iterations, key_der):
+    private_key = serialization.load_der_private_key(key_der, password=None, unsafe_skip_rsa_key_validation=True)
+    rss_baseline = reset_peak_rss()
+    operation = _build_operation(case, fixture, private_key)
+    operation()
+
+    latencies = []
+    lock = threading.Lock()
+    def timed():
+        started = time.perf_counter()
+        processed = operation()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+        return processed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        processed = sum(pool.map(lambda _: timed(), range(iterations * workers)))
+    wall = max(time.perf_counter() - started, 1e-9)
+
+    latencies.sort()
+    result = {
+        "case": case,
+        "size": fixture.get("size"),
+        "workers": workers,
+        "ops": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "ops_per_s": round(len(latencies) / wall, 3),
+        "mb_per_s": round(processed / wall / (1024 * 1024), 3),
+        "peak_rss_delta_mb": (round((peak_rss() - rss_baseline) / (1024 * 1024), 1)
+                              if rss_baseline is not None else None),
+    }
+    if case.startswith("kdf:"):
+        result["pin_space_core_s"] = round(percentile(latencies, 0.50) * PIN_SPACE, 1)
+    return result
+
+## @brief Zwraca klucz identyfikujący wynik (przypadek/rozmiar/liczba wątków).
+def result_key(result):
+    size = format_size(result["size"]) if result["size"] is not None else "-"
+    return f"{result['case']}/{size}/w{result['workers']}"
+
+## @brief Porównuje wyniki z bazowymi i zwraca listę regresji.
+#  @param results Bieżące wyniki.
+#  @param baseline Wyniki bazowe (lista słowników).
+#  @param threshold Dopuszczalne pogorszenie (np. 0.10 = 10%).
+#  @return Lista słowników z kluczem, metryką, wartością bazową i bieżącą.
+def compare(results, baseline, threshold):
+    previous = {result_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None:
+            continue
+        result["baseline_p50_ms"] = base["p50_ms"]
+        result["p50_change"] = round(result["p50_ms"] / base["p50_ms"] - 1, 3) if base["p50_ms"] else None
+        if base["p50_ms"] and result["p50_ms"] > base["p50_ms"] * (1 + threshold):
+            regressions.append({"key": result_key(result), "metric": "p50_ms",
+                                "baseline": base["p50_ms"], "current": result["p50_ms"]})
+        if base["ops_per_s"] and result["ops_per_s"] < base["ops_per_s"] * (1 - threshold):
+            regressions.append({"key": result_key(result), "metric": "ops_per_s",
+                                "baseline": base["ops_per_s"], "current": result["ops_per_s"]})
+    return regressions
+
+## @brief Przygotowuje pliki wejściowe i klucz, a następnie uruchamia wszystkie przypadki.
+#  @param max_in_memory Największy rozmiar dokumentu dla przypadku sign_data (wczytuje cały plik).
+#  @return Lista wyników.
+def run_benchmarks(cases, sizes, worker_counts, iterations, keygen_iterations, workdir, max_in_memory,
+                   on_result=None):
+    key = RSAKeyHandler()
+    key_der = key.key_pair.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption())
+    private_pem = key.export_private_key()
+    key_fixture = {"private_pem": private_pem,
+                   "encrypted": KeySecurity.encrypt_private_data(private_pem, BENCH_PIN),
+                   "legacy": legacy_encrypt(private_pem, BENCH_PIN)}
+
+    jobs = [(case, key_fixture) for case in cases if case in KEY_CASES or case.startswith("kdf:")]
+    for size in sizes:
+        if not any(is_sized(case) for case in cases):
+            break
+        pdf = os.path.join(workdir, f"synthetic_{format_size(size)}.pdf")
+        make_synthetic_pdf(pdf, size)
+        signed = pdf.replace(".pdf", "_signed.pdf")
+        DigitalSigner(key.key_pair).sign_file(pdf, signed)
+        fixture = {"pdf": pdf, "signed": signed, "size": size}
+        jobs.extend((case, fixture) for case in cases
+                    if is_sized(case) and (case != "sign_data" or size <= max_in_memory))
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for case, fixture in jobs:
+        count = keygen_iterations if case == "keygen" else iterations
+        for workers in worker_counts:
+            with context.Pool(1) as pool:
+                result = pool.apply(_run_case, (case, fixture, workers, count, key_der))
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+## @brief Punkt wejścia CLI.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark signing, verification and key handling hot paths.")
+    parser.add_argument("--cases", default=",".join(SIZED_CASES + KEY_CASES), help="comma separated cases")
+    parser.add_argument("--sizes", default="10K,1M,64M", help="synthetic PDF sizes, e.g. 10K,1M,1G,4G")
+    parser.add_argument("--workers", default="1,2,4,N", help="worker counts; N = number of CPUs")
+    parser.add_argument("--iterations", type=int, default=5, help="operations per worker")
+    parser.add_argument("--keygen-iterations", type=int, default=2, help="keygen operations per worker")
+    parser.add_argument("--kdf", default=DEFAULT_KDF_SPECS, help="semicolon separated KDF settings for the kdf case")
+    parser.add_argument("--max-in-memory", default="256M", help="largest size used for the in-memory sign_data case")
+    parser.add_argument("--workdir", help="directory for synthetic files (default: temporary)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results stored in this JSON file")
+    parser.add_argument("--save-baseline", help="store results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    cases = expand_hash_cases([c.strip() for c in args.cases.split(",") if c.strip()])
+    try:
+        cases = expand_kdf_cases(cases, args.kdf)
+    except ValueError as error:
+        parser.error(str(error))
+    unknown = {c for c in cases if not c.startswith(("hash:", "kdf:"))} - set(SIZED_CASES + KEY_CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    worker_counts = sorted({(os.cpu_count() or 1) if w.strip().upper() == "N" else int(w)
+                            for w in args.workers.split(",")})
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pdf-signer-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    print(f"{'case':<30}{'size':>8}{'workers':>9}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}"
+          f"{'ops/s':>10}{'MB/s':>10}{'RSS +MB':>9}")
+    def report(result):
+        size = format_size(result["size"]) if result["size"] is not None else "-"
+        print(f"{result['case']:<30}{size:>8}{result['workers']:>9}{result['p50_ms']:>11}{result['p90_ms']:>11}"
+              f"{result['p99_ms']:>11}{result['ops_per_s']:>10}{result['mb_per_s']:>10}{str(result['peak_rss_delta_mb']):>9}",
+              flush=True)
+        if "pin_space_core_s" in result:
+            print(f"{'':<30}all {PIN_SPACE} PINs: {result['pin_space_core_s']} s per core", flush=True)
+    try:
+        results = run_benchmarks(cases, sizes, worker_counts, args.iterations, args.keygen_iterations,
+                                 workdir, parse_size(args.max_in_memory), report)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    document = {"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                            "cpus": os.cpu_count()}, "results": results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        document["regressions"] = compare(results, baseline, args.threshold)
+        for regression in document["regressions"]:
+            print(f"REGRESSION {regression['key']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']}")
+        status = 1 if document["regressions"] else 0
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, indent=2)
+    return status
+
+if __name__ == "__main__":
+    raise SystemExit(main())
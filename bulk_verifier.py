@@ -0,0 +1,220 @@
+## @file bulk_verifier.py
+#  @brief Masowa weryfikacja podpisów PDF w drzewach katalogów z wynikami strumieniowanymi jako JSON Lines.
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from cryptography.exceptions import InvalidSignature
+from utils import PublicKeyCache, SignatureManifest
+from verification_cache import VerificationCache
+from signature_checker import PDFSignatureChecker
+
+## @brief Klucze publiczne załadowane w procesie roboczym (tryb puli procesów).
+_worker_keys = None
+
+## @brief Czy proces roboczy używa mmap (tryb puli procesów).
+_worker_use_mmap = False
+## @brief Połączenie procesu roboczego z pamięcią podręczną wyników (tryb puli procesów).
+_worker_cache = None
+## @brief Manifest podpisów odłączonych używany przez proces roboczy (tryb puli procesów).
+_worker_signature_path = None
+
+## @brief Inicjalizuje proces roboczy - parsuje klucze publiczne raz na proces.
+#  @param pem_list Lista kluczy publicznych w formacie PEM.
+#  @param use_mmap Czy weryfikować przez mmap.
+#  @param cache_path Ścieżka do bazy pamięci podręcznej wyników lub None.
+#  @param signature_path Ścieżka manifestu podpisów odłączonych lub None.
+def _init_worker(pem_list, use_mmap, cache_path, signature_path):
+    global _worker_keys, _worker_use_mmap, _worker_cache, _worker_signature_path
+    cache = PublicKeyCache(capacity=max(len(pem_list), 1))
+    _worker_keys = [cache.load_pem(pem) for pem in pem_list]
+    _worker_use_mmap = use_mmap
+    _worker_cache = VerificationCache(cache_path) if cache_path else None
+    _worker_signature_path = signature_path
+
+## @brief Weryfikuje pojedynczy plik w procesie roboczym.
+def _verify_in_worker(path):
+    return BulkVerifier.verify_one(path, _worker_keys, _worker_use_mmap, _worker_cache, _worker_signature_path)
+
+## @class BulkVerifier
+#  @brief Weryfikuje wiele dokumentów względem jednego lub kilku kluczy publicznych.
+class BulkVerifier:
+    ## @brief Konstruktor klasy.
+    #  @param key_paths Lista ścieżek do kluczy publicznych PEM.
+    #  @param workers Liczba równoległych zadań (None - liczba rdzeni).
+    #  @param use_processes True - pula procesów, False - pula wątków.
+    #  @param key_cache Pamięć podręczna kluczy (None - nowa instancja).
+    #  @param use_mmap True - treść hashowana przez mmap zamiast odczytu blokami.
+    #  @param cache_path Ścieżka do bazy VerificationCache (None - bez pamięci podręcznej wyników).
+    #  @param signature_path Manifest podpisów odłączonych (None - plik ".sig" obok dokumentu lub podpis w pliku).
+    def __init__(self, key_paths, workers=None, use_processes=False, key_cache=None, use_mmap=False,
+                 cache_path=None, signature_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.use_mmap = use_mmap
+        self.cache_path = cache_path
+        self.signature_path = signature_path
+        self.key_cache = key_cache or PublicKeyCache()
+        self.pem_list = []
+        self.keys = []
+        for path in key_paths:
+            with open(path, 'rb') as keyfile:
+                pem = keyfile.read()
+            self.pem_list.append(pem)
+            self.keys.append(self.key_cache.load_pem(pem))
+
+    ## @brief Przechodzi leniwie po plikach PDF w podanych ścieżkach.
+    #  @param roots Lista plików lub katalogów.
+    #  @return Generator ścieżek do plików PDF.
+    @staticmethod
+    def iter_documents(roots):
+        for root in roots:
+            if os.path.isfile(root):
+                yield root
+                continue
+            for directory, _, files in os.walk(root):
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(directory, name)
+
+    ## @brief Weryfikuje jeden dokument - treść hashowana jest raz, niezależnie od liczby kluczy.
+    #  @param path Ścieżka do podpisanego dokumentu.
+    #  @param keys Lista krotek (odcisk, klucz publiczny).
+    #  @param use_mmap True - treść hashowana przez mmap.
+    #  @param cache Obiekt VerificationCache lub None.
+    #  @param signature_path Manifest podpisów odłączonych lub None.
+    #  @return Słownik z polami path, valid, key, cached, bytes, seconds, error.
+    @staticmethod
+    def verify_one(path, keys, use_mmap=False, cache=None, signature_path=None):
+        started = time.perf_counter()
+        result = {"path": path, "valid": False, "key": None, "cached": False, "bytes": 0, "seconds": 0.0,
+                  "error": None}
+        try:
+            identity = VerificationCache.file_identity(path)
+            result["bytes"] = identity[2]
+            checker = PDFSignatureChecker(path, None, signature_path)
+            detached = checker.load_detached()
+            if cache is not None and detached:
+                # Podpis odłączony może się zmienić bez zmiany dokumentu - z pamięci podręcznej bierzemy tylko skrót
+                # (policzony algorytmem i z podziałem na segmenty z bieżącego podpisu).
+                known = next((v for v in (cache.lookup(identity, checker.detached_cache_key(fp)) for fp, _ in keys)
+                              if v is not None), None)
+                if known is not None:
+                    checker.document_hash = known.digest
+                    result["cached"] = True
+            elif cache is not None:
+                verdicts = [(fp, cache.lookup(identity, fp)) for fp, _ in keys]
+                matched = [fp for fp, verdict in verdicts if verdict is not None and verdict.valid]
+                if matched or all(verdict is not None for _, verdict in verdicts):
+                    result["cached"] = True
+                    result["valid"] = bool(matched)
+                    result["key"] = matched[0] if matched else None
+                    if not matched:
+                        result["error"] = "InvalidSignature: no provided key matches"
+                    result["seconds"] = time.perf_counter() - started
+                    return result
+
+            if checker.document_hash is None:
+                if use_mmap:
+                    checker.hash_mapped()
+                else:
+                    checker.hash_streaming()
+            tried = []
+            for key_fingerprint, key in keys:
+                try:
+                    checker.verify_digest(key)
+                except InvalidSignature:
+                    tried.append((key_fingerprint, False))
+                    continue
+                tried.append((key_fingerprint, True))
+                result["valid"] = True
+                result["key"] = key_fingerprint
+                break
+            else:
+                result["error"] = "InvalidSignature: no provided key matches"
+            if cache is not None and VerificationCache.file_identity(path) == identity:
+                for key_fingerprint, valid in tried:
+                    if detached:
+                        key_fingerprint = checker.detached_cache_key(key_fingerprint)
+                    cache.store(identity, key_fingerprint, checker.document_hash, valid, checker.version)
+        except Exception as error:
+            result["error"] = f"{type(error).__name__}: {error}"
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    ## @brief Weryfikuje dokumenty równolegle i zwraca wyniki w miarę ich kończenia.
+    #  Liczba zadań w locie jest ograniczona, więc pamięć nie rośnie wraz z liczbą plików.
+    #  @param paths Iterowalna kolekcja ścieżek.
+    #  @return Generator słowników wyników.
+    def verify_all(self, paths):
+        cache = None
+        if self.use_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                       initargs=(self.pem_list, self.use_mmap, self.cache_path,
+                                                 self.signature_path))
+            job = _verify_in_worker
+        else:
+            if self.cache_path:
+                cache = VerificationCache(self.cache_path)
+            pool = ThreadPoolExecutor(self.workers)
+            job = lambda path: BulkVerifier.verify_one(path, self.keys, self.use_mmap, cache, self.signature_path)
+
+        max_in_flight = self.workers * 4
+        try:
+            with pool:
+                pending = set()
+                for path in paths:
+                    pending.add(pool.submit(job, path))
+                    if len(pending) >= max_in_flight:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                for future in pending:
+                    yield future.result()
+        finally:
+            if cache is not None:
+                cache.close()
+
+## @brief Punkt wejścia CLI do masowej weryfikacji.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify signed PDF documents in bulk, streaming JSON Lines.")
+    parser.add_argument("paths", nargs="*", help="files or directories to verify (default: manifest entries)")
+    parser.add_argument("--key", action="append", required=True, help="public key PEM (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="number of parallel workers")
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    parser.add_argument("--mmap", action="store_true", help="hash memory-mapped files instead of reading in chunks")
+    parser.add_argument("--cache", help="SQLite verification cache; unchanged files skip hashing and RSA")
+    parser.add_argument("--invalidate-cache", action="store_true", help="clear the verification cache first")
+    parser.add_argument("--signature-manifest", help="detached signature manifest covering the documents")
+    args = parser.parse_args(argv)
+    paths = args.paths
+    if not paths and args.signature_manifest:
+        base = os.path.dirname(os.path.abspath(args.signature_manifest))
+        paths = [os.path.join(base, name) for name in sorted(SignatureManifest.load(args.signature_manifest).entries)]
+    if not paths:
+        parser.error("no files to verify")
+
+    if args.cache and args.invalidate_cache:
+        cache = VerificationCache(args.cache)
+        cache.invalidate()
+        cache.close()
+    verifier = BulkVerifier(args.key, workers=args.workers, use_processes=args.processes, use_mmap=args.mmap,
+                            cache_path=args.cache, signature_path=args.signature_manifest)
+    started = time.perf_counter()
+    total = failed = 0
+    for result in verifier.verify_all(BulkVerifier.iter_documents(paths)):
+        total += 1
+        failed += not result["valid"]
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(json.dumps({"summary": {"files": total, "valid": total - failed, "invalid": failed,
+                                  "seconds": round(elapsed, 3), "files_per_s": round(total / elapsed, 2)}}))
+    return 0 if failed == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
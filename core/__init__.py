@@ -0,0 +1,53 @@
+## @file core/__init__.py
+#  @brief Rdzeń aplikacji bez GUI - jeden punkt importu dla narzędzi CLI, serwera i procesów roboczych.
+#  Nazwy ładowane są leniwie: "import core" nie importuje ani kryptografii, ani tkinter,
+#  a moduł z daną klasą ładowany jest przy pierwszym odwołaniu (np. core.DigitalSigner).
+#  Żaden z eksportowanych modułów nie importuje tkinter ani win32api przy ładowaniu.
+import importlib
+
+## @brief Mapa nazwa -> moduł, z którego jest ona eksportowana.
+_EXPORTS = {
+    "BatchSigner": "batch_signer",
+    "BulkVerifier": "bulk_verifier",
+    "DeviceEvent": "device_events",
+    "DeviceEventHub": "device_events",
+    "DigitalSigner": "utils",
+    "DriveWatcher": "utils",
+    "KeyContainer": "utils",
+    "KeyDecryptor": "utils",
+    "KeyPairPool": "key_pool",
+    "KeySecurity": "utils",
+    "KeySessionManager": "key_session",
+    "MerkleProof": "utils",
+    "MerkleTree": "utils",
+    "PDFSignatureChecker": "signature_checker",
+    "PublicKeyCache": "utils",
+    "RSAKeyHandler": "utils",
+    "SignatureManifest": "utils",
+    "SignatureTrailer": "utils",
+    "SignedStatement": "utils",
+    "SigningClient": "signing_server",
+    "SigningServer": "signing_server",
+    "StreamHasher": "utils",
+    "USBUtility": "utils",
+    "VerificationCache": "verification_cache",
+    "hash_backends": None,
+    "instrumentation": None,
+}
+
+__all__ = sorted(_EXPORTS)
+
+## @brief Ładuje eksportowaną nazwę przy pierwszym odwołaniu (PEP 562).
+#  @throw AttributeError gdy nazwa nie jest eksportowana.
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'core' has no attribute {name!r}")
+    module_name = _EXPORTS[name]
+    value = importlib.import_module(name if module_name is None else module_name)
+    if module_name is not None:
+        value = getattr(value, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return __all__
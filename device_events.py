@@ -0,0 +1,283 @@
+## @file device_events.py
+#  @brief Wspólny podsystem zdarzeń podłączania i odłączania nośników z wymiennymi backendami.
+#  Backend MountTableBackend (Linux) czeka na powiadomienie jądra o zmianie tablicy montowań,
+#  PollingBackend jest rozwiązaniem zapasowym (m.in. Windows), a FakeBackend służy do testów
+#  i pomiaru opóźnienia wykrycia.
+import logging
+import os
+import queue
+import re
+import select
+import sys
+import threading
+import time
+
+## @brief Katalogi, pod którymi montowane są nośniki wymienne na systemach uniksowych.
+MEDIA_ROOTS = ("/media", "/run/media", "/mnt", "/Volumes")
+
+logger = logging.getLogger(__name__)
+
+## @class DeviceEvent
+#  @brief Zdarzenie podłączenia lub odłączenia nośnika.
+class DeviceEvent:
+    ADDED = "added"
+    REMOVED = "removed"
+
+    ## @brief Konstruktor klasy.
+    #  @param kind ADDED lub REMOVED.
+    #  @param path Ścieżka montowania nośnika (np. "E:\\" lub "/media/user/TOKEN").
+    #  @param timestamp Chwila wykrycia zdarzenia (time.perf_counter); None - teraz.
+    def __init__(self, kind, path, timestamp=None):
+        self.kind = kind
+        self.path = path
+        self.timestamp = time.perf_counter() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f"DeviceEvent({self.kind!r}, {self.path!r})"
+
+## @brief Emituje zdarzenia dla różnicy między dwoma zbiorami urządzeń.
+#  @param known Poprzedni zbiór urządzeń.
+#  @param current Bieżący zbiór urządzeń.
+#  @param emit Funkcja przyjmująca DeviceEvent.
+def _emit_diff(known, current, emit):
+    for path in sorted(current - known):
+        emit(DeviceEvent(DeviceEvent.ADDED, path))
+    for path in sorted(known - current):
+        emit(DeviceEvent(DeviceEvent.REMOVED, path))
+
+## @brief Zwraca zbiór liter dysków w systemie Windows (pywin32 jest opcjonalny i ładowany dopiero tutaj).
+def list_windows_drives():
+    import win32api
+    return set(win32api.GetLogicalDriveStrings().split('\x00')[:-1])
+
+## @brief Zwraca katalogi zamontowanych nośników pod MEDIA_ROOTS (uniksowy backend zapasowy).
+def list_media_dirs(roots=MEDIA_ROOTS):
+    found = set()
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        for entry in os.scandir(root):
+            if entry.is_dir() and os.path.ismount(entry.path):
+                found.add(entry.path)
+            elif entry.is_dir():
+                found.update(p.path for p in os.scandir(entry.path) if p.is_dir() and os.path.ismount(p.path))
+    return found
+
+## @class PollingBackend
+#  @brief Backend zapasowy - okresowo porównuje listę urządzeń.
+class PollingBackend:
+    ## @brief Konstruktor klasy.
+    #  @param list_devices Funkcja zwracająca zbiór ścieżek urządzeń.
+    #  @param interval Odstęp między odczytami w sekundach.
+    def __init__(self, list_devices, interval=1.0):
+        self.list_devices = list_devices
+        self.interval = interval
+
+    ## @brief Zwraca bieżący zbiór urządzeń.
+    def snapshot(self):
+        return set(self.list_devices())
+
+    ## @brief Pętla backendu - działa do ustawienia stop.
+    #  @param emit Funkcja przyjmująca DeviceEvent.
+    #  @param stop threading.Event kończący pętlę.
+    #  @param known Zbiór urządzeń znanych w chwili startu.
+    def run(self, emit, stop, known):
+        while not stop.wait(self.interval):
+            current = self.snapshot()
+            _emit_diff(known, current, emit)
+            known = current
+
+## @class MountTableBackend
+#  @brief Backend linuksowy - czeka (poll, POLLPRI) na zmianę /proc/self/mounts zgłaszaną przez jądro.
+#  Nie odpytuje urządzeń cyklicznie, więc zdarzenie dociera natychmiast po zamontowaniu.
+class MountTableBackend:
+    _ESCAPE = re.compile(r"\\([0-7]{3})")
+
+    ## @brief Konstruktor klasy.
+    #  @param roots Katalogi, pod którymi montowane są nośniki wymienne.
+    #  @param mounts_path Ścieżka do tablicy montowań.
+    def __init__(self, roots=MEDIA_ROOTS, mounts_path="/proc/self/mounts"):
+        self.roots = tuple(r.rstrip("/") for r in roots)
+        self.mounts_path = mounts_path
+
+    ## @brief Wybiera z tablicy montowań punkty leżące pod katalogami nośników wymiennych.
+    #  @param table Zawartość /proc/self/mounts.
+    def parse(self, table):
+        found = set()
+        for line in table.splitlines():
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            mount_point = self._ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1])
+            if any(mount_point.startswith(root + "/") for root in self.roots):
+                found.add(mount_point)
+        return found
+
+    ## @brief Zwraca bieżący zbiór zamontowanych nośników.
+    def snapshot(self):
+        with open(self.mounts_path, 'r') as table:
+            return self.parse(table.read())
+
+    ## @brief Pętla backendu - działa do ustawienia stop.
+    #  Limit czasu poll służy wyłącznie do sprawdzania flagi stop.
+    def run(self, emit, stop, known):
+        with open(self.mounts_path, 'r') as table:
+            poller = select.poll()
+            poller.register(table, select.POLLPRI | select.POLLERR)
+            while not stop.is_set():
+                if not poller.poll(500):
+                    continue
+                table.seek(0)
+                current = self.parse(table.read())
+                _emit_diff(known, current, emit)
+                known = current
+
+## @class FakeBackend
+#  @brief Backend testowy - zdarzenia wstrzykiwane są ręcznie przez insert/remove.
+class FakeBackend:
+    ## @brief Konstruktor klasy.
+    #  @param devices Urządzenia podłączone od początku.
+    def __init__(self, devices=()):
+        self.devices = set(devices)
+        self.pending = queue.Queue()
+
+    def snapshot(self):
+        return set(self.devices)
+
+    ## @brief Symuluje podłączenie nośnika.
+    def insert(self, path):
+        self.devices.add(path)
+        self.pending.put(DeviceEvent(DeviceEvent.ADDED, path))
+
+    ## @brief Symuluje odłączenie nośnika.
+    def remove(self, path):
+        self.devices.discard(path)
+        self.pending.put(DeviceEvent(DeviceEvent.REMOVED, path))
+
+    def run(self, emit, stop, known):
+        while not stop.is_set():
+            try:
+                emit(self.pending.get(timeout=0.2))
+            except queue.Empty:
+                continue
+
+## @brief Zwraca aktualnie podłączone nośniki niezależnie od platformy.
+def list_drives():
+    if sys.platform == "win32":
+        return list_windows_drives()
+    return list_media_dirs()
+
+## @brief Wybiera najlepszy dostępny backend dla bieżącej platformy.
+def default_backend():
+    if sys.platform == "win32":
+        return PollingBackend(list_windows_drives)
+    if hasattr(select, "poll") and os.path.exists("/proc/self/mounts"):
+        return MountTableBackend()
+    return PollingBackend(list_media_dirs)
+
+## @class DeviceEventHub
+#  @brief Rozsyła zdarzenia jednego backendu do wielu subskrybentów z jednego wątku.
+class DeviceEventHub:
+    ## @brief Konstruktor klasy.
+    #  @param backend Backend zdarzeń (None - default_backend()).
+    def __init__(self, backend=None):
+        self.backend = backend or default_backend()
+        self.devices = set()
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    ## @brief Uruchamia wątek backendu (wielokrotne wywołanie nic nie robi).
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return self
+            self.stop_event.clear()
+            self.devices = self.backend.snapshot()
+            self.thread = threading.Thread(
+                target=self.backend.run, args=(self.dispatch, self.stop_event, set(self.devices)), daemon=True)
+            self.thread.start()
+        return self
+
+    ## @brief Zatrzymuje wątek backendu.
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    ## @brief Zwraca posortowaną listę aktualnie podłączonych urządzeń.
+    def current(self):
+        with self.lock:
+            return sorted(self.devices)
+
+    ## @brief Rejestruje odbiorcę zdarzeń.
+    #  @param callback Funkcja przyjmująca DeviceEvent (wywoływana w wątku backendu).
+    #  @return Funkcja wyrejestrowująca odbiorcę.
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    ## @brief Wyrejestrowuje odbiorcę zdarzeń.
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    ## @brief Aktualizuje zbiór urządzeń i przekazuje zdarzenie subskrybentom.
+    #  @param event Obiekt DeviceEvent.
+    def dispatch(self, event):
+        with self.lock:
+            if event.kind == DeviceEvent.ADDED:
+                self.devices.add(event.path)
+            else:
+                self.devices.discard(event.path)
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Device event handler failed for %s %s", event.kind, event.path)
+
+    ## @brief Blokuje do chwili, gdy funkcja probe zwróci wartość dla któregoś urządzenia.
+    #  Sprawdza najpierw urządzenia już podłączone, potem kolejne zdarzenia ADDED.
+    #  @param probe Funkcja (ścieżka urządzenia) -> wynik lub None.
+    #  @param timeout Maksymalny czas oczekiwania w sekundach (None - bez limitu).
+    #  @return Pierwszy wynik probe różny od None lub None po przekroczeniu czasu.
+    def wait_for(self, probe, timeout=None):
+        added = queue.Queue()
+        callback = lambda event: added.put(event.path) if event.kind == DeviceEvent.ADDED else None
+        self.subscribe(callback)
+        try:
+            for path in self.current():
+                result = probe(path)
+                if result is not None:
+                    return result
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                try:
+                    path = added.get(timeout=remaining)
+                except queue.Empty:
+                    return None
+                result = probe(path)
+                if result is not None:
+                    return result
+        finally:
+            self.unsubscribe(callback)
+
+## @brief Wspólna instancja huba dla całej aplikacji.
+_shared_hub = None
+_shared_lock = threading.Lock()
+
+## @brief Zwraca (i przy pierwszym wywołaniu tworzy oraz uruchamia) wspólny hub zdarzeń.
+def shared_hub():
+    global _shared_hub
+    with _shared_lock:
+        if _shared_hub is None:
+            _shared_hub = DeviceEventHub()
+        return _shared_hub.start()
@@ -1,11 +1,11 @@
 ## @file gui.py
 #  @brief Główne GUI aplikacji do obsługi podpisu cyfrowego (generowanie, podpisywanie, weryfikacja PDF).
-from key_deployment import USBKeyHandler
-from signer import SecurePDFSigner
-from verifier import VerifierGui
+#  Moduły okien i kryptografii importowane są dopiero przy otwarciu danej operacji, więc okno główne
+#  pojawia się bez ładowania cryptography, puli procesów ani obsługi urządzeń.
+import os
 import tkinter as tk
 from tkinter import messagebox, filedialog, simpledialog, scrolledtext
-from utils import DigitalSigner
+from task_executor import Task, TaskExecutor
 
 ## @class SignatureInterface
 #  @brief Główne okno GUI z wyborem jednej z trzech operacji.
@@ -48,21 +48,26 @@ class SignatureInterface(tk.Tk):
         ).pack(pady=10)
 
     ## @brief Otwiera nowe okno do generowania kluczy RSA.
+    #  Okno działa w pętli głównej aplikacji; pula kluczy jest zatrzymywana przy jego zamknięciu.
     def open_key_window(self):
         window = tk.Toplevel(self)
         window.title("RSA Key Generation")
         window.geometry("500x300")
         gui = RSAKeyCreator(window)
-        USBKeyHandler(gui).run()
+        from key_deployment import USBKeyHandler
+        handler = USBKeyHandler(gui).start()
+        window.bind("<Destroy>", lambda event: handler.close() if event.widget is window else None)
 
     ## @brief Otwiera okno do podpisywania plików PDF.
     def open_signer_window(self):
         gui = PDFSignerWindow()
+        from signer import SecurePDFSigner
         signer_interface = SecurePDFSigner(gui)
         signer_interface.run()
 
     ## @brief Otwiera okno do weryfikacji podpisów cyfrowych.
     def open_verifier_window(self):
+        from verifier import VerifierGui
         VerifierGui().mainloop()
 
 ## @class RSAKeyCreator
@@ -115,10 +120,27 @@ class PDFSignerWindow(tk.Tk):
         super().__init__()
         self.geometry("620x410")
         self.title("Signer")
+        self.key_path = None
+        self.acquire_key = None
+        self.executor = TaskExecutor(self)
+        self.queued = []
 
-        self.display = scrolledtext.ScrolledText(self, wrap=tk.WORD)
+        self.display = scrolledtext.ScrolledText(self, wrap=tk.WORD, height=14)
         self.display.pack(fill=tk.BOTH, expand=True)
 
+        self.task_list = tk.Listbox(self, height=5, exportselection=False)
+        self.task_list.pack(fill=tk.X)
+
+        controls = tk.Frame(self)
+        controls.pack(fill=tk.X)
+        self.add_button = tk.Button(controls, text="Sign more documents", state=tk.DISABLED,
+                                    command=self.select_and_sign)
+        self.add_button.pack(side=tk.LEFT, padx=4, pady=4)
+        tk.Button(controls, text="Cancel selected", command=self.cancel_selected).pack(side=tk.LEFT, padx=4, pady=4)
+        self.detached = tk.BooleanVar(self, value=False)
+        tk.Checkbutton(controls, text="Detached signature (.sig)", variable=self.detached).pack(side=tk.LEFT, padx=4)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
         self.log_msg("Initializing device search...")
 
     ## @brief Dodaje wiadomość do logu GUI i konsoli.
@@ -128,30 +150,95 @@ class PDFSignerWindow(tk.Tk):
         print(text)
 
     ## @brief Wywołuje proces wyboru pliku i jego podpisania.
-    #  @param decrypted_key Odszyfrowany klucz prywatny RSA.
-    def sign_file_dialog(self, decrypted_key):
-        self.after(0, lambda: self.select_and_sign(decrypted_key))
-
-    ## @brief Wybiera plik PDF, podpisuje go i zapisuje podpisaną wersję.
-    #  @param signer_key Klucz prywatny do podpisu.
-    def select_and_sign(self, signer_key):
-        pdf_input = filedialog.askopenfilename(title="Locate PDF Document", filetypes=[("PDF File", "*.pdf")])
-        if not pdf_input:
+    #  Okno nie przechowuje odszyfrowanego klucza - przy każdym podpisie pobiera go z sesji przez acquire_key.
+    #  @param key_path Ścieżka zaszyfrowanego klucza (identyfikator sesji).
+    #  @param acquire_key Funkcja (key_path, on_key) przekazująca do on_key klucz prywatny lub None;
+    #  po wygaśnięciu sesji pyta o PIN i odszyfrowuje klucz w tle.
+    def sign_file_dialog(self, key_path, acquire_key):
+        self.key_path = key_path
+        self.acquire_key = acquire_key
+        self.add_button.config(state=tk.NORMAL)
+        self.after(0, self.select_and_sign)
+
+    ## @brief Wybiera pliki PDF i pobiera klucz z sesji; podpisanie kolejkowane jest po otrzymaniu klucza.
+    def select_and_sign(self):
+        pdf_inputs = filedialog.askopenfilenames(title="Locate PDF Document", filetypes=[("PDF File", "*.pdf")])
+        if not pdf_inputs:
             self.log_msg("No document selected.")
             return
+        self.acquire_key(self.key_path, lambda signer_key: self.queue_signing(pdf_inputs, signer_key))
+
+    ## @brief Kolejkuje podpisanie plików w tle.
+    #  @param pdf_inputs Ścieżki wybranych dokumentów.
+    #  @param signer_key Klucz prywatny z sesji lub None, gdy klucza nie udało się odblokować.
+    def queue_signing(self, pdf_inputs, signer_key):
+        if signer_key is None:
+            self.log_msg("Signing skipped: the key is not unlocked.")
+            return
 
-        try:
-            with open(pdf_input, 'rb') as doc:
-                original_data = doc.read()
-            signer = DigitalSigner(signer_key)
-            signature = signer.sign_data(original_data)
-            final_name = pdf_input.replace(".pdf", "_signed.pdf")
-            with open(final_name, 'wb') as result:
-                result.write(original_data + signature)
-            self.log_msg(f"Signed version saved: {final_name}")
-            messagebox.showinfo("Operation Complete", f"File signed:\n{final_name}")
-        except Exception as problem:
-            self.log_msg(f"Error during signing: {problem}")
+        from utils import DigitalSigner, SignatureManifest
+        signer = DigitalSigner(signer_key)
+        detached = self.detached.get()
+        for pdf_input in pdf_inputs:
+            if detached:
+                final_name = SignatureManifest.sidecar_path(pdf_input)
+                work = lambda task, src=pdf_input, dst=final_name: signer.sign_detached(src, dst, progress=task.report)
+            else:
+                final_name = pdf_input.replace(".pdf", "_signed.pdf")
+                work = lambda task, src=pdf_input, dst=final_name: self.sign_document(signer, src, dst, task)
+            try:
+                size = os.path.getsize(pdf_input)
+            except OSError as problem:
+                self.log_msg(f"Error during signing: {problem}")
+                continue
+            self.queued.append(self.executor.submit(os.path.basename(pdf_input), work, size,
+                                                    on_update=self.refresh_tasks, on_done=self.signing_finished))
+            self.task_list.insert(tk.END, self.queued[-1].describe())
+
+    ## @brief Podpisuje jeden dokument (wykonywane w wątku roboczym).
+    #  @return Ścieżka podpisanej kopii.
+    def sign_document(self, signer, source, target, task):
+        signer.sign_file(source, target, progress=task.report)
+        return target
+
+    ## @brief Odświeża wiersz zadania na liście.
+    #  @param task Obiekt Task.
+    def refresh_tasks(self, task):
+        row = self.queued.index(task)
+        text = task.describe()
+        if self.task_list.get(row) == text:
+            return
+        selected = row in self.task_list.curselection()
+        self.task_list.delete(row)
+        self.task_list.insert(row, text)
+        if selected:
+            self.task_list.selection_set(row)
+
+    ## @brief Raportuje wynik zakończonego zadania podpisu.
+    #  @param task Obiekt Task.
+    def signing_finished(self, task):
+        from utils import SignatureManifest
+        if task.state == Task.DONE and task.result.endswith(SignatureManifest.SUFFIX):
+            self.log_msg(f"Detached signature saved: {task.result}")
+        elif task.state == Task.DONE:
+            self.log_msg(f"Signed version saved: {task.result}")
+        elif task.state == Task.CANCELLED:
+            self.log_msg(f"Signing cancelled: {task.name}")
+        else:
+            self.log_msg(f"Error during signing: {task.error}")
+        if all(t.finished() for t in self.queued):
+            signed = sum(t.state == Task.DONE for t in self.queued)
+            messagebox.showinfo("Operation Complete", f"{signed} of {len(self.queued)} file(s) signed.", parent=self)
+
+    ## @brief Anuluje zadanie zaznaczone na liście.
+    def cancel_selected(self):
+        for row in self.task_list.curselection():
+            self.queued[row].cancel()
+
+    ## @brief Anuluje trwające zadania i zamyka okno.
+    def close(self):
+        self.executor.shutdown()
+        self.destroy()
 
     ## @brief Pyta użytkownika o PIN do odszyfrowania klucza.
     def get_pin_from_user(self):
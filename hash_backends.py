@@ -0,0 +1,171 @@
+## @file hash_backends.py
+#  @brief Rejestr implementacji funkcji skrótu używanych do hashowania treści dokumentów.
+#  Każdy algorytm ma listę implementacji w kolejności preferencji i używana jest pierwsza dostępna.
+#  Dla SHA-256 najpierw hashlib (OpenSSL z instrukcjami SHA-NI / ARMv8, bez GIL przy dużych blokach),
+#  potem cryptography i Cryptodome. BLAKE3 (opcjonalny pakiet "blake3") dzieli dane na drzewo bloków
+#  i hashuje jeden plik równolegle na wszystkich rdzeniach.
+#  Nazwa algorytmu zapisywana jest w metadanych podpisu, więc weryfikacja wybiera właściwą implementację.
+#  Implementację można wymusić zmienną środowiskową PDF_SIGNER_HASH_BACKEND, np. "sha256=cryptodome".
+import hashlib
+import os
+import threading
+
+## @brief Domyślny algorytm skrótu treści dokumentów.
+DEFAULT_ALGORITHM = "sha256"
+## @brief Identyfikatory algorytmów zapisywane w stopce podpisu dopisanego do dokumentu.
+ALGORITHM_IDS = {"sha256": 1, "blake3": 2}
+
+## @class HashBackend
+#  @brief Jedna implementacja algorytmu skrótu, ładowana przy pierwszym użyciu.
+class HashBackend:
+    ## @brief Konstruktor klasy.
+    #  @param algorithm Nazwa algorytmu zapisywana w metadanych podpisu (klucz ALGORITHM_IDS).
+    #  @param name Nazwa implementacji, np. "hashlib".
+    #  @param loader Funkcja zwracająca fabrykę obiektów z metodami update() i digest();
+    #  ImportError oznacza, że implementacja jest niedostępna.
+    #  @param chunk_size Preferowany rozmiar bloku (większy dla implementacji wielowątkowych).
+    def __init__(self, algorithm, name, loader, chunk_size=1024 * 1024):
+        self.algorithm = algorithm
+        self.name = name
+        self.loader = loader
+        self.chunk_size = chunk_size
+        self.factory = None
+
+    ## @brief Ładuje implementację.
+    #  @return Ten obiekt.
+    #  @throw ImportError gdy wymagana biblioteka nie jest zainstalowana.
+    def load(self):
+        if self.factory is None:
+            self.factory = self.loader()
+        return self
+
+    ## @brief Czy implementację da się załadować.
+    def available(self):
+        try:
+            self.load()
+            return True
+        except ImportError:
+            return False
+
+    ## @brief Tworzy nowy obiekt hashujący.
+    def new(self):
+        return self.load().factory()
+
+## @class _CryptographyHasher
+#  @brief Dopasowuje hashes.Hash z biblioteki cryptography do interfejsu update()/digest().
+class _CryptographyHasher:
+    __slots__ = ("context",)
+
+    def __init__(self, algorithm):
+        from cryptography.hazmat.primitives.hashes import Hash
+        self.context = Hash(algorithm)
+
+    def update(self, data):
+        self.context.update(data)
+
+    def digest(self):
+        return self.context.finalize()
+
+def _load_cryptography_sha256():
+    from cryptography.hazmat.primitives import hashes
+    return lambda: _CryptographyHasher(hashes.SHA256())
+
+def _load_cryptodome_sha256():
+    from Cryptodome.Hash import SHA256
+    return SHA256.new
+
+def _load_blake3():
+    from blake3 import blake3
+    return lambda: blake3(max_threads=blake3.AUTO)
+
+## @brief Zarejestrowane implementacje: algorytm -> lista w kolejności preferencji.
+_backends = {}
+## @brief Wybrane implementacje: algorytm -> HashBackend.
+_selected = {}
+## @brief Implementacje wymuszone przez użytkownika: algorytm -> nazwa implementacji.
+_forced = {}
+_lock = threading.Lock()
+
+## @brief Rejestruje implementację algorytmu.
+#  @param backend Obiekt HashBackend.
+#  @param preferred True - implementacja ma pierwszeństwo przed już zarejestrowanymi.
+#  @return Zarejestrowany obiekt.
+#  @throw ValueError gdy algorytm nie ma identyfikatora w ALGORITHM_IDS.
+def register(backend, preferred=False):
+    if backend.algorithm not in ALGORITHM_IDS:
+        raise ValueError(f"Unknown hash algorithm: {backend.algorithm}")
+    with _lock:
+        candidates = _backends.setdefault(backend.algorithm, [])
+        if preferred:
+            candidates.insert(0, backend)
+        else:
+            candidates.append(backend)
+        _selected.pop(backend.algorithm, None)
+    return backend
+
+## @brief Wymusza implementację algorytmu (np. do porównań wydajności).
+#  @param algorithm Nazwa algorytmu.
+#  @param name Nazwa implementacji lub None - powrót do wyboru automatycznego.
+def select(algorithm, name=None):
+    with _lock:
+        if name is None:
+            _forced.pop(algorithm, None)
+        else:
+            _forced[algorithm] = name
+        _selected.pop(algorithm, None)
+
+## @brief Zwraca zarejestrowane implementacje algorytmu (również niedostępne).
+def implementations(algorithm):
+    with _lock:
+        return list(_backends.get(algorithm, ()))
+
+## @brief Zwraca nazwy algorytmów, dla których dostępna jest co najmniej jedna implementacja.
+def algorithms():
+    return sorted(name for name in ALGORITHM_IDS if any(b.available() for b in implementations(name)))
+
+## @brief Zwraca implementację używaną dla algorytmu.
+#  @param algorithm Nazwa algorytmu.
+#  @return Obiekt HashBackend.
+#  @throw ValueError gdy algorytm jest nieznany albo żadna jego implementacja nie jest dostępna.
+def get(algorithm=DEFAULT_ALGORITHM):
+    backend = _selected.get(algorithm)
+    if backend is not None:
+        return backend
+    if algorithm not in ALGORITHM_IDS:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+    forced = _forced.get(algorithm)
+    for candidate in implementations(algorithm):
+        if forced not in (None, candidate.name):
+            continue
+        if candidate.available():
+            with _lock:
+                return _selected.setdefault(algorithm, candidate)
+    if forced is not None:
+        raise ValueError(f"Hash backend {algorithm}={forced} is not available")
+    raise ValueError(f"No implementation of {algorithm} is available (install the '{algorithm}' package)")
+
+## @brief Zwraca nazwę algorytmu dla identyfikatora ze stopki podpisu.
+#  @throw ValueError gdy identyfikator jest nieznany.
+def algorithm_for_id(hash_id):
+    for name, known_id in ALGORITHM_IDS.items():
+        if known_id == hash_id:
+            return name
+    raise ValueError(f"Unsupported hash algorithm id: {hash_id}")
+
+## @brief Wymusza implementacje na podstawie specyfikacji tekstowej.
+#  @param spec Lista oddzielona średnikami, np. "sha256=cryptodome;blake3=blake3".
+#  @throw ValueError gdy wpis nie ma postaci algorytm=implementacja.
+def configure(spec):
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        algorithm, _, name = item.partition("=")
+        if not name:
+            raise ValueError(f"Hash backend must be given as algorithm=implementation: {item}")
+        select(algorithm.strip(), name.strip())
+
+register(HashBackend("sha256", "hashlib", lambda: hashlib.sha256))
+register(HashBackend("sha256", "cryptography", _load_cryptography_sha256))
+register(HashBackend("sha256", "cryptodome", _load_cryptodome_sha256))
+register(HashBackend("blake3", "blake3", _load_blake3, chunk_size=16 * 1024 * 1024))
+
+if os.environ.get("PDF_SIGNER_HASH_BACKEND"):
+    configure(os.environ["PDF_SIGNER_HASH_BACKEND"])
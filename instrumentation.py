@@ -0,0 +1,286 @@
+## @file instrumentation.py
+#  @brief Pomiar czasu i liczby bajtów etapów podpisu i weryfikacji (odczyt USB, KDF, AES, PEM, hash, RSA)
+#  z wynikami przekazywanymi do wymiennych odbiorników: pliku tekstowego Prometheus, logu JSON
+#  lub histogramu w pamięci.
+#  Gdy nie zarejestrowano żadnego odbiornika, stage() zwraca wspólny, pusty obiekt, więc koszt
+#  pomiaru sprowadza się do jednego sprawdzenia listy.
+#  Odbiorniki można włączyć zmienną środowiskową PDF_SIGNER_METRICS, np.
+#  "json:-;prometheus:/var/lib/node_exporter/pdf_signer.prom;histogram".
+import atexit
+import bisect
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+## @brief Aktywne odbiorniki pomiarów.
+_sinks = []
+## @brief Domyślne progi histogramu czasu (sekundy).
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger(__name__)
+
+## @class _NullStage
+#  @brief Pusty pomiar zwracany, gdy instrumentacja jest wyłączona.
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add_bytes(self, count):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+## @class Stage
+#  @brief Pomiar jednego wykonania etapu - używany jako menedżer kontekstu.
+class Stage:
+    __slots__ = ("name", "nbytes", "started")
+
+    ## @brief Konstruktor klasy.
+    #  @param name Nazwa etapu, np. "hash" lub "rsa.sign".
+    #  @param nbytes Liczba bajtów przetwarzanych w etapie (jeśli znana z góry).
+    def __init__(self, name, nbytes=0):
+        self.name = name
+        self.nbytes = nbytes
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.started, self.nbytes, exc_type is not None)
+        return False
+
+    ## @brief Dolicza bajty przetworzone w trakcie etapu.
+    def add_bytes(self, count):
+        self.nbytes += count
+
+## @brief Rozpoczyna pomiar etapu.
+#  @param name Nazwa etapu.
+#  @param nbytes Liczba bajtów przetwarzanych w etapie.
+#  @return Menedżer kontekstu (pusty, gdy instrumentacja jest wyłączona).
+def stage(name, nbytes=0):
+    if not _sinks:
+        return _NULL_STAGE
+    return Stage(name, nbytes)
+
+## @brief Czy jakikolwiek odbiornik jest aktywny.
+def enabled():
+    return bool(_sinks)
+
+## @brief Przekazuje wynik pomiaru do wszystkich odbiorników.
+#  Błąd odbiornika (np. zapisu pliku metryk) jest logowany i nie przerywa mierzonej operacji
+#  ani nie blokuje pozostałych odbiorników.
+#  @param name Nazwa etapu.
+#  @param seconds Czas trwania.
+#  @param nbytes Liczba przetworzonych bajtów.
+#  @param failed True, gdy etap zakończył się wyjątkiem.
+def record(name, seconds, nbytes=0, failed=False):
+    for sink in list(_sinks):
+        try:
+            sink.record(name, seconds, nbytes, failed)
+        except Exception:
+            logger.exception("Metrics sink %s failed to record stage %s", type(sink).__name__, name)
+
+## @brief Rejestruje odbiornik pomiarów.
+#  @return Zarejestrowany odbiornik.
+def add_sink(sink):
+    _sinks.append(sink)
+    return sink
+
+## @brief Wyrejestrowuje odbiornik i zapisuje jego stan.
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+        sink.flush()
+
+## @brief Zapisuje stan wszystkich odbiorników (np. plik Prometheus); błędy zapisu są logowane.
+def flush():
+    for sink in list(_sinks):
+        try:
+            sink.flush()
+        except Exception:
+            logger.exception("Metrics sink %s failed to flush", type(sink).__name__)
+
+## @class HistogramSink
+#  @brief Histogram czasu oraz liczniki wywołań, bajtów i błędów dla każdego etapu, trzymane w pamięci.
+class HistogramSink:
+    ## @brief Konstruktor klasy.
+    #  @param buckets Rosnące progi histogramu w sekundach.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, name, seconds, nbytes, failed):
+        with self.lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = {"counts": [0] * (len(self.buckets) + 1), "count": 0,
+                                             "seconds": 0.0, "bytes": 0, "errors": 0}
+            entry["counts"][bisect.bisect_left(self.buckets, seconds)] += 1
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["bytes"] += nbytes
+            entry["errors"] += failed
+
+    ## @brief Zwraca kopię zebranych danych.
+    #  @return Słownik etap -> {counts, count, seconds, bytes, errors}.
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(entry, counts=list(entry["counts"])) for name, entry in self.stages.items()}
+
+    ## @brief Zwraca jednowierszowe podsumowanie każdego etapu (wywołania, średni czas, przepustowość).
+    def summary(self):
+        lines = []
+        for name, entry in sorted(self.snapshot().items()):
+            mean_ms = 1000 * entry["seconds"] / entry["count"]
+            line = f"{name}: {entry['count']} calls, mean {mean_ms:.2f} ms"
+            if entry["bytes"] and entry["seconds"]:
+                line += f", {entry['bytes'] / entry['seconds'] / 1048576:.1f} MiB/s"
+            if entry["errors"]:
+                line += f", {entry['errors']} errors"
+            lines.append(line)
+        return lines
+
+    def flush(self):
+        pass
+
+## @class PrometheusTextSink
+#  @brief Zapisuje histogramy w formacie tekstowym Prometheus (np. dla textfile collectora node_exportera).
+#  Każdy proces zapisuje własne liczniki do osobnego pliku z numerem PID w nazwie (pdf_signer.prom ->
+#  pdf_signer.<pid>.prom), a serie mają etykietę pid - procesy puli nie nadpisują sobie nawzajem wartości,
+#  a sumę daje zapytanie sum without (pid). Proces potomny utworzony przez fork zaczyna od zerowych liczników.
+#  Plik zastępowany jest atomowo, najwyżej raz na interval sekund oraz przy zamknięciu programu.
+class PrometheusTextSink(HistogramSink):
+    PREFIX = "pdf_signer_stage"
+
+    ## @brief Konstruktor klasy.
+    #  @param path Ścieżka bazowa pliku wynikowego (.prom); faktyczny plik zwraca output_path.
+    #  @param interval Minimalny odstęp między zapisami w sekundach.
+    def __init__(self, path, interval=10.0, buckets=LATENCY_BUCKETS):
+        super().__init__(buckets)
+        self.path = path
+        self.interval = interval
+        self.last_flush = time.monotonic()
+        self.flush_lock = threading.Lock()
+        self.pid = os.getpid()
+
+    ## @brief Zwraca ścieżkę pliku bieżącego procesu.
+    def output_path(self):
+        base, extension = os.path.splitext(self.path)
+        if extension != ".prom":
+            base, extension = self.path, ".prom"
+        return f"{base}.{os.getpid()}{extension}"
+
+    def record(self, name, seconds, nbytes, failed):
+        if self.pid != os.getpid():
+            self._reset_after_fork()
+        super().record(name, seconds, nbytes, failed)
+        if time.monotonic() - self.last_flush >= self.interval and self.flush_lock.acquire(blocking=False):
+            try:
+                self._write()
+            finally:
+                self.flush_lock.release()
+
+    ## @brief Formatuje zebrane dane w formacie tekstowym Prometheus.
+    def render(self):
+        prefix = self.PREFIX
+        pid = os.getpid()
+        lines = [f"# HELP {prefix}_seconds Time spent in each signing/verification stage.",
+                 f"# TYPE {prefix}_seconds histogram"]
+        snapshot = sorted(self.snapshot().items())
+        for name, entry in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_seconds_bucket{{stage="{name}",pid="{pid}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_seconds_sum{{stage="{name}",pid="{pid}"}} {entry["seconds"]!r}')
+            lines.append(f'{prefix}_seconds_count{{stage="{name}",pid="{pid}"}} {entry["count"]}')
+        lines += [f"# HELP {prefix}_bytes_total Bytes processed in each stage.", f"# TYPE {prefix}_bytes_total counter"]
+        lines += [f'{prefix}_bytes_total{{stage="{name}",pid="{pid}"}} {entry["bytes"]}' for name, entry in snapshot]
+        lines += [f"# HELP {prefix}_errors_total Stage executions that raised.", f"# TYPE {prefix}_errors_total counter"]
+        lines += [f'{prefix}_errors_total{{stage="{name}",pid="{pid}"}} {entry["errors"]}' for name, entry in snapshot]
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        if self.pid != os.getpid():
+            self._reset_after_fork()
+        with self.flush_lock:
+            self._write()
+
+    def _reset_after_fork(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stages = {}
+
+    def _write(self):
+        self.last_flush = time.monotonic()
+        path = self.output_path()
+        directory, name = os.path.split(path)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or os.curdir)
+        try:
+            with os.fdopen(fd, "w") as out:
+                out.write(self.render())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+## @class JsonLogSink
+#  @brief Zapisuje każdy pomiar jako jeden wiersz JSON.
+class JsonLogSink:
+    ## @brief Konstruktor klasy.
+    #  @param stream Strumień tekstowy (domyślnie stderr) albo ścieżka do pliku dopisywanego na końcu.
+    def __init__(self, stream=None):
+        self.owned = isinstance(stream, str)
+        self.stream = open(stream, "a") if self.owned else (stream or sys.stderr)
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, nbytes, failed):
+        line = json.dumps({"ts": time.time(), "stage": name, "seconds": round(seconds, 6), "bytes": nbytes,
+                           "failed": failed})
+        with self.lock:
+            self.stream.write(line + "\n")
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+## @brief Rejestruje odbiorniki na podstawie specyfikacji tekstowej.
+#  @param spec Lista oddzielona średnikami: "json[:ścieżka|-]", "prometheus:ścieżka", "histogram".
+#  @return Lista zarejestrowanych odbiorników.
+#  @throw ValueError gdy rodzaj odbiornika jest nieznany.
+def configure(spec):
+    created = []
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        kind, _, target = item.partition(":")
+        if kind == "json":
+            sink = JsonLogSink(None if target in ("", "-") else target)
+        elif kind == "prometheus":
+            if not target:
+                raise ValueError("prometheus sink needs a file path")
+            sink = PrometheusTextSink(target)
+        elif kind == "histogram":
+            sink = HistogramSink()
+        else:
+            raise ValueError(f"Unknown metrics sink: {kind}")
+        created.append(add_sink(sink))
+    return created
+
+if os.environ.get("PDF_SIGNER_METRICS"):
+    configure(os.environ["PDF_SIGNER_METRICS"])
+atexit.register(flush)
@@ -1,20 +1,37 @@
 ## @file key_deployment.py
 #  @brief Obsługuje generowanie i zapisywanie kluczy RSA na pamięci USB.
+import argparse
+import json
 import os
+import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import instrumentation
+from device_events import DeviceEvent, shared_hub
+from key_pool import KeyPairPool, generate_key_der, load_generated_key
 from utils import USBUtility
 from utils import RSAKeyHandler
 from utils import KeySecurity
+from utils import KeyContainer
+from utils import PublicKeyCache
 
 ## @class USBKeyHandler
 #  @brief Klasa zarządzająca procesem tworzenia kluczy RSA i zapisywania ich na urządzeniu USB.
 class USBKeyHandler:
+    ## @brief Maksymalny czas oczekiwania na klucz z puli (s).
+    TAKE_TIMEOUT = 120.0
+
     ## @brief Konstruktor klasy.
     #  @param gui Interfejs GUI do obsługi logowania i wejścia od użytkownika.
-    def __init__(self, gui):
+    #  @param events Hub zdarzeń urządzeń (None - wspólny hub aplikacji).
+    #  @param key_pool Pula gotowych kluczy RSA (None - tworzona przy uruchomieniu).
+    def __init__(self, gui, events=None, key_pool=None):
         self.gui = gui
+        self.events = events
+        self.key_pool = key_pool
+        self.unsubscribe = None
 
     ## @brief Wyświetla komunikat w GUI.
     #  @param text Tekst do wyświetlenia.
@@ -36,6 +53,8 @@ class USBKeyHandler:
         return destination
 
     ## @brief Generuje i zapisuje zaszyfrowany klucz prywatny oraz klucz publiczny na USB.
+    #  PIN pobierany jest w wątku GUI, a pobranie klucza z puli (lub jego wygenerowanie) i szyfrowanie
+    #  wykonywane są w wątku roboczym; dialog zapisu i zapis na nośnik wracają do wątku GUI przez after().
     #  @param drive_path Ścieżka do zamontowanego pendrive’a.
     def deploy_keys_to_usb(self, drive_path):
         self.log(f"New device connected at {drive_path}")
@@ -43,39 +62,287 @@ class USBKeyHandler:
         if pin is None:
             self.log("PIN entry cancelled.")
             return
+        self.log("Preparing key...")
+        threading.Thread(target=self.prepare_keys, args=(drive_path, pin), daemon=True).start()
 
-        rsa_handler = RSAKeyHandler()
-        pub_key = rsa_handler.export_public_key()
-        priv_key = rsa_handler.export_private_key()
+    ## @brief Pobiera klucz z puli i szyfruje go PIN-em (wykonywane w wątku roboczym).
+    #  @param drive_path Ścieżka do zamontowanego pendrive’a.
+    #  @param pin Kod PIN.
+    def prepare_keys(self, drive_path, pin):
+        try:
+            with instrumentation.stage("keypool.take"):
+                rsa_handler = RSAKeyHandler(self.key_pool.take(self.TAKE_TIMEOUT) if self.key_pool else None)
+            if self.key_pool:
+                stats = self.key_pool.metrics()
+                message = f"Key taken from pool (depth {stats['depth']}, {stats['in_flight']} generating)"
+            else:
+                message = "Key generated"
+            pub_key = rsa_handler.export_public_key()
+            encrypted_priv = KeySecurity.encrypt_private_data(rsa_handler.export_private_key(), pin)
+        except TimeoutError:
+            self.gui.after(0, lambda: self.log(f"Key generation timed out after {self.TAKE_TIMEOUT:.0f} s."))
+            return
+        except Exception as error:
+            self.gui.after(0, lambda text=f"Key generation aborted: {error}": self.log(text))
+            return
+        self.gui.after(0, lambda: self.log(message))
+        self.gui.after(0, lambda: self.write_keys(drive_path, pub_key, encrypted_priv))
 
+    ## @brief Zapisuje klucz publiczny (po wyborze miejsca przez użytkownika) i zaszyfrowany klucz prywatny.
+    #  @param drive_path Ścieżka do zamontowanego pendrive’a.
+    #  @param pub_key Klucz publiczny PEM.
+    #  @param encrypted_priv Zaszyfrowany klucz prywatny.
+    def write_keys(self, drive_path, pub_key, encrypted_priv):
         if not self.save_public_key(pub_key):
             self.log("Operation aborted: public key not saved.")
             return
 
-        encrypted_priv = KeySecurity.encrypt_private_data(priv_key, pin)
         final_path = os.path.join(drive_path, "private_encrypted.pem")
-
         try:
-            USBUtility.write_file(final_path, encrypted_priv)
+            USBUtility.write_file(final_path, encrypted_priv, sync=True)
             self.log(f"Encrypted private key saved at: {final_path}")
         except Exception as e:
             self.log(f"Error writing private key: {e}")
 
-    ## @brief Monitoruje system w poszukiwaniu nowo podłączonych urządzeń USB.
-    #  @param known_drives Zestaw już znanych dysków USB.
-    def monitor_usb(self, known_drives):
-        while True:
-            current = USBUtility.list_all_drives()
-            added = current - known_drives
-            known_drives = current
+    ## @brief Obsługuje zdarzenie urządzenia - dla każdego nowego nośnika uruchamia generowanie kluczy w wątku GUI.
+    #  @param event Obiekt DeviceEvent.
+    def on_device_event(self, event):
+        if event.kind == DeviceEvent.ADDED:
+            self.gui.after(0, lambda d=event.path: self.deploy_keys_to_usb(d))
 
-            for new_drive in added:
-                self.gui.after(0, lambda d=new_drive: self.deploy_keys_to_usb(d))
+    ## @brief Uruchamia pulę kluczy i subskrybuje zdarzenia urządzeń.
+    #  Pula pozostaje gotowa tak długo, jak okno kluczy jest otwarte; zatrzymuje ją close().
+    #  @return Ten obiekt.
+    def start(self):
+        self.key_pool = (self.key_pool or KeyPairPool()).start()
+        self.events = (self.events or shared_hub()).start()
+        self.unsubscribe = self.events.subscribe(self.on_device_event)
+        return self
 
-            time.sleep(1)
+    ## @brief Wyrejestrowuje się ze zdarzeń i zatrzymuje pulę, usuwając jej klucze z pamięci.
+    #  Wielokrotne wywołanie nic nie robi.
+    def close(self):
+        if self.unsubscribe is not None:
+            self.unsubscribe()
+            self.unsubscribe = None
+        if self.key_pool is not None:
+            self.key_pool.shutdown()
 
-    ## @brief Uruchamia monitorowanie USB w osobnym wątku i startuje GUI.
+    ## @brief Uruchamia obsługę i pętlę GUI (okno samodzielne); po jej zakończeniu wywołuje close().
     def run(self):
-        known_drives = USBUtility.list_all_drives()
-        threading.Thread(target=self.monitor_usb, args=(known_drives,), daemon=True).start()
-        self.gui.mainloop()
\ No newline at end of file
+        self.start()
+        try:
+            self.gui.mainloop()
+        finally:
+            self.close()
+
+## @class ProvisioningPipeline
+#  @brief Wdraża klucze na wiele tokenów naraz, bez GUI, według manifestu z PIN-ami i ścieżkami.
+#  Klucze RSA generowane są równolegle w procesach roboczych; gdy klucz jest gotowy, szyfrowanie
+#  i zapis z fsync na jego nośnik wykonywane są w puli wątków, więc zapisy na różne napędy
+#  nakładają się z generowaniem kolejnych kluczy.
+class ProvisioningPipeline:
+    KEY_FILE = "private_encrypted.pem"
+    PUBLIC_FILE = "public_key.pem"
+
+    ## @brief Konstruktor klasy.
+    #  @param workers Liczba procesów generujących klucze (None - min(liczba tokenów, liczba rdzeni)).
+    #  @param io_workers Liczba równoległych zapisów (None - po jednym wątku na token).
+    #  @param key_size Długość generowanych kluczy w bitach.
+    #  @param public_dir Katalog kluczy publicznych dla wpisów bez "public_key" (None - plik
+    #  public_key.pem na samym nośniku).
+    #  @param force True - nadpisuje klucz, który już jest na nośniku.
+    #  @param kdf Parametry KDF kontenera klucza (None - KeyContainer.default_kdf()).
+    def __init__(self, workers=None, io_workers=None, key_size=4096, public_dir=None, force=False, kdf=None):
+        self.workers = workers
+        self.io_workers = io_workers
+        self.key_size = key_size
+        self.public_dir = public_dir
+        self.force = force
+        self.kdf = kdf
+
+    ## @brief Wczytuje manifest tokenów - jeden obiekt JSON na wiersz, np.
+    #  {"drive": "E:\\", "pin": "1234", "public_key": "keys/alice.pem"}.
+    #  Zamiast "pin" można podać "pin_env" - nazwę zmiennej środowiskowej z PIN-em.
+    #  Puste wiersze i wiersze zaczynające się od "#" są pomijane.
+    #  @param path Ścieżka do manifestu.
+    #  @return Lista zadań (słowniki drive, pin, public_key).
+    #  @throw ValueError gdy wiersz nie jest poprawnym wpisem.
+    @staticmethod
+    def load_manifest(path):
+        jobs = []
+        with open(path, encoding="utf-8") as manifest:
+            for number, line in enumerate(manifest, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    entry = json.loads(line)
+                    pin = entry["pin"] if "pin" in entry else os.environ.get(entry["pin_env"])
+                    jobs.append({"drive": entry["drive"], "pin": pin, "public_key": entry.get("public_key")})
+                except (ValueError, KeyError, TypeError) as error:
+                    raise ValueError(f"{path}:{number}: invalid manifest entry ({error})") from None
+        return jobs
+
+    ## @brief Zwraca ścieżkę zapisu klucza publicznego dla zadania.
+    def public_key_path(self, job):
+        if job.get("public_key"):
+            return job["public_key"]
+        if self.public_dir:
+            label = os.path.basename(os.path.normpath(job["drive"]).rstrip("\\/:")) or "token"
+            return os.path.join(self.public_dir, f"{label}.pem")
+        return os.path.join(job["drive"], self.PUBLIC_FILE)
+
+    ## @brief Sprawdza zadanie przed generowaniem klucza.
+    #  @param job Zadanie z manifestu.
+    #  @param seen Zbiór ścieżek użytych przez wcześniejsze zadania (uzupełniany).
+    #  @return Opis błędu lub None, gdy zadanie można wykonać.
+    def check_job(self, job, seen):
+        pin = job["pin"]
+        if not isinstance(pin, str) or not (pin.isdigit() and len(pin) == 4):
+            return "PIN must be exactly 4 digits"
+        if not os.path.isdir(job["drive"]):
+            return "Drive is not mounted"
+        key_path = os.path.join(job["drive"], self.KEY_FILE)
+        paths = {os.path.realpath(key_path), os.path.realpath(self.public_key_path(job))}
+        if paths & seen:
+            return "Drive or public key path listed more than once"
+        seen.update(paths)
+        if os.path.exists(key_path) and not self.force:
+            return f"Drive already holds {self.KEY_FILE}"
+        return None
+
+    def _result(self, job):
+        return {"drive": job["drive"], "private_key": os.path.join(job["drive"], self.KEY_FILE),
+                "public_key": self.public_key_path(job), "fingerprint": None, "status": "failed",
+                "bytes": 0, "keygen_s": 0.0, "write_s": 0.0, "write_kb_per_s": 0.0, "error": None}
+
+    ## @brief Szyfruje gotowy klucz PIN-em i zapisuje go (wraz z kluczem publicznym) z fsync.
+    #  @param job Zadanie z manifestu.
+    #  @param key_der Klucz prywatny w DER PKCS8 (z generate_key_der).
+    #  @param keygen_seconds Czas generowania klucza.
+    #  @param on_status Opcjonalny callback (napęd, etap).
+    #  @return Słownik z wynikiem dla nośnika.
+    def provision_one(self, job, key_der, keygen_seconds, on_status=None):
+        result = self._result(job)
+        result["keygen_s"] = round(keygen_seconds, 3)
+        try:
+            rsa_handler = RSAKeyHandler(load_generated_key(key_der))
+            pub_key = rsa_handler.export_public_key()
+            encrypted_priv = KeySecurity.encrypt_private_data(rsa_handler.export_private_key(), job["pin"], self.kdf)
+            if on_status:
+                on_status(job["drive"], "writing")
+            started = time.perf_counter()
+            if os.path.dirname(result["public_key"]):
+                os.makedirs(os.path.dirname(result["public_key"]), exist_ok=True)
+            USBUtility.write_file(result["public_key"], pub_key, sync=True)
+            USBUtility.write_file(result["private_key"], encrypted_priv, sync=True)
+            elapsed = time.perf_counter() - started
+            result.update(status="ok", fingerprint=PublicKeyCache.fingerprint(rsa_handler.key_pair.public_key()),
+                          bytes=len(pub_key) + len(encrypted_priv), write_s=round(elapsed, 3),
+                          write_kb_per_s=round((len(pub_key) + len(encrypted_priv)) / max(elapsed, 1e-9) / 1024, 1))
+        except Exception as error:
+            result["error"] = f"{type(error).__name__}: {error}"
+        if on_status:
+            on_status(job["drive"], "done" if result["error"] is None else "failed")
+        return result
+
+    ## @brief Wdraża klucze na wszystkie nośniki z listy zadań.
+    #  @param jobs Lista zadań (patrz load_manifest).
+    #  @param on_result Opcjonalny callback wywoływany dla każdego zakończonego nośnika.
+    #  @param on_status Opcjonalny callback (napęd, etap) - "keygen", "writing", "done" lub "failed".
+    #  @return Krotka (lista wyników, podsumowanie przepustowości).
+    def run(self, jobs, on_result=None, on_status=None):
+        started = time.perf_counter()
+        results = []
+
+        def finish(result):
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+        pending = []
+        seen = set()
+        for job in jobs:
+            error = self.check_job(job, seen)
+            if error is None:
+                pending.append(job)
+            else:
+                finish(dict(self._result(job), error=error))
+
+        if pending:
+            from concurrent.futures import ProcessPoolExecutor
+            workers = self.workers or max(1, min(len(pending), os.cpu_count() or 1))
+            with ProcessPoolExecutor(workers) as keygen, ThreadPoolExecutor(self.io_workers or len(pending)) as io:
+                keys = {keygen.submit(generate_key_der, self.key_size): job for job in pending}
+                if on_status:
+                    for job in pending:
+                        on_status(job["drive"], "keygen")
+                writes = []
+                for future in as_completed(keys):
+                    job = keys[future]
+                    try:
+                        key_der, seconds = future.result()
+                    except Exception as error:
+                        finish(dict(self._result(job), error=f"{type(error).__name__}: {error}"))
+                        continue
+                    writes.append(io.submit(self.provision_one, job, key_der, seconds, on_status))
+                for future in as_completed(writes):
+                    finish(future.result())
+
+        return results, ProvisioningPipeline.summarize(results, time.perf_counter() - started)
+
+    ## @brief Liczy podsumowanie dla wyników wdrożenia.
+    #  @param results Lista wyników zwróconych przez provision_one.
+    #  @param elapsed Całkowity czas trwania w sekundach.
+    #  @return Słownik z liczbą nośników, błędów, bajtów oraz tempem w tokenach na minutę.
+    @staticmethod
+    def summarize(results, elapsed):
+        done = [r for r in results if r["error"] is None]
+        elapsed = max(elapsed, 1e-9)
+        return {
+            "devices": len(results),
+            "provisioned": len(done),
+            "failed": len(results) - len(done),
+            "bytes": sum(r["bytes"] for r in done),
+            "seconds": round(elapsed, 3),
+            "devices_per_min": round(60 * len(done) / elapsed, 2),
+            "keygen_s_total": round(sum(r["keygen_s"] for r in done), 3),
+            "write_s_max": max((r["write_s"] for r in done), default=0.0),
+        }
+
+## @brief Punkt wejścia CLI do wdrażania kluczy na wiele tokenów.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Provision encrypted signing keys onto many USB tokens at once.")
+    parser.add_argument("manifest", help="JSON lines file: {\"drive\": ..., \"pin\" or \"pin_env\": ..., "
+                                         "\"public_key\": ...}")
+    parser.add_argument("--workers", type=int, default=None, help="number of key generation processes")
+    parser.add_argument("--io-workers", type=int, default=None, help="number of concurrent drive writes")
+    parser.add_argument("--key-size", type=int, default=4096, choices=(2048, 3072, 4096), help="RSA key size")
+    parser.add_argument("--public-dir", help="directory for public keys of entries without \"public_key\"")
+    parser.add_argument("--force", action="store_true", help="overwrite a key already present on a drive")
+    parser.add_argument("--kdf", help="PIN key derivation, e.g. scrypt:n=65536,r=8,p=1 or pbkdf2:iterations=600000")
+    args = parser.parse_args(argv)
+    if args.kdf:
+        try:
+            KeyContainer.parse_kdf(args.kdf)
+        except ValueError as error:
+            parser.error(str(error))
+
+    try:
+        jobs = ProvisioningPipeline.load_manifest(args.manifest)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if not jobs:
+        parser.error("manifest lists no drives")
+
+    pipeline = ProvisioningPipeline(args.workers, args.io_workers, args.key_size, args.public_dir, args.force,
+                                    args.kdf)
+    results, summary = pipeline.run(
+        jobs, on_result=lambda r: print(json.dumps(r), flush=True),
+        on_status=lambda drive, status: print(f"{drive}: {status}", file=sys.stderr, flush=True))
+    print(json.dumps({"summary": summary}))
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
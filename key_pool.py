@@ -0,0 +1,160 @@
+## @file key_pool.py
+#  @brief Pula wcześniej wygenerowanych par kluczy RSA, uzupełniana w tle przez procesy robocze.
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+## @brief Generuje parę kluczy w procesie roboczym.
+#  @param key_size Długość klucza w bitach.
+#  @return Krotka (klucz prywatny w DER PKCS8, czas generowania w sekundach).
+def generate_key_der(key_size):
+    started = time.perf_counter()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    der = key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption())
+    return der, time.perf_counter() - started
+
+## @brief Wczytuje klucz zwrócony przez generate_key_der.
+#  Klucz pochodzi z własnego procesu roboczego, więc kosztowna walidacja RSA jest zbędna.
+#  @param der Klucz prywatny w DER PKCS8.
+#  @return Klucz prywatny RSA.
+def load_generated_key(der):
+    return serialization.load_der_private_key(der, password=None, unsafe_skip_rsa_key_validation=True)
+
+## @class KeyPairPool
+#  @brief Utrzymuje zapas gotowych kluczy RSA, aby wdrożenie tokenu nie czekało na generowanie klucza.
+class KeyPairPool:
+    ## @brief Opóźnienie ponownej próby po nieudanym generowaniu (s); podwajane przy kolejnych błędach.
+    RETRY_DELAY = 0.5
+    ## @brief Maksymalne opóźnienie ponownej próby (s).
+    RETRY_MAX_DELAY = 30.0
+
+    ## @brief Konstruktor klasy.
+    #  @param target_depth Docelowa liczba gotowych kluczy w puli.
+    #  @param workers Liczba procesów generujących (None - min(target_depth, liczba rdzeni)).
+    #  @param key_size Długość generowanych kluczy w bitach.
+    def __init__(self, target_depth=4, workers=None, key_size=4096):
+        self.target_depth = target_depth
+        self.workers = workers or max(1, min(target_depth, os.cpu_count() or 1))
+        self.key_size = key_size
+        self.ready = deque()
+        self.in_flight = 0
+        self.generated = 0
+        self.taken = 0
+        self.waits = 0
+        self.generation_seconds = 0.0
+        self.errors = 0
+        self.failures_in_row = 0
+        self.retry_timer = None
+        self.started_at = None
+        self.condition = threading.Condition()
+        self.executor = None
+
+    ## @brief Uruchamia procesy robocze i zaczyna wypełniać pulę.
+    def start(self):
+        with self.condition:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers)
+                self.started_at = time.monotonic()
+            self._refill_locked()
+        return self
+
+    ## @brief Zatrzymuje procesy robocze i usuwa gotowe klucze z pamięci.
+    def shutdown(self):
+        with self.condition:
+            executor, self.executor = self.executor, None
+            self.ready.clear()
+            if self.retry_timer is not None:
+                self.retry_timer.cancel()
+                self.retry_timer = None
+            self.condition.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    ## @brief Pobiera gotowy klucz i zleca uzupełnienie puli w tle.
+    #  Gdy pula jest pusta, czeka na najbliższy generowany klucz.
+    #  @param timeout Maksymalny czas oczekiwania w sekundach (None - bez limitu).
+    #  @return Klucz prywatny RSA.
+    #  @throw TimeoutError gdy klucz nie był gotowy w zadanym czasie.
+    #  @throw RuntimeError gdy pula nie została uruchomiona, została zatrzymana w trakcie oczekiwania
+    #  albo generowanie się nie powiodło (ponowna próba jest zaplanowana w tle).
+    def take(self, timeout=None):
+        with self.condition:
+            if self.executor is None:
+                raise RuntimeError("Key pool is not running")
+            if not self.ready:
+                self.waits += 1
+                self._refill_locked(minimum=1)
+                ready = lambda: self.ready or self.executor is None or not self.in_flight
+                if not self.condition.wait_for(ready, timeout):
+                    raise TimeoutError("No key became available in time")
+                if not self.ready:
+                    raise RuntimeError("Key pool was shut down or key generation failed")
+            der = self.ready.popleft()
+            self.taken += 1
+            self._refill_locked()
+        return load_generated_key(der)
+
+    ## @brief Zwraca metryki puli.
+    #  @return Słownik z głębokością, liczbą zadań w toku, liczbą wygenerowanych kluczy i tempem generowania.
+    def metrics(self):
+        with self.condition:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            return {
+                "depth": len(self.ready),
+                "target_depth": self.target_depth,
+                "in_flight": self.in_flight,
+                "generated": self.generated,
+                "taken": self.taken,
+                "waits": self.waits,
+                "errors": self.errors,
+                "keys_per_s": round(self.generated / elapsed, 3) if elapsed else 0.0,
+                "avg_generation_s": round(self.generation_seconds / self.generated, 3) if self.generated else 0.0,
+            }
+
+    def _refill_locked(self, minimum=0):
+        if self.executor is None or self.retry_timer is not None:
+            return
+        while len(self.ready) + self.in_flight < max(self.target_depth, minimum):
+            self.in_flight += 1
+            self.executor.submit(generate_key_der, self.key_size).add_done_callback(self._on_generated)
+
+    def _on_generated(self, future):
+        with self.condition:
+            self.in_flight -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.errors += 1
+                self.failures_in_row += 1
+                self._schedule_retry_locked()
+            elif self.executor is not None:
+                der, seconds = future.result()
+                self.ready.append(der)
+                self.generated += 1
+                self.failures_in_row = 0
+                self.generation_seconds += seconds
+                self._refill_locked()
+            self.condition.notify_all()
+
+    ## @brief Planuje uzupełnienie puli po nieudanym generowaniu, z wykładniczo rosnącym opóźnieniem,
+    #  aby pula nie opróżniła się na stałe, ale też nie zapętliła się na trwałym błędzie.
+    def _schedule_retry_locked(self):
+        if self.executor is None or self.retry_timer is not None:
+            return
+        delay = min(self.RETRY_MAX_DELAY, self.RETRY_DELAY * 2 ** (self.failures_in_row - 1))
+        self.retry_timer = threading.Timer(delay, self._retry)
+        self.retry_timer.daemon = True
+        self.retry_timer.start()
+
+    def _retry(self):
+        with self.condition:
+            self.retry_timer = None
+            self._refill_locked()
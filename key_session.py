@@ -0,0 +1,130 @@
+## @file key_session.py
+#  @brief Pamięć podręczna sesji odszyfrowanych kluczy prywatnych z limitem bezczynności i liczby użyć.
+import os
+import threading
+import time
+
+from device_events import DeviceEvent, shared_hub
+from utils import KeyDecryptor
+
+## @class KeySession
+#  @brief Pojedyncza sesja - odszyfrowany klucz prywatny wraz z licznikiem użyć i czasem ostatniego użycia.
+class KeySession:
+    ## @brief Konstruktor klasy.
+    #  @param private_key Odszyfrowany klucz prywatny RSA.
+    def __init__(self, private_key):
+        self.key = private_key
+        self.uses = 0
+        self.last_used = time.monotonic()
+        self.timer = None
+
+    ## @brief Usuwa referencję do klucza i anuluje timer bezczynności.
+    #  Obiekt klucza OpenSSL czyści swoją pamięć przy zwolnieniu ostatniej referencji.
+    def clear(self):
+        self.key = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+## @class KeySessionManager
+#  @brief Przechowuje odszyfrowane klucze między operacjami podpisu, aby nie odszyfrowywać ich za każdym razem.
+#  Sesja wygasa po idle_ttl sekundach bezczynności, po max_uses użyciach lub po odłączeniu nośnika z kluczem.
+class KeySessionManager:
+    ## @brief Konstruktor klasy.
+    #  @param idle_ttl Czas bezczynności (s), po którym klucz jest usuwany z pamięci.
+    #  @param max_uses Maksymalna liczba użyć klucza w jednej sesji.
+    #  @param events Hub zdarzeń urządzeń; odłączenie nośnika usuwa jego sesje (None - bez subskrypcji).
+    def __init__(self, idle_ttl=300.0, max_uses=50, events=None):
+        self.idle_ttl = idle_ttl
+        self.max_uses = max_uses
+        self.sessions = {}
+        self.lock = threading.Lock()
+        if events is not None:
+            events.subscribe(self.on_device_event)
+
+    ## @brief Normalizuje ścieżkę klucza używaną jako identyfikator sesji.
+    @staticmethod
+    def _normalize(key_path):
+        return os.path.normcase(os.path.abspath(key_path))
+
+    ## @brief Zwraca klucz z aktywnej sesji i zalicza jedno użycie.
+    #  @param key_path Ścieżka do zaszyfrowanego klucza na nośniku.
+    #  @return Klucz prywatny lub None, gdy sesji nie ma albo wygasła.
+    def get(self, key_path):
+        path = self._normalize(key_path)
+        with self.lock:
+            session = self.sessions.get(path)
+            if session is None:
+                return None
+            if time.monotonic() - session.last_used >= self.idle_ttl:
+                self._evict_locked(path)
+                return None
+            return self._use_locked(path, session)
+
+    ## @brief Odszyfrowuje klucz, otwiera dla niego sesję i zalicza pierwsze użycie.
+    #  @param key_path Ścieżka do zaszyfrowanego klucza na nośniku.
+    #  @param encrypted_key Zawartość pliku z zaszyfrowanym kluczem.
+    #  @param pin Kod PIN.
+    #  @return Odszyfrowany klucz prywatny RSA.
+    def unlock(self, key_path, encrypted_key, pin):
+        private_key = KeyDecryptor(encrypted_key, pin).get_private_key()
+        path = self._normalize(key_path)
+        session = KeySession(private_key)
+        with self.lock:
+            self._evict_locked(path)
+            self.sessions[path] = session
+            return self._use_locked(path, session)
+
+    ## @brief Usuwa sesję danego klucza lub wszystkie sesje.
+    #  @param key_path Ścieżka do klucza (None - wszystkie sesje).
+    def evict(self, key_path=None):
+        with self.lock:
+            paths = list(self.sessions) if key_path is None else [self._normalize(key_path)]
+            for path in paths:
+                self._evict_locked(path)
+
+    ## @brief Usuwa sesje kluczy leżących na odłączonym nośniku.
+    #  @param event Obiekt DeviceEvent.
+    def on_device_event(self, event):
+        if event.kind != DeviceEvent.REMOVED:
+            return
+        prefix = os.path.join(self._normalize(event.path), "")
+        with self.lock:
+            for path in [p for p in self.sessions if p.startswith(prefix)]:
+                self._evict_locked(path)
+
+    def _use_locked(self, path, session):
+        key = session.key
+        session.uses += 1
+        session.last_used = time.monotonic()
+        if session.uses >= self.max_uses:
+            self._evict_locked(path)
+            return key
+        if session.timer is not None:
+            session.timer.cancel()
+        session.timer = threading.Timer(self.idle_ttl, self._expire, args=(path, session))
+        session.timer.daemon = True
+        session.timer.start()
+        return key
+
+    def _expire(self, path, session):
+        with self.lock:
+            if self.sessions.get(path) is session:
+                self._evict_locked(path)
+
+    def _evict_locked(self, path):
+        session = self.sessions.pop(path, None)
+        if session is not None:
+            session.clear()
+
+## @brief Wspólny menedżer sesji aplikacji, powiązany ze wspólnym hubem zdarzeń.
+_shared_sessions = None
+_shared_lock = threading.Lock()
+
+## @brief Zwraca (i przy pierwszym wywołaniu tworzy) wspólny menedżer sesji kluczy.
+def shared_sessions():
+    global _shared_sessions
+    with _shared_lock:
+        if _shared_sessions is None:
+            _shared_sessions = KeySessionManager(events=shared_hub())
+        return _shared_sessions
@@ -0,0 +1,211 @@
+## @file signature_checker.py
+#  @brief Weryfikacja podpisów PDF bez GUI - wspólna dla okna weryfikatora, narzędzi wsadowych i serwera.
+import mmap
+import os
+
+import hash_backends
+import instrumentation
+from cryptography.exceptions import InvalidSignature
+from utils import ChainedSignature, PublicKeyCache, SignatureManifest, SignatureTrailer, StreamHasher
+from verification_cache import VerificationCache
+
+## @class PDFSignatureChecker
+#  @brief Klasa odpowiadająca za weryfikację podpisów PDF.
+class PDFSignatureChecker:
+    ## @brief Inicjalizuje weryfikator.
+    #  @param document_path Ścieżka do podpisanego PDF.
+    #  @param rsa_pub_key Klucz publiczny RSA do weryfikacji.
+    #  @param signature_path Plik podpisu odłączonego lub manifest (None - plik ".sig" obok dokumentu,
+    #  a gdy go nie ma, podpis dopisany na końcu dokumentu).
+    def __init__(self, document_path, rsa_pub_key, signature_path=None):
+        self.pdf_path = document_path
+        self.pub_key = rsa_pub_key
+        self.signature_path = signature_path
+        self.data = None
+        self.signature = None
+        self.content = None
+        self.document_hash = None
+        self.version = None
+        self.manifest = None
+        self.expected_digest = None
+        self.hash_name = hash_backends.DEFAULT_ALGORITHM
+
+    ## @brief Wczytuje podpis odłączony (manifest lub dowód Merkle), jeśli dokument go ma.
+    #  @return True dla podpisu odłączonego, False dla podpisu dopisanego na końcu dokumentu.
+    #  @throw ValueError gdy manifest jest nieprawidłowy lub nie obejmuje dokumentu.
+    def load_detached(self):
+        if self.manifest is not None:
+            return True
+        path = self.signature_path
+        if path is None:
+            path = SignatureManifest.sidecar_path(self.pdf_path)
+            if not os.path.isfile(path):
+                return False
+        manifest = SignatureManifest.load(path)
+        self.expected_digest = manifest.digest_for(self.pdf_path, path)
+        self.manifest = manifest
+        self.signature = manifest.signature
+        self.hash_name = manifest.hash_name
+        self.version = SignatureTrailer.VERSION_PREHASHED
+        return True
+
+    ## @brief Zwraca klucz pamięci podręcznej dla skrótu treści dokumentu z podpisem odłączonym.
+    #  Wymaga wcześniejszego load_detached.
+    #  @param key_fingerprint Odcisk klucza publicznego.
+    def detached_cache_key(self, key_fingerprint):
+        layout = self.manifest.layout() if isinstance(self.manifest, ChainedSignature) else None
+        return VerificationCache.detached_key(key_fingerprint, self.hash_name, layout)
+
+    ## @brief Liczy skrót treści - skrót całości, a dla podpisu łańcuchowego wartość łańcucha
+    #  liczoną segment po segmencie.
+    #  @param read_range Funkcja (początek, koniec) -> skrót tego zakresu treści algorytmem hash_name.
+    #  @param size Długość treści.
+    def content_digest(self, read_range, size):
+        if isinstance(self.manifest, ChainedSignature):
+            return self.manifest.chain_content(read_range, size)
+        return read_range(0, size)
+
+    ## @brief Oddziela treść pliku PDF od podpisu (ostatnie 512 bajtów lub podpis ze stopką wersji).
+    #  Przy podpisie odłączonym treścią jest cały plik.
+    def split_content_and_signature(self):
+        with instrumentation.stage("file.read") as timing, open(self.pdf_path, 'rb') as f:
+            self.data = f.read()
+            timing.add_bytes(len(self.data))
+        if self.load_detached():
+            self.content = self.data
+            return
+        self.version, offset, sig_len, self.hash_name = SignatureTrailer.locate(
+            self.data[-SignatureTrailer.FOOTER.size:], len(self.data))
+        self.signature = self.data[offset:offset + sig_len]
+        self.content = self.data[:offset]
+
+    ## @brief Weryfikuje podpis przy pomocy klucza publicznego.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    def perform_check(self):
+        content = memoryview(self.content)
+        self.document_hash = self.content_digest(
+            lambda begin, end: StreamHasher.hash_bytes(content[begin:end], self.hash_name), len(content))
+        self.verify_digest(self.pub_key)
+
+    ## @brief Weryfikuje podpis strumieniowo, przy stałym zużyciu pamięci.
+    #  Podpis odczytywany jest przez seek na koniec pliku, a hashowana jest tylko treść przed nim.
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @throw ValueError gdy plik jest krótszy niż podpis.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    def perform_streaming_check(self, progress=None):
+        self.hash_streaming(progress)
+        self.verify_digest(self.pub_key)
+
+    ## @brief Odczytuje podpis przez seek i strumieniowo hashuje treść dokumentu.
+    #  Wynik zapisywany jest w polach version, signature, hash_name i document_hash.
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @throw ValueError gdy plik jest krótszy niż podpis.
+    def hash_streaming(self, progress=None):
+        detached = self.load_detached()
+        with open(self.pdf_path, 'rb') as f:
+            if detached:
+                content_size = os.fstat(f.fileno()).st_size
+            else:
+                self.version, self.signature, content_size, self.hash_name = SignatureTrailer.read(
+                    f, os.fstat(f.fileno()).st_size)
+
+            def read_range(begin, end):
+                f.seek(begin)
+                return StreamHasher.hash_stream(
+                    f, end - begin, progress=progress and (lambda count: progress(begin + count)),
+                    algorithm=self.hash_name)
+            self.document_hash = self.content_digest(read_range, content_size)
+
+    ## @brief Weryfikuje podpis na pliku odwzorowanym w pamięci (mmap).
+    #  Treść trafia do funkcji skrótu jako memoryview bez kopiowania, a strony pliku współdzielone są
+    #  w pamięci podręcznej systemu między równoległymi weryfikacjami.
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @throw ValueError gdy plik jest krótszy niż podpis.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    def perform_mapped_check(self, progress=None):
+        self.hash_mapped(progress)
+        self.verify_digest(self.pub_key)
+
+    ## @brief Odczytuje podpis z końca odwzorowanego pliku i hashuje treść przez memoryview.
+    #  Po zakończeniu obiekt nie przechowuje żadnych buforów z treścią pliku.
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @throw ValueError gdy plik jest krótszy niż podpis.
+    def hash_mapped(self, progress=None):
+        detached = self.load_detached()
+        with open(self.pdf_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                if detached:
+                    self.document_hash = self.content_digest(
+                        lambda begin, end: StreamHasher.hash_bytes(b"", self.hash_name), 0)
+                    return
+                raise ValueError("File is too short to contain a signature")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as view:
+                    if detached:
+                        offset = size
+                    else:
+                        self.version, offset, sig_len, self.hash_name = SignatureTrailer.locate(
+                            bytes(view[-SignatureTrailer.FOOTER.size:]), size)
+                        self.signature = bytes(view[offset:offset + sig_len])
+                    with view[:offset] as content:
+                        def read_range(begin, end):
+                            with content[begin:end] as part:
+                                return StreamHasher.hash_buffer(
+                                    part, progress=progress and (lambda count: progress(begin + count)),
+                                    algorithm=self.hash_name)
+                        self.document_hash = self.content_digest(read_range, offset)
+
+    ## @brief Weryfikuje podpis z użyciem trwałej pamięci podręcznej wyników.
+    #  Jeśli plik (urządzenie, i-węzeł, rozmiar, mtime_ns) nie zmienił się od poprzedniej weryfikacji
+    #  tym samym kluczem, zwracany jest zapamiętany wynik bez hashowania i bez operacji RSA.
+    #  Podpis odłączony może zmienić się bez zmiany dokumentu, więc dla niego z pamięci podręcznej
+    #  brany jest tylko skrót treści (zapamiętany dla tego samego rodzaju podpisu i podziału na segmenty),
+    #  a manifest sprawdzany jest zawsze.
+    #  @param cache Obiekt VerificationCache.
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @return True, gdy wynik (lub skrót treści) pochodzi z pamięci podręcznej.
+    #  @throw InvalidSignature gdy podpis się nie zgadza (również zapamiętany).
+    def perform_cached_check(self, cache, progress=None):
+        key_fingerprint = PublicKeyCache.fingerprint(self.pub_key)
+        detached = self.load_detached()
+        if detached:
+            key_fingerprint = self.detached_cache_key(key_fingerprint)
+        identity = VerificationCache.file_identity(self.pdf_path)
+        verdict = cache.lookup(identity, key_fingerprint)
+        if verdict is not None and detached:
+            self.document_hash = verdict.digest
+            self.verify_digest(self.pub_key)
+            return True
+        if verdict is not None:
+            self.document_hash, self.version = verdict.digest, verdict.version
+            if not verdict.valid:
+                raise InvalidSignature("Cached verdict: signature does not match")
+            return True
+
+        self.hash_streaming(progress)
+        try:
+            self.verify_digest(self.pub_key)
+            valid = True
+        except InvalidSignature:
+            valid = False
+        if VerificationCache.file_identity(self.pdf_path) == identity:
+            cache.store(identity, key_fingerprint, self.document_hash, valid, self.version)
+        if not valid:
+            raise InvalidSignature("Signature does not match")
+        return False
+
+    ## @brief Sprawdza odczytany podpis względem policzonego skrótu treści.
+    #  Przy podpisie odłączonym skrót musi być równy skrótowi z manifestu (lub dowodu Merkle),
+    #  a manifest (lub korzeń drzewa) - podpisany kluczem.
+    #  @param rsa_pub_key Klucz publiczny RSA.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    def verify_digest(self, rsa_pub_key):
+        if self.manifest is not None:
+            if self.document_hash != self.expected_digest:
+                raise InvalidSignature("Document digest does not match the detached signature")
+            self.manifest.verify(rsa_pub_key)
+            return
+        SignatureTrailer.verify(rsa_pub_key, self.signature, self.document_hash, self.version, self.hash_name)
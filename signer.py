@@ -1,52 +1,98 @@
 ## @file signer.py
 #  @brief Obsługuje podpisywanie dokumentów PDF po odnalezieniu zaszyfrowanego klucza na urządzeniu USB.
 import threading
-from utils import DriveWatcher, KeyDecryptor
+import instrumentation
+from device_events import DeviceEvent, shared_hub
+from key_session import shared_sessions
+from utils import DriveWatcher
 ## @class SecurePDFSigner
 #  @brief Klasa odpowiedzialna za proces podpisywania PDF przy użyciu zaszyfrowanego klucza RSA z nośnika USB.
 class SecurePDFSigner:
     ## @brief Konstruktor klasy.
     #  @param gui Obiekt GUI umożliwiający interakcję z użytkownikiem.
-    def __init__(self, gui):
+    #  @param events Hub zdarzeń urządzeń (None - wspólny hub aplikacji).
+    #  @param sessions Menedżer sesji odszyfrowanych kluczy (None - wspólny menedżer aplikacji).
+    def __init__(self, gui, events=None, sessions=None):
         self.gui = gui
+        self.events = events
+        self.sessions = sessions
+        self.detector = DriveWatcher("private_encrypted.pem", events)
+        self.token_lock = threading.Lock()
+        self.token_path = None
 
     ## @brief Wypisuje komunikat do GUI.
     #  @param text Tekst do wyświetlenia.
     def log_msg(self, text):
         self.gui.log_msg(text)
 
-    ## @brief Nasłuchuje podłączenia urządzenia z zaszyfrowanym kluczem prywatnym.
-    #  Po wykryciu odpowiedniego pliku, rozpoczyna proces podpisywania.
-    def device_listener(self):
-        detector = DriveWatcher("private_encrypted.pem")
-        key_path = detector.wait_for_media()
-        self.log_msg(f"Secure token located: {key_path}")
+    ## @brief Obsługuje zdarzenie urządzenia - sprawdza, czy nowy nośnik zawiera zaszyfrowany klucz prywatny.
+    #  @param event Obiekt DeviceEvent.
+    def device_listener(self, event):
+        if event.kind != DeviceEvent.ADDED:
+            return
+        key_path = self.detector.locate(event.path)
+        if key_path:
+            self.token_found(key_path)
+
+    ## @brief Rozpoczyna proces podpisywania dla pierwszego odnalezionego tokenu.
+    #  @param key_path Ścieżka do zaszyfrowanego klucza prywatnego.
+    def token_found(self, key_path):
+        with self.token_lock:
+            if self.token_path is not None:
+                return
+            self.token_path = key_path
+        self.events.unsubscribe(self.device_listener)
+        self.gui.after(0, lambda: self.log_msg(f"Secure token located: {key_path}"))
         self.gui.after(0, lambda: self.initiate_signature(key_path))
 
-    ## @brief Odszyfrowuje klucz i uruchamia dialog podpisywania pliku.
+    ## @brief Otwiera okno podpisywania dla odnalezionego tokenu.
+    #  Okno przechowuje tylko ścieżkę klucza i przy każdym podpisie pobiera klucz przez acquire_key,
+    #  więc limit bezczynności, liczby użyć i odłączenie nośnika obowiązują także dla otwartego okna.
     #  @param key_location Ścieżka do zaszyfrowanego klucza prywatnego na pendrive.
     def initiate_signature(self, key_location):
-        try:
-            with open(key_location, 'rb') as enc_file:
-                encrypted_key = enc_file.read()
-        except Exception as error:
-            self.log_msg(f"Error: {error}")
+        self.gui.sign_file_dialog(key_location, self.acquire_key)
+
+    ## @brief Przekazuje klucz z aktywnej sesji, a gdy jej nie ma lub wygasła - pyta o PIN i odszyfrowuje klucz.
+    #  PIN pobierany jest w wątku GUI; odczyt pliku z nośnika i odszyfrowanie (KDF) wykonywane są jako zadanie
+    #  TaskExecutor okna, którego wynik wraca do wątku GUI.
+    #  @param key_location Ścieżka do zaszyfrowanego klucza prywatnego na pendrive.
+    #  @param on_key Funkcja wywoływana w wątku GUI z kluczem prywatnym RSA albo None (błąd odczytu,
+    #  anulowany PIN, błędny PIN).
+    def acquire_key(self, key_location, on_key):
+        self.sessions = self.sessions or shared_sessions()
+        decrypted_key = self.sessions.get(key_location)
+        if decrypted_key is not None:
+            self.log_msg("Using unlocked key session")
+            on_key(decrypted_key)
             return
 
         pin = self.gui.get_pin_from_user()
         if not pin:
             self.log_msg("PIN entry cancelled")
+            on_key(None)
             return
 
-        try:
-            decrypted_key = KeyDecryptor(encrypted_key, pin).get_private_key()
-        except Exception as error:
-            self.log_msg(f"Decryption error: {error}")
-            return
+        def unlock(task):
+            with instrumentation.stage("usb.read") as timing, open(key_location, 'rb') as enc_file:
+                encrypted_key = enc_file.read()
+                timing.add_bytes(len(encrypted_key))
+            return self.sessions.unlock(key_location, encrypted_key, pin)
+
+        def unlocked(task):
+            if task.error is not None:
+                self.log_msg(f"Decryption error: {task.error}")
+            on_key(task.result)
 
-        self.gui.sign_file_dialog(decrypted_key)
+        self.log_msg("Unlocking key...")
+        self.gui.executor.submit("Unlock key", unlock, on_done=unlocked)
 
-    ## @brief Uruchamia wątek nasłuchujący i główną pętlę GUI.
+    ## @brief Subskrybuje zdarzenia urządzeń, sprawdza już podłączone nośniki i uruchamia pętlę GUI.
     def run(self):
-        threading.Thread(target=self.device_listener, daemon=True).start()
+        self.events = (self.events or shared_hub()).start()
+        self.events.subscribe(self.device_listener)
+        for drive in self.events.current():
+            key_path = self.detector.locate(drive)
+            if key_path:
+                self.token_found(key_path)
+                break
         self.gui.mainloop()
@@ -0,0 +1,329 @@
+## @file signing_server.py
+#  @brief Serwer asyncio udostępniający podpisywanie i weryfikację przez gniazdo Unix lub lokalny TCP.
+#  Protokół: nagłówek JSON zakończony znakiem nowej linii, po nim dokładnie "length" bajtów treści.
+#  Odpowiedź: nagłówek JSON z polem "status", a dla podpisu także strumień bajtów o długości "length".
+#  Przy weryfikacji opcjonalne pole "hash" podaje algorytm skrótu z podpisu (domyślnie sha256).
+#  Gdy serwer ma ustawiony token (obowiązkowo w trybie TCP, do którego może połączyć się każdy lokalny
+#  użytkownik), każde żądanie musi zawierać go w polu "token".
+import argparse
+import asyncio
+import getpass
+import hmac
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_backends
+from cryptography.exceptions import InvalidSignature
+from utils import CHUNK_SIZE, DigitalSigner, KeyDecryptor, PublicKeyCache, SignatureTrailer, StreamHasher
+
+logger = logging.getLogger(__name__)
+
+## @brief Maksymalna długość wiersza nagłówka żądania.
+HEADER_LIMIT = 64 * 1024
+## @brief Liczba końcowych bajtów wstrzymywanych przy weryfikacji, aby znaleźć w nich podpis.
+TRAILER_WINDOW = 8192
+
+## @class SigningServer
+#  @brief Obsługuje żądania podpisu i weryfikacji jednym odszyfrowanym kluczem.
+#  Żądania trafiają do ograniczonej kolejki; gdy jest pełna, serwer przestaje czytać z gniazd klientów
+#  (backpressure). Hashowanie i operacje RSA wykonywane są w puli wątków.
+class SigningServer:
+    ## @brief Konstruktor klasy.
+    #  @param private_key Odszyfrowany klucz prywatny RSA.
+    #  @param verify_keys Dodatkowe klucze publiczne do weryfikacji (lista krotek (odcisk, klucz)).
+    #  @param workers Liczba równolegle obsługiwanych żądań i wątków obliczeniowych.
+    #  @param queue_size Pojemność kolejki oczekujących żądań.
+    #  @param hash_name Algorytm skrótu treści podpisywanych dokumentów.
+    #  @param token Wspólny sekret wymagany w każdym żądaniu (None - bez uwierzytelniania, tylko gniazdo Unix).
+    def __init__(self, private_key, verify_keys=(), workers=None, queue_size=64,
+                 hash_name=hash_backends.DEFAULT_ALGORITHM, token=None):
+        self.token = token.encode() if isinstance(token, str) else token
+        self.signer = DigitalSigner(private_key, hash_name=hash_name)
+        public_key = private_key.public_key()
+        self.keys = [(PublicKeyCache.fingerprint(public_key), public_key)] + list(verify_keys)
+        self.trailer_size = len(self.signer.trailer(bytes(private_key.key_size // 8)))
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(self.workers)
+        self.jobs = None
+        self.server = None
+
+    ## @brief Uruchamia serwer na gnieździe Unix (dostęp tylko dla właściciela).
+    #  Gniazdo tworzone jest przy umask 0177, więc od chwili bind ma uprawnienia 0600.
+    #  @param path Ścieżka gniazda.
+    async def start_unix(self, path):
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        self._start_workers()
+        previous = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path, limit=HEADER_LIMIT)
+        finally:
+            os.umask(previous)
+        return self.server
+
+    ## @brief Uruchamia serwer TCP (domyślnie tylko na interfejsie lokalnym).
+    #  @throw ValueError gdy serwer nie ma tokenu - port TCP jest dostępny dla wszystkich użytkowników.
+    async def start_tcp(self, port, host="127.0.0.1"):
+        if not self.token:
+            raise ValueError("TCP mode requires a shared-secret token")
+        self._start_workers()
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=HEADER_LIMIT)
+        return self.server
+
+    def _start_workers(self):
+        self.jobs = asyncio.Queue(self.queue_size)
+        for _ in range(self.workers):
+            asyncio.get_running_loop().create_task(self._worker())
+
+    ## @brief Czyta kolejne żądania z połączenia i umieszcza je w kolejce.
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    header = json.loads(line)
+                    if not self.authorized(header):
+                        await self._send_header(writer, {"status": "error", "error": "Unauthorized"})
+                        break
+                    header["length"] = int(header["length"])
+                    if header.get("op") not in ("sign", "verify") or header["length"] < 0:
+                        raise ValueError("op must be 'sign' or 'verify' and length must be non-negative")
+                    hash_backends.get(header.get("hash", hash_backends.DEFAULT_ALGORITHM))
+                except (ValueError, KeyError, TypeError) as error:
+                    await self._send_header(writer, {"status": "error", "error": f"Bad request: {error}"})
+                    break
+                done = loop.create_future()
+                await self.jobs.put((header, reader, writer, done))
+                if not await done:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    ## @brief Sprawdza token żądania (porównanie w stałym czasie).
+    #  @param header Nagłówek żądania.
+    #  @return True gdy serwer nie wymaga tokenu albo token się zgadza.
+    def authorized(self, header):
+        if self.token is None:
+            return True
+        token = header.get("token")
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token)
+
+    async def _worker(self):
+        while True:
+            header, reader, writer, done = await self.jobs.get()
+            try:
+                if header["op"] == "sign":
+                    await self.handle_sign(header, reader, writer)
+                else:
+                    await self.handle_verify(header, reader, writer)
+                done.set_result(True)
+            except (ConnectionError, asyncio.IncompleteReadError) as error:
+                done.set_result(False)
+                logger.warning("Client disconnected during %s request: %s", header["op"], error)
+            except Exception:
+                done.set_result(False)
+                logger.exception("%s request failed", header["op"].capitalize())
+            finally:
+                self.jobs.task_done()
+
+    async def _send_header(self, writer, header):
+        writer.write(json.dumps(header).encode() + b"\n")
+        await writer.drain()
+
+    async def _compute(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    ## @brief Podpisuje dokument przesyłany strumieniowo.
+    #  Pole "output": "document" (domyślnie) - odsyłany jest dokument z dopisanym podpisem, blok po bloku,
+    #  równolegle z odbiorem; "trailer" - odsyłane są tylko bajty do dopisania na końcu dokumentu.
+    async def handle_sign(self, header, reader, writer):
+        echo = header.get("output", "document") == "document"
+        length = header["length"]
+        await self._send_header(writer, {"status": "ok", "length": (length if echo else 0) + self.trailer_size})
+        hasher = StreamHasher.new_hasher(self.signer.hash_name)
+        remaining = length
+        while remaining:
+            chunk = await reader.readexactly(min(CHUNK_SIZE, remaining))
+            remaining -= len(chunk)
+            await self._compute(hasher.update, chunk)
+            if echo:
+                writer.write(chunk)
+                await writer.drain()
+        signature = await self._compute(self.signer.sign_digest, hasher.digest())
+        writer.write(self.signer.trailer(signature))
+        await writer.drain()
+
+    ## @brief Weryfikuje podpisany dokument przesyłany strumieniowo.
+    #  Ostatnie TRAILER_WINDOW bajtów wstrzymywane jest przed hashowaniem, bo zawiera podpis.
+    #  Treść hashowana jest algorytmem z pola "hash", zanim stopka jest znana; jeśli stopka wskazuje
+    #  inny algorytm, odsyłany jest błąd z jego nazwą.
+    async def handle_verify(self, header, reader, writer):
+        length = header["length"]
+        hash_name = header.get("hash", hash_backends.DEFAULT_ALGORITHM)
+        hasher = StreamHasher.new_hasher(hash_name)
+        tail = b""
+        remaining = length
+        while remaining:
+            data = tail + await reader.readexactly(min(CHUNK_SIZE, remaining))
+            remaining -= len(data) - len(tail)
+            if len(data) > TRAILER_WINDOW:
+                await self._compute(hasher.update, data[:-TRAILER_WINDOW])
+                data = data[-TRAILER_WINDOW:]
+            tail = data
+
+        try:
+            version, offset, sig_len, signed_hash = SignatureTrailer.locate(tail, length)
+            start = offset - (length - len(tail))
+            if start < 0:
+                raise ValueError("Signature is larger than the trailer window")
+            if signed_hash != hash_name:
+                raise ValueError(f'Document is signed with {signed_hash}; resend with "hash": "{signed_hash}"')
+        except ValueError as error:
+            await self._send_header(writer, {"status": "error", "error": str(error)})
+            return
+        hasher.update(tail[:start])
+        digest = hasher.digest()
+        signature = tail[start:start + sig_len]
+        result = await self._compute(self._verify_keys, signature, digest, version, hash_name)
+        await self._send_header(writer, {"status": "ok", "valid": result is not None, "key": result,
+                                         "version": version, "hash": hash_name, "digest": digest.hex()})
+
+    def _verify_keys(self, signature, digest, version, hash_name):
+        for key_fingerprint, key in self.keys:
+            try:
+                SignatureTrailer.verify(key, signature, digest, version, hash_name)
+                return key_fingerprint
+            except InvalidSignature:
+                continue
+        return None
+
+## @class SigningClient
+#  @brief Prosty, blokujący klient serwera podpisu.
+class SigningClient:
+    ## @brief Konstruktor klasy.
+    #  @param socket_path Ścieżka gniazda Unix (albo None, gdy używany jest TCP).
+    #  @param port Port TCP na interfejsie lokalnym.
+    #  @param token Wspólny sekret serwera (wymagany w trybie TCP).
+    def __init__(self, socket_path=None, port=None, host="127.0.0.1", token=None):
+        self.socket_path = socket_path
+        self.address = (host, port)
+        self.token = token
+
+    def _header(self, op, length):
+        header = {"op": op, "length": length}
+        if self.token is not None:
+            header["token"] = self.token
+        return header
+
+    def _connect(self):
+        if self.socket_path:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(self.socket_path)
+        else:
+            conn = socket.create_connection(self.address)
+        return conn
+
+    @staticmethod
+    def _send_file(conn, path, header):
+        conn.sendall(json.dumps(header).encode() + b"\n")
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                conn.sendall(chunk)
+
+    ## @brief Podpisuje plik przez serwer i zapisuje podpisaną kopię.
+    #  @param source_path Dokument źródłowy.
+    #  @param target_path Ścieżka podpisanej kopii.
+    #  @return Nagłówek odpowiedzi serwera.
+    def sign_file(self, source_path, target_path):
+        header = self._header("sign", os.path.getsize(source_path))
+        with self._connect() as conn, conn.makefile('rb') as response:
+            sender = threading.Thread(target=self._send_file, args=(conn, source_path, header), daemon=True)
+            sender.start()
+            reply = json.loads(response.readline())
+            if reply.get("status") != "ok":
+                raise RuntimeError(reply.get("error", "Signing failed"))
+            remaining = reply["length"]
+            with open(target_path, 'wb') as out:
+                while remaining:
+                    chunk = response.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError("Server closed the connection early")
+                    out.write(chunk)
+                    remaining -= len(chunk)
+            sender.join()
+        return reply
+
+    ## @brief Weryfikuje podpisany plik przez serwer.
+    #  Algorytm skrótu odczytywany jest lokalnie ze stopki pliku i przekazywany w polu "hash".
+    #  @return Nagłówek odpowiedzi z polami valid, key, version, hash, digest.
+    def verify_file(self, path):
+        header = self._header("verify", os.path.getsize(path))
+        with open(path, 'rb') as f:
+            try:
+                header["hash"] = SignatureTrailer.read(f, header["length"])[3]
+            except ValueError:
+                pass
+        with self._connect() as conn, conn.makefile('rb') as response:
+            self._send_file(conn, path, header)
+            reply = json.loads(response.readline())
+        if reply.get("status") != "ok":
+            raise RuntimeError(reply.get("error", "Verification failed"))
+        return reply
+
+## @brief Punkt wejścia CLI serwera.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve PDF signing and verification on a local socket.")
+    parser.add_argument("--key", required=True, help="path to private_encrypted.pem")
+    parser.add_argument("--socket", help="Unix domain socket path")
+    parser.add_argument("--port", type=int, help="TCP port on 127.0.0.1 (when Unix sockets are unavailable)")
+    parser.add_argument("--verify-key", action="append", default=[], help="extra public key PEM for verify")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent requests and compute threads")
+    parser.add_argument("--queue-size", type=int, default=64, help="pending requests before backpressure")
+    parser.add_argument("--pin-env", help="read the PIN from this environment variable instead of prompting")
+    parser.add_argument("--hash", default=hash_backends.DEFAULT_ALGORITHM, choices=hash_backends.algorithms(),
+                        help="content hash algorithm for new signatures")
+    parser.add_argument("--token-env",
+                        help="environment variable with the shared secret clients must send (required with --port)")
+    args = parser.parse_args(argv)
+    if not args.socket and not args.port:
+        parser.error("one of --socket or --port is required")
+    token = os.environ.get(args.token_env) if args.token_env else None
+    if args.port and not args.socket and not token:
+        parser.error("--port requires --token-env naming a non-empty environment variable")
+
+    pin = os.environ.get(args.pin_env, "") if args.pin_env else getpass.getpass("PIN: ")
+    with open(args.key, 'rb') as enc_file:
+        private_key = KeyDecryptor(enc_file.read(), pin).get_private_key()
+    key_cache = PublicKeyCache()
+    verify_keys = [key_cache.load_file(path) for path in args.verify_key]
+    server = SigningServer(private_key, verify_keys, workers=args.workers, queue_size=args.queue_size,
+                           hash_name=args.hash, token=token)
+
+    async def serve():
+        listener = await (server.start_unix(args.socket) if args.socket else server.start_tcp(args.port))
+        print(f"Listening on {args.socket or f'127.0.0.1:{args.port}'}", flush=True)
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+## @file task_executor.py
+#  @brief Warstwa zadań w tle między GUI a klasami kryptograficznymi - pula wątków, postęp, ETA i anulowanie.
+#  Wątki robocze zmieniają wyłącznie pola obiektu Task; GUI odczytuje je w swojej pętli przez after(),
+#  więc żadne wywołanie Tk nie odbywa się poza wątkiem głównym.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+## @class TaskCancelled
+#  @brief Wyjątek przerywający zadanie anulowane przez operatora.
+class TaskCancelled(Exception):
+    pass
+
+## @class Task
+#  @brief Pojedyncze zadanie w tle wraz ze stanem, postępem i flagą anulowania.
+class Task:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    ## @brief Konstruktor klasy.
+    #  @param name Nazwa wyświetlana w GUI.
+    #  @param total_bytes Łączna liczba bajtów do przetworzenia (0 - nieznana).
+    def __init__(self, name, total_bytes=0):
+        self.name = name
+        self.total_bytes = total_bytes
+        self.bytes_done = 0
+        self.state = Task.QUEUED
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    ## @brief Czy zadanie już się zakończyło (sukcesem, błędem lub anulowaniem).
+    def finished(self):
+        return self.state in (Task.DONE, Task.FAILED, Task.CANCELLED)
+
+    ## @brief Zgłasza prośbę o anulowanie; zadanie w kolejce nie zostanie uruchomione.
+    def cancel(self):
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self.state = Task.CANCELLED
+            self.finished_at = time.monotonic()
+
+    ## @brief Funkcja postępu przekazywana do operacji strumieniowych.
+    #  @param bytes_done Łączna liczba przetworzonych bajtów.
+    #  @throw TaskCancelled gdy zadanie zostało anulowane.
+    def report(self, bytes_done):
+        if self.cancel_event.is_set():
+            raise TaskCancelled(self.name)
+        self.bytes_done = bytes_done
+
+    ## @brief Szacuje pozostały czas na podstawie dotychczasowego tempa.
+    #  @return Liczba sekund lub None, gdy nie da się jej oszacować.
+    def eta(self):
+        if self.state != Task.RUNNING or not self.total_bytes or not self.bytes_done:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return elapsed * (self.total_bytes - self.bytes_done) / self.bytes_done
+
+    ## @brief Zwraca jednowierszowy opis zadania do wyświetlenia w GUI.
+    def describe(self):
+        text = f"{self.name}: {self.state}"
+        if self.state == Task.RUNNING and self.total_bytes:
+            text += f" {100 * self.bytes_done // self.total_bytes}%"
+            eta = self.eta()
+            if eta is not None:
+                text += f", ETA {eta:.0f} s"
+        elif self.state == Task.FAILED:
+            text += f" ({type(self.error).__name__}: {self.error})"
+        return text
+
+## @class TaskExecutor
+#  @brief Wykonuje zadania w puli wątków i przekazuje ich postęp do wątku GUI przez after().
+class TaskExecutor:
+    POLL_MS = 100
+
+    ## @brief Konstruktor klasy.
+    #  @param root Widget Tk, którego metoda after() służy do odświeżania postępu.
+    #  @param workers Liczba zadań wykonywanych jednocześnie.
+    def __init__(self, root, workers=2):
+        self.root = root
+        self.pool = ThreadPoolExecutor(workers)
+        self.active = []
+        self.polling = False
+
+    ## @brief Dodaje zadanie do kolejki.
+    #  @param name Nazwa zadania.
+    #  @param work Funkcja (task) -> wynik, wykonywana w wątku roboczym; postęp zgłasza przez task.report.
+    #  @param total_bytes Łączna liczba bajtów do przetworzenia.
+    #  @param on_update Callback (task) wywoływany w wątku GUI przy każdym odświeżeniu.
+    #  @param on_done Callback (task) wywoływany w wątku GUI po zakończeniu zadania.
+    #  @return Obiekt Task.
+    def submit(self, name, work, total_bytes=0, on_update=None, on_done=None):
+        task = Task(name, total_bytes)
+        task.future = self.pool.submit(self._run, task, work)
+        self.active.append((task, on_update, on_done))
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_MS, self._poll)
+        return task
+
+    ## @brief Anuluje wszystkie zadania i zamyka pulę wątków.
+    def shutdown(self):
+        for task, _, _ in self.active:
+            task.cancel()
+        self.pool.shutdown(wait=False)
+
+    def _run(self, task, work):
+        if task.cancel_event.is_set():
+            task.state = Task.CANCELLED
+            task.finished_at = time.monotonic()
+            return
+        task.started_at = time.monotonic()
+        task.state = Task.RUNNING
+        try:
+            task.result = work(task)
+            task.state = Task.DONE
+        except TaskCancelled:
+            task.state = Task.CANCELLED
+        except Exception as error:
+            task.error = error
+            task.state = Task.FAILED
+        task.finished_at = time.monotonic()
+
+    def _poll(self):
+        current, self.active = self.active, []
+        for entry in current:
+            task, on_update, on_done = entry
+            if on_update:
+                on_update(task)
+            if not task.finished():
+                self.active.append(entry)
+            elif on_done:
+                on_done(task)
+        if self.active:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self.polling = False
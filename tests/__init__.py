@@ -0,0 +1,2 @@
+## @file tests/__init__.py
+#  @brief Testy formatów podpisów (uruchamiane przez "python -m pytest" lub "python -m unittest").
@@ -0,0 +1,274 @@
+## @file test_detached_signatures.py
+#  @brief Testy podpisów odłączonych: poprawny podpis, zmiana dokumentu lub podpisu, inny klucz
+#  oraz próba użycia podpisu jednego formatu jako podpisu innego formatu.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from bulk_verifier import BulkVerifier
+from signature_checker import PDFSignatureChecker
+from utils import ChainedSignature, DigitalSigner, MerkleProof, PublicKeyCache, SignatureManifest, SignatureTrailer
+from verification_cache import VerificationCache
+
+## @class DetachedSignatureTestCase
+#  @brief Wspólne klucze i katalog roboczy testów.
+class DetachedSignatureTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.signer = DigitalSigner(self.key)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def check(self, path, key, signature_path=None):
+        checker = PDFSignatureChecker(path, key.public_key(), signature_path)
+        checker.perform_streaming_check()
+
+    ## @brief Zmienia pole zapisanego podpisu odłączonego.
+    def edit_sidecar(self, path, **fields):
+        with open(path, 'r') as f:
+            document = json.load(f)
+        document.update(fields)
+        with open(path, 'w') as f:
+            json.dump(document, f)
+
+    ## @brief Podpis dopisywany do dokumentu o podanej treści (np. kanonicznych danych podpisu odłączonego).
+    def trailer_signature(self, content):
+        return self.signer.sign_data(content)
+
+    ## @brief Plik z treścią i cudzym podpisem w stopce wersji 2.
+    def forged_trailer(self, content, signature):
+        return self.write("forged.pdf", content + SignatureTrailer.build(signature, SignatureTrailer.VERSION_PREHASHED))
+
+## @class ManifestTest
+#  @brief Manifest podpisów (spdf-manifest).
+class ManifestTest(DetachedSignatureTestCase):
+    def sign(self):
+        path = self.write("doc.pdf", b"%PDF-1.7 manifest")
+        return path, self.signer.sign_detached(path)
+
+    def test_round_trip(self):
+        path, sidecar = self.sign()
+        self.check(path, self.key)
+        self.assertIsInstance(SignatureManifest.load(sidecar), SignatureManifest)
+
+    def test_modified_document_is_rejected(self):
+        path, _ = self.sign()
+        with open(path, 'ab') as f:
+            f.write(b"%%EOF")
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_modified_manifest_is_rejected(self):
+        path, sidecar = self.sign()
+        self.edit_sidecar(sidecar, key_id="0" * 64)
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_wrong_key_is_rejected(self):
+        path, _ = self.sign()
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.other_key)
+
+    def test_trailer_signature_is_not_a_manifest_signature(self):
+        path, sidecar = self.sign()
+        manifest = SignatureManifest.load(sidecar)
+        manifest.signature = self.trailer_signature(manifest.body())
+        with self.assertRaises(InvalidSignature):
+            manifest.verify(self.key.public_key())
+
+    def test_manifest_signature_is_not_a_trailer_signature(self):
+        _, sidecar = self.sign()
+        manifest = SignatureManifest.load(sidecar)
+        forged = self.forged_trailer(manifest.body(), manifest.signature)
+        with self.assertRaises(InvalidSignature):
+            self.check(forged, self.key)
+
+## @class MerkleProofTest
+#  @brief Dowody przynależności do partii podpisanej drzewem Merkle (spdf-merkle).
+class MerkleProofTest(DetachedSignatureTestCase):
+    def sign(self, count=3):
+        paths = [self.write(f"doc{i}.pdf", b"%%PDF-1.7 batch %d" % i) for i in range(count)]
+        self.signer.sign_merkle_batch(paths)
+        return paths
+
+    def setUp(self):
+        super().setUp()
+        # Sprawdzone korzenie są zapamiętywane w procesie; każdy test weryfikuje podpis od nowa.
+        MerkleProof._verified_roots.clear()
+
+    def test_round_trip(self):
+        for path in self.sign():
+            self.check(path, self.key)
+
+    def test_modified_document_is_rejected(self):
+        path = self.sign()[1]
+        with open(path, 'r+b') as f:
+            f.write(b"%PDF-1.4")
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_modified_proof_is_rejected(self):
+        path = self.sign()[0]
+        self.edit_sidecar(SignatureManifest.sidecar_path(path), leaf_count=4)
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_wrong_key_is_rejected(self):
+        path = self.sign()[2]
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.other_key)
+
+    def test_trailer_signature_is_not_a_root_signature(self):
+        proof = SignatureManifest.load(SignatureManifest.sidecar_path(self.sign()[0]))
+        statement = MerkleProof.root_statement(proof.root, proof.leaf_count, proof.key_id, proof.hash_name)
+        proof.signature = self.trailer_signature(statement)
+        with self.assertRaises(InvalidSignature):
+            proof.verify(self.key.public_key())
+
+    def test_root_signature_is_not_a_trailer_or_manifest_signature(self):
+        proof = SignatureManifest.load(SignatureManifest.sidecar_path(self.sign()[0]))
+        statement = MerkleProof.root_statement(proof.root, proof.leaf_count, proof.key_id, proof.hash_name)
+        with self.assertRaises(InvalidSignature):
+            self.check(self.forged_trailer(statement, proof.signature), self.key)
+        manifest = SignatureManifest({"doc0.pdf": (proof.size, proof.digest)}, proof.key_id, proof.signature)
+        with self.assertRaises(InvalidSignature):
+            manifest.verify(self.key.public_key())
+
+## @class ChainedSignatureTest
+#  @brief Podpis łańcuchowy dokumentu zmienianego przez dopisywanie (spdf-chain).
+class ChainedSignatureTest(DetachedSignatureTestCase):
+    def sign(self, revisions=(b"%PDF-1.7 first", b" update", b" second update")):
+        path = self.write("doc.pdf", b"")
+        for data in revisions:
+            with open(path, 'ab') as f:
+                f.write(data)
+            chained = self.signer.sign_incremental(path)
+        return path, chained
+
+    def test_round_trip(self):
+        path, chained = self.sign()
+        self.assertEqual(len(chained.segments), 3)
+        self.assertIsInstance(SignatureManifest.load(SignatureManifest.sidecar_path(path)), ChainedSignature)
+        self.check(path, self.key)
+
+    def test_unsigned_append_is_rejected(self):
+        path, _ = self.sign()
+        with open(path, 'ab') as f:
+            f.write(b" unsigned")
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_modified_prefix_is_rejected(self):
+        path, _ = self.sign()
+        with open(path, 'r+b') as f:
+            f.write(b"%PDF-1.4")
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_modified_revision_is_rejected(self):
+        _, chained = self.sign()
+        end, digest, chain, _ = chained.segments[0]
+        chained.segments[0] = (end, digest, chain, chained.segments[1][3])
+        with self.assertRaises(InvalidSignature):
+            chained.verify(self.key.public_key())
+
+    def test_wrong_key_is_rejected(self):
+        path, _ = self.sign()
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.other_key)
+
+    def test_modified_prefix_is_not_signed(self):
+        path, chained = self.sign()
+        with open(path, 'r+b') as f:
+            f.write(b"%PDF-1.4")
+        with open(path, 'ab') as f:
+            f.write(b" third update")
+        with self.assertRaises(ValueError):
+            self.signer.sign_incremental(path, verify_prefix=True)
+        self.assertEqual(SignatureManifest.load(SignatureManifest.sidecar_path(path)).to_bytes(), chained.to_bytes())
+
+    def test_modified_prefix_fails_verification_after_delta_signing(self):
+        path, _ = self.sign()
+        with open(path, 'r+b') as f:
+            f.write(b"%PDF-1.4")
+        with open(path, 'ab') as f:
+            f.write(b" third update")
+        self.signer.sign_incremental(path)
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_other_detached_signature_is_not_replaced(self):
+        path = self.write("doc.pdf", b"%PDF-1.7 manifest")
+        sidecar = self.signer.sign_detached(path)
+        with open(sidecar, 'rb') as f:
+            original = f.read()
+        with open(path, 'ab') as f:
+            f.write(b" update")
+        with self.assertRaises(ValueError):
+            self.signer.sign_incremental(path)
+        with open(sidecar, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_chain_is_not_replaced_by_manifest_or_merkle_proof(self):
+        path, chained = self.sign()
+        sidecar = SignatureManifest.sidecar_path(path)
+        with self.assertRaises(ValueError):
+            self.signer.sign_detached(path)
+        with self.assertRaises(ValueError):
+            self.signer.sign_merkle_batch([path])
+        self.assertEqual(SignatureManifest.load(sidecar).to_bytes(), chained.to_bytes())
+        self.signer.sign_detached(path, overwrite=True)
+        self.assertNotIsInstance(SignatureManifest.load(sidecar), ChainedSignature)
+        self.check(path, self.key)
+
+    ## @brief Skrót z pamięci podręcznej nie jest używany dla innego rodzaju podpisu ani innego podziału
+    #  na segmenty tego samego, niezmienionego pliku.
+    def test_cached_digest_follows_sidecar_layout(self):
+        cache = VerificationCache(os.path.join(self.directory, "cache.db"))
+        self.addCleanup(cache.close)
+        keys = [(PublicKeyCache.fingerprint(self.key.public_key()), self.key.public_key())]
+
+        def cached_check(path):
+            PDFSignatureChecker(path, self.key.public_key()).perform_cached_check(cache)
+            result = BulkVerifier.verify_one(path, keys, cache=cache)
+            self.assertTrue(result["valid"], result["error"])
+            self.assertTrue(result["cached"])
+
+        path, _ = self.sign((b"%PDF-1.7 first", b" update"))
+        cached_check(path)
+        self.signer.sign_detached(path, overwrite=True)
+        cached_check(path)
+        os.remove(SignatureManifest.sidecar_path(path))
+        self.signer.sign_incremental(path)
+        cached_check(path)
+
+    def test_trailer_signature_is_not_a_chain_signature(self):
+        _, chained = self.sign()
+        end, digest, chain, _ = chained.segments[-1]
+        chained.segments[-1] = (end, digest, chain, self.trailer_signature(chained.statement(end, chain)))
+        with self.assertRaises(InvalidSignature):
+            chained.verify(self.key.public_key())
+
+    def test_chain_signature_is_not_a_trailer_signature(self):
+        _, chained = self.sign()
+        end, _, chain, signature = chained.segments[-1]
+        with self.assertRaises(InvalidSignature):
+            self.check(self.forged_trailer(chained.statement(end, chain), signature), self.key)
+
+if __name__ == "__main__":
+    unittest.main()
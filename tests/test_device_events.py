@@ -0,0 +1,69 @@
+## @file test_device_events.py
+#  @brief Testy huba zdarzeń urządzeń z backendem testowym FakeBackend.
+import queue
+import threading
+import unittest
+
+from device_events import DeviceEvent, DeviceEventHub, FakeBackend
+
+## @class DeviceEventHubTest
+#  @brief Rozsyłanie zdarzeń, zbiór podłączonych urządzeń, wait_for i izolacja błędów odbiorców.
+class DeviceEventHubTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend(["/media/a"])
+        self.hub = DeviceEventHub(self.backend).start()
+        self.addCleanup(self.hub.stop)
+
+    def subscribe_queue(self):
+        events = queue.Queue()
+        self.hub.subscribe(events.put)
+        return events
+
+    def test_snapshot_is_taken_on_start(self):
+        self.assertEqual(self.hub.current(), ["/media/a"])
+
+    def test_events_reach_subscribers_and_update_devices(self):
+        events = self.subscribe_queue()
+        self.backend.insert("/media/b")
+        event = events.get(timeout=5)
+        self.assertEqual((event.kind, event.path), (DeviceEvent.ADDED, "/media/b"))
+        self.assertEqual(self.hub.current(), ["/media/a", "/media/b"])
+        self.backend.remove("/media/a")
+        event = events.get(timeout=5)
+        self.assertEqual((event.kind, event.path), (DeviceEvent.REMOVED, "/media/a"))
+        self.assertEqual(self.hub.current(), ["/media/b"])
+
+    def test_unsubscribed_callback_gets_nothing(self):
+        events = queue.Queue()
+        unsubscribe = self.hub.subscribe(events.put)
+        unsubscribe()
+        probe = self.subscribe_queue()
+        self.backend.insert("/media/b")
+        probe.get(timeout=5)
+        self.assertTrue(events.empty())
+
+    def test_failing_handler_does_not_stop_dispatch(self):
+        def broken(event):
+            raise RuntimeError("handler bug")
+        self.hub.subscribe(broken)
+        events = self.subscribe_queue()
+        with self.assertLogs("device_events", level="ERROR"):
+            self.backend.insert("/media/b")
+            self.assertEqual(events.get(timeout=5).path, "/media/b")
+
+    def test_wait_for_checks_connected_devices_first(self):
+        self.assertEqual(self.hub.wait_for(lambda path: path if path == "/media/a" else None, timeout=1),
+                         "/media/a")
+
+    def test_wait_for_returns_matching_insert(self):
+        timer = threading.Timer(0.1, self.backend.insert, args=("/media/token",))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        probe = lambda path: path if path.endswith("token") else None
+        self.assertEqual(self.hub.wait_for(probe, timeout=5), "/media/token")
+
+    def test_wait_for_times_out(self):
+        self.assertIsNone(self.hub.wait_for(lambda path: None, timeout=0.1))
+
+if __name__ == "__main__":
+    unittest.main()
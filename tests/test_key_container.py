@@ -0,0 +1,101 @@
+## @file test_key_container.py
+#  @brief Testy pliku z zaszyfrowanym kluczem: odszyfrowanie, błędny PIN, zmiana nagłówka lub szyfrogramu,
+#  historyczny format AES-CFB i limity kosztu KDF odczytywanego z nagłówka.
+import os
+import unittest
+
+from Cryptodome.Cipher import AES
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from utils import KeyContainer, KeyDecryptor, KeySecurity, RSAKeyHandler
+
+PIN = "1234"
+## @brief Tani KDF - testy sprawdzają format pliku, nie koszt odszyfrowania.
+TEST_KDF = "pbkdf2:iterations=1000"
+## @brief Przesunięcie bajtu "r" w nagłówku (nieużywanego przez PBKDF2, więc zmienia tylko dane AAD).
+R_OFFSET = 13
+
+## @class KeyContainerTest
+#  @brief Szyfrowanie i odszyfrowanie klucza prywatnego PIN-em.
+class KeyContainerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.public_numbers = key.public_key().public_numbers()
+        cls.pem = RSAKeyHandler(key).export_private_key()
+
+    def seal(self):
+        return KeySecurity.encrypt_private_data(self.pem, PIN, TEST_KDF)
+
+    def assertRejected(self, data, pin=PIN):
+        output = bytearray(KeyContainer.payload_size(data))
+        with self.assertRaisesRegex(ValueError, "Incorrect PIN or damaged key file"):
+            KeyContainer.unseal_into(data, pin, output)
+        self.assertEqual(output, bytes(len(output)))
+        with self.assertRaises(ValueError):
+            KeyDecryptor(data, pin).get_private_key()
+
+    def test_round_trip(self):
+        data = self.seal()
+        self.assertTrue(KeyContainer.is_container(data))
+        output = bytearray(KeyContainer.payload_size(data))
+        KeyContainer.unseal_into(data, PIN, output)
+        self.assertEqual(bytes(output), self.pem)
+        key = KeyDecryptor(data, PIN).get_private_key()
+        self.assertEqual(key.public_key().public_numbers(), self.public_numbers)
+
+    def test_scrypt_round_trip(self):
+        data = KeySecurity.encrypt_private_data(self.pem, PIN, "scrypt:n=1024,r=8,p=1")
+        self.assertEqual(KeyContainer.read_header(data)[0], {"kdf": "scrypt", "n": 1024, "r": 8, "p": 1})
+        key = KeyDecryptor(data, PIN).get_private_key()
+        self.assertEqual(key.public_key().public_numbers(), self.public_numbers)
+
+    def test_wrong_pin_is_rejected(self):
+        self.assertRejected(self.seal(), "4321")
+
+    ## @brief Nagłówek jest danymi AAD - zmiana bajtu, którego KDF nie używa, i tak unieważnia znacznik.
+    def test_modified_header_is_rejected(self):
+        data = bytearray(self.seal())
+        data[R_OFFSET] ^= 1
+        self.assertEqual(KeyContainer.read_header(data)[0], {"kdf": "pbkdf2", "iterations": 1000})
+        self.assertRejected(bytes(data))
+
+    def test_modified_ciphertext_is_rejected(self):
+        data = bytearray(self.seal())
+        data[KeyContainer.HEADER.size] ^= 1
+        self.assertRejected(bytes(data))
+
+    def test_modified_tag_is_rejected(self):
+        data = bytearray(self.seal())
+        data[-1] ^= 1
+        self.assertRejected(bytes(data))
+
+    ## @brief Plik w historycznym formacie (IV + AES-CFB kluczem SHA-256 z PIN-u) nadal jest odczytywany.
+    def test_legacy_cfb_key_is_read(self):
+        iv = os.urandom(16)
+        cipher = AES.new(KeySecurity.derive_key_from_pin(PIN), AES.MODE_CFB, iv)
+        data = iv + cipher.encrypt(self.pem)
+        self.assertFalse(KeyContainer.is_container(data))
+        key = KeyDecryptor(data, PIN).get_private_key()
+        self.assertEqual(key.public_key().public_numbers(), self.public_numbers)
+
+    def test_excessive_pbkdf2_iterations_are_rejected(self):
+        with self.assertRaises(ValueError):
+            KeyContainer.parse_kdf(f"pbkdf2:iterations={KeyContainer.PBKDF2_MAX_ITERATIONS + 1}")
+        self.assertEqual(KeyContainer.parse_kdf(f"pbkdf2:iterations={KeyContainer.PBKDF2_MAX_ITERATIONS}"),
+                         {"kdf": "pbkdf2", "iterations": KeyContainer.PBKDF2_MAX_ITERATIONS})
+        header = KeyContainer.HEADER.pack(KeyContainer.MAGIC, KeyContainer.VERSION, KeyContainer.KDF_IDS["pbkdf2"],
+                                          2 ** 32 - 1, 0, 0, bytes(16), bytes(12))
+        with self.assertRaises(ValueError):
+            KeyDecryptor(header + bytes(64), PIN).get_private_key()
+
+    def test_excessive_scrypt_memory_is_rejected(self):
+        with self.assertRaises(ValueError):
+            KeyContainer.parse_kdf("scrypt:n=1048576,r=16,p=1")
+        header = KeyContainer.HEADER.pack(KeyContainer.MAGIC, KeyContainer.VERSION, KeyContainer.KDF_IDS["scrypt"],
+                                          30, 8, 1, bytes(16), bytes(12))
+        with self.assertRaises(ValueError):
+            KeyContainer.read_header(header + bytes(64))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+## @file test_key_pool.py
+#  @brief Testy puli kluczy: limit czasu, zatrzymanie oraz uzupełnianie po nieudanym generowaniu.
+import threading
+import time
+import unittest
+
+from key_pool import KeyPairPool
+
+## @brief Najmniejszy klucz akceptowany przez cryptography - testy sprawdzają pulę, nie jakość kluczy.
+KEY_SIZE = 1024
+
+## @class KeyPairPoolTest
+#  @brief Zachowanie KeyPairPool.take i shutdown.
+class KeyPairPoolTest(unittest.TestCase):
+    def pool(self, **options):
+        pool = KeyPairPool(**dict({"target_depth": 1, "workers": 1, "key_size": KEY_SIZE}, **options))
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_take_returns_a_key_and_refills(self):
+        pool = self.pool().start()
+        self.assertEqual(pool.take(timeout=60).key_size, KEY_SIZE)
+        self.assertEqual(pool.metrics()["taken"], 1)
+        self.assertEqual(pool.metrics()["depth"] + pool.metrics()["in_flight"], 1)
+
+    def test_take_requires_a_running_pool(self):
+        with self.assertRaises(RuntimeError):
+            self.pool().take(timeout=1)
+
+    def test_take_times_out(self):
+        pool = self.pool(key_size=4096).start()
+        with self.assertRaises(TimeoutError):
+            pool.take(timeout=0.001)
+
+    def test_shutdown_wakes_a_waiting_take(self):
+        pool = self.pool(key_size=4096).start()
+        errors = []
+        def take():
+            try:
+                pool.take(timeout=60)
+            except RuntimeError as error:
+                errors.append(error)
+        waiter = threading.Thread(target=take)
+        waiter.start()
+        time.sleep(0.1)
+        pool.shutdown()
+        waiter.join(10)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(pool.metrics()["depth"], 0)
+
+    def test_failed_generation_is_retried(self):
+        # Klucz o tej długości jest odrzucany przez cryptography, więc każde generowanie kończy się błędem.
+        pool = self.pool(key_size=512)
+        pool.RETRY_DELAY = 0.05
+        pool.start()
+        deadline = time.monotonic() + 30
+        while pool.metrics()["errors"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(pool.metrics()["errors"], 1)
+        pool.key_size = KEY_SIZE
+        # Pula ma uzupełnić się sama, bez wywołania take.
+        deadline = time.monotonic() + 20
+        while pool.metrics()["depth"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool.metrics()["depth"], 1)
+        self.assertEqual(pool.take(timeout=1).key_size, KEY_SIZE)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+## @file test_key_session.py
+#  @brief Testy sesji odszyfrowanych kluczy: wygasanie po bezczynności i liczbie użyć, usuwanie sesji.
+import os
+import threading
+import time
+import unittest
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from device_events import DeviceEvent
+from key_session import KeySession, KeySessionManager
+from utils import KeySecurity, RSAKeyHandler
+
+PIN = "1234"
+## @brief Tani KDF - testy sprawdzają sesje, nie koszt odszyfrowania.
+TEST_KDF = "pbkdf2:iterations=1000"
+
+## @class KeySessionManagerTest
+#  @brief Cykl życia sesji w KeySessionManager.
+class KeySessionManagerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.public_numbers = key.public_key().public_numbers()
+        cls.encrypted = KeySecurity.encrypt_private_data(RSAKeyHandler(key).export_private_key(), PIN, TEST_KDF)
+        cls.key_path = os.path.join(os.sep, "media", "token", "private_encrypted.pem")
+
+    def manager(self, **options):
+        sessions = KeySessionManager(**options)
+        self.addCleanup(sessions.evict)
+        return sessions
+
+    def test_missing_session(self):
+        self.assertIsNone(self.manager().get(self.key_path))
+
+    def test_unlock_then_reuse(self):
+        sessions = self.manager()
+        key = sessions.unlock(self.key_path, self.encrypted, PIN)
+        self.assertEqual(key.public_key().public_numbers(), self.public_numbers)
+        self.assertIs(sessions.get(self.key_path), key)
+
+    def test_wrong_pin_opens_no_session(self):
+        sessions = self.manager()
+        with self.assertRaises(ValueError):
+            sessions.unlock(self.key_path, self.encrypted, "0000")
+        self.assertIsNone(sessions.get(self.key_path))
+
+    def test_idle_session_expires(self):
+        sessions = self.manager(idle_ttl=0.1)
+        sessions.unlock(self.key_path, self.encrypted, PIN)
+        session = next(iter(sessions.sessions.values()))
+        time.sleep(0.3)
+        self.assertIsNone(session.key)
+        self.assertIsNone(sessions.get(self.key_path))
+
+    def test_session_ends_after_max_uses(self):
+        sessions = self.manager(max_uses=2)
+        sessions.unlock(self.key_path, self.encrypted, PIN)
+        self.assertIsNotNone(sessions.get(self.key_path))
+        self.assertIsNone(sessions.get(self.key_path))
+
+    def test_evict_clears_the_key(self):
+        sessions = self.manager()
+        sessions.unlock(self.key_path, self.encrypted, PIN)
+        session = next(iter(sessions.sessions.values()))
+        sessions.evict(self.key_path)
+        self.assertIsNone(session.key)
+        self.assertIsNone(session.timer)
+        self.assertIsNone(sessions.get(self.key_path))
+
+    def test_removing_the_token_evicts_its_sessions(self):
+        sessions = self.manager()
+        sessions.unlock(self.key_path, self.encrypted, PIN)
+        sessions.on_device_event(DeviceEvent(DeviceEvent.REMOVED, os.path.join(os.sep, "media", "other")))
+        self.assertIsNotNone(sessions.get(self.key_path))
+        sessions.on_device_event(DeviceEvent(DeviceEvent.REMOVED, os.path.join(os.sep, "media", "token")))
+        self.assertIsNone(sessions.get(self.key_path))
+
+    def test_clear_cancels_the_idle_timer(self):
+        session = KeySession(object())
+        session.timer = threading.Timer(60, lambda: None)
+        session.timer.start()
+        timer = session.timer
+        session.clear()
+        self.assertIsNone(session.key)
+        timer.join(1)
+        self.assertFalse(timer.is_alive())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+## @file test_signature_trailer.py
+#  @brief Testy podpisu dopisywanego na końcu dokumentu (formaty wersji 1 i 2) oraz rejestru
+#  implementacji funkcji skrótu.
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+import hash_backends
+from signature_checker import PDFSignatureChecker
+from utils import DigitalSigner, SignatureTrailer, StreamHasher
+
+## @class SignatureTrailerTest
+#  @brief Podpis wersji 2: poprawny podpis, zmiana treści, inny klucz i ponowne użycie podpisu wersji 1.
+class SignatureTrailerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Podpis wersji 1 ma stałą długość 512 B, więc wymaga klucza 4096-bitowego.
+        cls.key = rsa.generate_private_key(public_exponent=65537, key_size=4096)
+        cls.other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def check(self, path, key):
+        checker = PDFSignatureChecker(path, key.public_key())
+        checker.split_content_and_signature()
+        checker.perform_check()
+
+    def test_round_trip(self):
+        path = self.write("doc.pdf", b"%PDF-1.7 content")
+        DigitalSigner(self.key).sign_file(path)
+        self.check(path, self.key)
+
+    def test_modified_content_is_rejected(self):
+        path = self.write("doc.pdf", b"%PDF-1.7 content")
+        DigitalSigner(self.key).sign_file(path)
+        with open(path, 'r+b') as f:
+            f.write(b"%PDF-1.4")
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_wrong_key_is_rejected(self):
+        path = self.write("doc.pdf", b"%PDF-1.7 content")
+        DigitalSigner(self.key).sign_file(path)
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.other_key)
+
+    def test_legacy_signature_still_verifies(self):
+        content = b"%PDF-1.7 legacy content"
+        signature = self.key.sign(StreamHasher.hash_bytes(content), padding.PKCS1v15(), hashes.SHA256())
+        self.check(self.write("legacy.pdf", content + signature), self.key)
+
+    def test_legacy_signature_is_not_a_v2_signature(self):
+        # Podpis wersji 1 nad C to podpis SHA256(SHA256(C)); nie może potwierdzać dokumentu C' = SHA256(C).
+        content = b"%PDF-1.7 legacy content"
+        signature = self.key.sign(StreamHasher.hash_bytes(content), padding.PKCS1v15(), hashes.SHA256())
+        forged = StreamHasher.hash_bytes(content)
+        path = self.write("forged.pdf", forged + SignatureTrailer.build(signature, SignatureTrailer.VERSION_PREHASHED))
+        with self.assertRaises(InvalidSignature):
+            self.check(path, self.key)
+
+    def test_legacy_format_cannot_be_created(self):
+        with self.assertRaises(ValueError):
+            SignatureTrailer.build(b"\0" * 512, SignatureTrailer.VERSION_LEGACY)
+
+## @brief Ładowanie implementacji, której biblioteka nie jest zainstalowana.
+def _missing_library():
+    raise ImportError("library is not installed")
+
+## @class HashBackendTest
+#  @brief Wybór implementacji w rejestrze hash_backends i podpis wersji 2 algorytmem innym niż SHA-256.
+#  Testy podmieniają wpisy rejestru, a po każdym teście przywracany jest jego stan.
+class HashBackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        backends = {name: list(candidates) for name, candidates in hash_backends._backends.items()}
+        forced = dict(hash_backends._forced)
+        self.addCleanup(self.restore_registry, backends, forced)
+        hash_backends._selected.clear()
+
+    @staticmethod
+    def restore_registry(backends, forced):
+        hash_backends._backends.clear()
+        hash_backends._backends.update(backends)
+        hash_backends._forced.clear()
+        hash_backends._forced.update(forced)
+        hash_backends._selected.clear()
+
+    ## @brief Zastępuje implementacje BLAKE3 podaną (np. niedostępną lub zastępczą).
+    def replace_blake3(self, loader, name="blake3"):
+        hash_backends._backends["blake3"] = [hash_backends.HashBackend("blake3", name, loader)]
+        hash_backends._selected.pop("blake3", None)
+
+    ## @brief Zastępczy BLAKE3 - 32-bajtowy BLAKE2s z hashlib, aby test nie wymagał pakietu blake3.
+    def use_substitute_blake3(self):
+        self.replace_blake3(lambda: hashlib.blake2s, "substitute")
+
+    def sign(self, hash_name):
+        path = os.path.join(self.directory, "doc.pdf")
+        with open(path, 'wb') as f:
+            f.write(b"%PDF-1.7 content")
+        DigitalSigner(self.key, hash_name=hash_name).sign_file(path)
+        return path
+
+    def check(self, path):
+        checker = PDFSignatureChecker(path, self.key.public_key())
+        checker.perform_streaming_check()
+        return checker
+
+    def test_sha256_prefers_hashlib(self):
+        self.assertEqual(hash_backends.get("sha256").name, "hashlib")
+        self.assertEqual([b.name for b in hash_backends.implementations("sha256")][:2], ["hashlib", "cryptography"])
+
+    def test_unavailable_backend_falls_back_to_next(self):
+        hash_backends.register(hash_backends.HashBackend("sha256", "missing", _missing_library), preferred=True)
+        self.assertEqual(hash_backends.get("sha256").name, "hashlib")
+        self.assertIn("sha256", hash_backends.algorithms())
+
+    def test_preferred_backend_is_selected(self):
+        hash_backends.register(hash_backends.HashBackend("sha256", "preferred", lambda: hashlib.sha256),
+                               preferred=True)
+        self.assertEqual(hash_backends.get("sha256").name, "preferred")
+
+    def test_forced_backend(self):
+        hash_backends.select("sha256", "cryptography")
+        backend = hash_backends.get("sha256")
+        self.assertEqual(backend.name, "cryptography")
+        hasher = backend.new()
+        hasher.update(b"data")
+        self.assertEqual(hasher.digest(), hashlib.sha256(b"data").digest())
+        hash_backends.select("sha256", "missing")
+        with self.assertRaises(ValueError):
+            hash_backends.get("sha256")
+        hash_backends.select("sha256")
+        self.assertEqual(hash_backends.get("sha256").name, "hashlib")
+
+    def test_unknown_algorithm_is_rejected(self):
+        with self.assertRaises(ValueError):
+            hash_backends.get("md5")
+        with self.assertRaises(ValueError):
+            hash_backends.register(hash_backends.HashBackend("md5", "hashlib", lambda: hashlib.md5))
+        with self.assertRaises(ValueError):
+            hash_backends.algorithm_for_id(0)
+        self.assertEqual(hash_backends.algorithm_for_id(hash_backends.ALGORITHM_IDS["blake3"]), "blake3")
+
+    def test_non_sha256_round_trip(self):
+        self.use_substitute_blake3()
+        path = self.sign("blake3")
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(SignatureTrailer.locate(data, len(data))[3], "blake3")
+        checker = self.check(path)
+        self.assertEqual(checker.hash_name, "blake3")
+        self.assertEqual(checker.document_hash, hashlib.blake2s(b"%PDF-1.7 content").digest())
+
+    def test_hash_algorithm_id_is_signed(self):
+        self.use_substitute_blake3()
+        path = self.sign("blake3")
+        with open(path, 'r+b') as f:
+            f.seek(-SignatureTrailer.FOOTER.size, os.SEEK_END)
+            footer = bytearray(f.read())
+            footer[8] = hash_backends.ALGORITHM_IDS["sha256"]
+            f.seek(-SignatureTrailer.FOOTER.size, os.SEEK_END)
+            f.write(footer)
+        with self.assertRaises(InvalidSignature):
+            self.check(path)
+
+    @unittest.skipUnless("blake3" in hash_backends.algorithms(), "blake3 package is not installed")
+    def test_blake3_round_trip(self):
+        self.check(self.sign("blake3"))
+
+    def test_unavailable_blake3_is_a_clean_error(self):
+        self.use_substitute_blake3()
+        path = self.sign("blake3")
+        self.replace_blake3(_missing_library)
+        self.assertNotIn("blake3", hash_backends.algorithms())
+        with self.assertRaisesRegex(ValueError, "blake3"):
+            DigitalSigner(self.key, hash_name="blake3")
+        with self.assertRaisesRegex(ValueError, "blake3"):
+            self.check(path)
+
+if __name__ == "__main__":
+    unittest.main()
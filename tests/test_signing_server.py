@@ -0,0 +1,102 @@
+## @file test_signing_server.py
+#  @brief Testy serwera podpisu: podpis i weryfikacja przez klienta asyncio na lokalnym porcie TCP.
+import asyncio
+import hashlib
+import json
+import unittest
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from signing_server import SigningServer
+from utils import SignatureTrailer
+
+TOKEN = "secret"
+DOCUMENT = b"%PDF-1.4\n" + bytes(range(256)) * 1024 + b"\n%%EOF\n"
+
+## @class SigningServerTest
+#  @brief Żądania wysyłane do SigningServer przez asyncio.open_connection.
+class SigningServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    ## @brief Uruchamia serwer, wykonuje na nim scenariusz i zamyka go.
+    #  @param scenario Korutyna (port) -> wynik.
+    #  @return Wynik scenariusza.
+    def serve(self, scenario):
+        server = SigningServer(self.private_key, workers=2, queue_size=4, token=TOKEN)
+
+        async def run():
+            listener = await server.start_tcp(0)
+            try:
+                return await scenario(listener.sockets[0].getsockname()[1])
+            finally:
+                listener.close()
+                await listener.wait_closed()
+
+        try:
+            return asyncio.run(run())
+        finally:
+            server.executor.shutdown()
+
+    ## @brief Wysyła jedno żądanie i odczytuje nagłówek odpowiedzi oraz zapowiedziane bajty.
+    @staticmethod
+    async def request(port, header, body):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(json.dumps(dict(header, length=len(body))).encode() + b"\n" + body)
+            await writer.drain()
+            reply = json.loads(await reader.readline())
+            content = await reader.readexactly(reply.get("length", 0)) if reply.get("status") == "ok" else b""
+            return reply, content
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    ## @brief Dokument podpisany przez serwer przechodzi weryfikację serwera i lokalną.
+    def test_sign_then_verify_round_trip(self):
+        async def scenario(port):
+            signed_reply, signed = await self.request(port, {"op": "sign", "token": TOKEN}, DOCUMENT)
+            verify_reply, _ = await self.request(port, {"op": "verify", "token": TOKEN}, signed)
+            tampered = signed[:10] + bytes([signed[10] ^ 1]) + signed[11:]
+            tampered_reply, _ = await self.request(port, {"op": "verify", "token": TOKEN}, tampered)
+            return signed_reply, signed, verify_reply, tampered_reply
+
+        signed_reply, signed, verify_reply, tampered_reply = self.serve(scenario)
+        self.assertEqual(signed_reply["status"], "ok")
+        self.assertTrue(signed.startswith(DOCUMENT))
+        self.assertTrue(verify_reply["valid"])
+        self.assertEqual(verify_reply["digest"], hashlib.sha256(DOCUMENT).hexdigest())
+        self.assertFalse(tampered_reply["valid"])
+
+        version, offset, sig_len, hash_name = SignatureTrailer.locate(signed, len(signed))
+        self.assertEqual(signed[:offset], DOCUMENT)
+        SignatureTrailer.verify(self.private_key.public_key(), signed[offset:offset + sig_len],
+                                hashlib.sha256(DOCUMENT).digest(), version, hash_name)
+
+    ## @brief Żądanie bez poprawnego tokenu jest odrzucane.
+    def test_wrong_token_is_rejected(self):
+        async def scenario(port):
+            return await self.request(port, {"op": "sign", "token": "wrong"}, DOCUMENT)
+
+        reply, content = self.serve(scenario)
+        self.assertEqual(reply, {"status": "error", "error": "Unauthorized"})
+        self.assertEqual(content, b"")
+
+    ## @brief Klient rozłączający się w trakcie przesyłania treści jest odnotowywany w logu serwera.
+    def test_disconnect_is_logged(self):
+        async def scenario(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(json.dumps({"op": "sign", "token": TOKEN, "length": 1000}).encode() + b"\n" + DOCUMENT[:10])
+            await writer.drain()
+            await reader.readline()
+            writer.close()
+            await writer.wait_closed()
+            await asyncio.sleep(0.2)
+
+        with self.assertLogs("signing_server", "WARNING") as logs:
+            self.serve(scenario)
+        self.assertIn("Client disconnected during sign request", logs.output[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+## @file test_verification_cache.py
+#  @brief Testy pamięci podręcznej wyników weryfikacji: trafienia, chybienia, unieważnianie i usuwanie LRU.
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from verification_cache import VerificationCache
+
+KEY = "fingerprint"
+
+## @class VerificationCacheTest
+#  @brief Wpisy VerificationCache dla plików w katalogu tymczasowym.
+class VerificationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def cache(self, **options):
+        cache = VerificationCache(os.path.join(self.directory.name, "cache.db"), **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def document(self, name, content=b"%PDF-1.4 document"):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    ## @brief Brak wpisu to chybienie, zapisany wynik wraca przy kolejnym odczycie.
+    def test_miss_then_hit(self):
+        cache = self.cache()
+        identity = VerificationCache.file_identity(self.document("a.pdf"))
+        self.assertIsNone(cache.lookup(identity, KEY))
+        cache.store(identity, KEY, b"\x01" * 32, True, 2)
+        verdict = cache.lookup(identity, KEY)
+        self.assertTrue(verdict.valid)
+        self.assertEqual(verdict.digest, b"\x01" * 32)
+        self.assertEqual(verdict.version, 2)
+        self.assertIsNone(cache.lookup(identity, "other key"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    ## @brief Zmiana rozmiaru lub mtime pliku daje nową tożsamość, więc stary wynik nie jest używany.
+    def test_changed_file_is_not_a_hit(self):
+        cache = self.cache()
+        path = self.document("a.pdf")
+        identity = VerificationCache.file_identity(path)
+        cache.store(identity, KEY, b"\x01" * 32, True, 2)
+
+        info = os.stat(path)
+        os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 1000000))
+        self.assertIsNone(cache.lookup(VerificationCache.file_identity(path), KEY))
+
+        with open(path, 'ab') as f:
+            f.write(b"appended")
+        self.assertIsNone(cache.lookup(VerificationCache.file_identity(path), KEY))
+
+    ## @brief invalidate usuwa wpisy wskazanego pliku, pozostawiając pozostałe.
+    def test_invalidate_path(self):
+        cache = self.cache()
+        first = VerificationCache.file_identity(self.document("a.pdf"))
+        second = VerificationCache.file_identity(self.document("b.pdf"))
+        cache.store(first, KEY, b"\x01" * 32, True, 2)
+        cache.store(second, KEY, b"\x02" * 32, False, 2)
+        self.assertEqual(cache.invalidate(os.path.join(self.directory.name, "a.pdf")), 1)
+        self.assertIsNone(cache.lookup(first, KEY))
+        self.assertFalse(cache.lookup(second, KEY).valid)
+
+    ## @brief Usuwanie ponad limit zachowuje ostatnio trafiony wpis, choć czas trafienia nie był jeszcze zapisany.
+    def test_eviction_keeps_recently_used(self):
+        cache = self.cache(max_entries=2)
+        identities = [VerificationCache.file_identity(self.document(f"{n}.pdf")) for n in "abc"]
+        cache.store(identities[0], KEY, b"\x01" * 32, True, 2)
+        cache.store(identities[1], KEY, b"\x02" * 32, True, 2)
+        self.assertIsNotNone(cache.lookup(identities[0], KEY))
+        cache.store(identities[2], KEY, b"\x03" * 32, True, 2)
+        cache.evict()
+        self.assertIsNotNone(cache.lookup(identities[0], KEY))
+        self.assertIsNone(cache.lookup(identities[1], KEY))
+        self.assertIsNotNone(cache.lookup(identities[2], KEY))
+
+    ## @brief Trafienie nie zatwierdza transakcji; czas użycia trafia do bazy przy zamknięciu.
+    def test_hits_are_flushed_in_batches(self):
+        path = os.path.join(self.directory.name, "cache.db")
+        cache = VerificationCache(path)
+        identity = VerificationCache.file_identity(self.document("a.pdf"))
+        cache.store(identity, KEY, b"\x01" * 32, True, 2)
+        reader = sqlite3.connect(path)
+        self.addCleanup(reader.close)
+        stored = reader.execute("SELECT last_used FROM verdicts").fetchone()[0]
+
+        time.sleep(0.01)
+        cache.lookup(identity, KEY)
+        self.assertEqual(len(cache.touched), 1)
+        self.assertEqual(reader.execute("SELECT last_used FROM verdicts").fetchone()[0], stored)
+        cache.close()
+        self.assertGreater(reader.execute("SELECT last_used FROM verdicts").fetchone()[0], stored)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,36 +1,66 @@
 ## @file utils.py
 #  @brief Zawiera klasy pomocnicze do obsługi USB, generowania i szyfrowania kluczy RSA oraz podpisywania danych.
-from Cryptodome.Random import get_random_bytes
+#  Moduł nie importuje GUI; Cryptodome (AES kontenera klucza) ładowany jest dopiero przy jego użyciu,
+#  bo sam import kosztuje dziesiątki milisekund, a weryfikacja i podpisywanie go nie potrzebują.
 from cryptography.hazmat.primitives.asymmetric import rsa
-from Cryptodome.Cipher import AES
-from Cryptodome.Hash import SHA256
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-import win32api
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.exceptions import InvalidSignature
+from device_events import list_drives, shared_hub
+import hash_backends
+import instrumentation
+import base64
+import binascii
+import hashlib
+import json
 import os
-import time
+import re
+import struct
+import threading
+from collections import OrderedDict
+
+## @brief Rozmiar bloku odczytu przy strumieniowym przetwarzaniu plików (1 MiB).
+CHUNK_SIZE = 1024 * 1024
+## @brief Długość podpisu RSA-4096 dopisywanego na końcu dokumentu.
+SIGNATURE_SIZE = 512
+
 ## @class USBUtility
 #  @brief Zbiór metod pomocniczych do obsługi pamięci USB.
 class USBUtility:
-    ## @brief Zwraca zestaw wszystkich aktualnie podłączonych napędów logicznych.
-    @staticmethod
+    ## @brief Zwraca zestaw wszystkich aktualnie podłączonych napędów logicznych (poza Windows - punktów montowania).
     @staticmethod
     def list_all_drives():
-        return set(win32api.GetLogicalDriveStrings().split('\x00')[:-1])
+        return list_drives()
 
     ## @brief Zapisuje bajty do pliku.
     #  @param path Ścieżka do pliku.
     #  @param content_bytes Zawartość bajtowa do zapisania.
+    #  @param sync True - przed powrotem wymusza zapis danych i wpisu katalogu na nośnik (fsync),
+    #  aby token można było odłączyć zaraz po zakończeniu.
     @staticmethod
-    def write_file(path, content_bytes):
-        with open(path, "wb") as f:
+    def write_file(path, content_bytes, sync=False):
+        with instrumentation.stage("usb.write", len(content_bytes)), open(path, "wb") as f:
             f.write(content_bytes)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        if sync and hasattr(os, "O_DIRECTORY"):
+            directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
 ## @class RSAKeyHandler
 #  @brief Klasa generująca i eksportująca pary kluczy RSA.
 class RSAKeyHandler:
     ## @brief Inicjalizuje parę kluczy RSA 4096-bitowych.
-    def __init__(self):
-        self.key_pair = rsa.generate_private_key(public_exponent=65537, key_size=4096)
+    #  @param key_pair Gotowy klucz prywatny (np. z KeyPairPool); None - generowany na miejscu.
+    def __init__(self, key_pair=None):
+        if key_pair is None:
+            with instrumentation.stage("rsa.keygen"):
+                key_pair = rsa.generate_private_key(public_exponent=65537, key_size=4096)
+        self.key_pair = key_pair
 
     ## @brief Eksportuje klucz publiczny w formacie PEM.
     #  @return Klucz publiczny jako bajty.
@@ -51,72 +81,1141 @@ class RSAKeyHandler:
 ## @class KeySecurity
 #  @brief Obsługuje szyfrowanie klucza prywatnego przy pomocy PIN-u.
 class KeySecurity:
-    ## @brief Wyprowadza klucz AES z podanego PIN-u.
+    ## @brief Wyprowadza klucz AES z podanego PIN-u (historyczny format: IV + AES-CFB, jeden SHA-256 z PIN-u).
     #  @param pin Kod PIN jako string.
     #  @return Klucz AES (32 bajty)
     @staticmethod
     def derive_key_from_pin(pin):
-        return SHA256.new(pin.encode()).digest()
+        with instrumentation.stage("key.kdf"):
+            hasher = StreamHasher.new_hasher()
+            hasher.update(pin.encode())
+            return hasher.digest()
 
-    ## @brief Szyfruje dane klucza prywatnego przy użyciu AES-CFB.
+    ## @brief Szyfruje dane klucza prywatnego w formacie KeyContainer (KDF z parametrami, AES-GCM).
     #  @param private_data Dane do zaszyfrowania (klucz prywatny).
     #  @param pin Kod PIN jako string.
-    #  @return IV + zaszyfrowane dane.
+    #  @param kdf Parametry KDF, np. "scrypt:n=65536,r=8,p=1" (None - KeyContainer.default_kdf()).
+    #  @return Zawartość pliku z zaszyfrowanym kluczem.
+    @staticmethod
+    def encrypt_private_data(private_data, pin, kdf=None):
+        return KeyContainer.seal(private_data, pin, kdf)
+
+## @class KeyContainer
+#  @brief Wersjonowany format pliku z zaszyfrowanym kluczem prywatnym.
+#  Układ: "SPDFKEY" | wersja | KDF (1 - scrypt, 2 - PBKDF2-HMAC-SHA256) | koszt (log2 N dla scrypt,
+#  liczba iteracji dla PBKDF2) | r | p | sól (16 B) | nonce (12 B) | szyfrogram AES-256-GCM | znacznik (16 B).
+#  Nagłówek jest danymi uwierzytelnianymi, więc parametrów nie da się podmienić, a błędny PIN wykrywany
+#  jest przez znacznik GCM, zanim odszyfrowane dane trafią do parsera PEM.
+#  PIN ma tylko 10^4 wartości, więc o odporności na przeszukanie decyduje koszt KDF - domyślny można
+#  zmienić zmienną środowiskową PDF_SIGNER_KDF, np. "scrypt:n=131072,r=8,p=1" lub "pbkdf2:iterations=600000"
+#  (koszt mierzy przypadek "kdf" w benchmark.py).
+class KeyContainer:
+    MAGIC = b"SPDFKEY"
+    VERSION = 1
+    HEADER = struct.Struct(">7sBBIBB16s12s")
+    KDF_IDS = {"scrypt": 1, "pbkdf2": 2}
+    TAG_SIZE = 16
+    DEFAULT_KDF = "scrypt:n=65536,r=8,p=1"
+    ## @brief Największa pamięć scrypt akceptowana z nagłówka pliku (ochrona przed plikiem blokującym maszynę).
+    SCRYPT_MAX_MEMORY = 1024 ** 3
+    ## @brief Największa liczba iteracji PBKDF2 akceptowana z nagłówka pliku (kilka sekund obliczeń).
+    PBKDF2_MAX_ITERATIONS = 10000000
+
+    ## @brief Zwraca domyślne parametry KDF (PDF_SIGNER_KDF lub DEFAULT_KDF).
+    @staticmethod
+    def default_kdf():
+        return KeyContainer.parse_kdf(os.environ.get("PDF_SIGNER_KDF") or KeyContainer.DEFAULT_KDF)
+
+    ## @brief Zamienia opis KDF na słownik parametrów.
+    #  @param spec Tekst "scrypt:n=...,r=...,p=..." lub "pbkdf2:iterations=...", albo gotowy słownik.
+    #  @return Słownik z kluczem "kdf" i parametrami.
+    #  @throw ValueError gdy KDF jest nieznany lub parametry są poza zakresem.
+    @staticmethod
+    def parse_kdf(spec):
+        if isinstance(spec, dict):
+            params = dict(spec)
+        else:
+            name, _, options = spec.strip().partition(":")
+            params = {"kdf": name}
+            try:
+                for option in filter(None, options.split(",")):
+                    key, _, value = option.partition("=")
+                    params[key.strip()] = int(value)
+            except ValueError:
+                raise ValueError(f"Invalid KDF parameters: {spec}") from None
+        allowed = {"scrypt": {"kdf", "n", "r", "p"}, "pbkdf2": {"kdf", "iterations"}}.get(params["kdf"])
+        if allowed is None:
+            raise ValueError(f"Unsupported KDF: {params['kdf']}")
+        if set(params) - allowed:
+            raise ValueError(f"Unknown {params['kdf']} parameters: {', '.join(sorted(set(params) - allowed))}")
+        if params["kdf"] == "scrypt":
+            params = {"kdf": "scrypt", "n": params.get("n", 65536), "r": params.get("r", 8), "p": params.get("p", 1)}
+            n, r, p = params["n"], params["r"], params["p"]
+            if n < 2 or n & (n - 1) or not 1 <= r <= 255 or not 1 <= p <= 255:
+                raise ValueError("scrypt needs n = power of two > 1 and r, p in 1..255")
+            if 128 * r * n > KeyContainer.SCRYPT_MAX_MEMORY:
+                raise ValueError("scrypt parameters need more than 1 GiB of memory")
+        elif params["kdf"] == "pbkdf2":
+            params = {"kdf": "pbkdf2", "iterations": params.get("iterations", 600000)}
+            if not 1 <= params["iterations"] <= KeyContainer.PBKDF2_MAX_ITERATIONS:
+                raise ValueError(f"pbkdf2 iterations must be in 1..{KeyContainer.PBKDF2_MAX_ITERATIONS}")
+        return params
+
+    ## @brief Wyprowadza klucz AES-256 z PIN-u.
+    #  @param pin Kod PIN jako string.
+    #  @param salt Sól (16 bajtów).
+    #  @param params Parametry z parse_kdf.
+    #  @return Klucz (32 bajty).
+    @staticmethod
+    def derive_key(pin, salt, params):
+        with instrumentation.stage("key.kdf"):
+            if params["kdf"] == "scrypt":
+                n, r, p = params["n"], params["r"], params["p"]
+                return hashlib.scrypt(pin.encode(), salt=salt, n=n, r=r, p=p,
+                                      maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=32)
+            return hashlib.pbkdf2_hmac("sha256", pin.encode(), salt, params["iterations"], 32)
+
+    ## @brief Czy dane są w formacie KeyContainer (a nie w historycznym IV + AES-CFB).
+    @staticmethod
+    def is_container(data):
+        return bytes(data[:len(KeyContainer.MAGIC)]) == KeyContainer.MAGIC
+
+    ## @brief Odczytuje nagłówek pliku.
+    #  @param data Zawartość pliku.
+    #  @return Krotka (parametry KDF, sól, nonce, długość nagłówka).
+    #  @throw ValueError gdy nagłówek jest nieprawidłowy lub wersja nie jest obsługiwana.
+    @staticmethod
+    def read_header(data):
+        if len(data) < KeyContainer.HEADER.size + KeyContainer.TAG_SIZE or not KeyContainer.is_container(data):
+            raise ValueError("Not an encrypted key container")
+        _, version, kdf_id, cost, r, p, salt, nonce = KeyContainer.HEADER.unpack_from(data)
+        if version != KeyContainer.VERSION:
+            raise ValueError(f"Unsupported key container version {version}")
+        if kdf_id == KeyContainer.KDF_IDS["scrypt"]:
+            if cost >= 32:
+                raise ValueError("scrypt cost out of range")
+            params = {"kdf": "scrypt", "n": 1 << cost, "r": r, "p": p}
+        elif kdf_id == KeyContainer.KDF_IDS["pbkdf2"]:
+            params = {"kdf": "pbkdf2", "iterations": cost}
+        else:
+            raise ValueError(f"Unsupported KDF id {kdf_id}")
+        return KeyContainer.parse_kdf(params), salt, nonce, KeyContainer.HEADER.size
+
+    ## @brief Szyfruje dane PIN-em.
+    #  @param private_data Dane do zaszyfrowania.
+    #  @param pin Kod PIN jako string.
+    #  @param kdf Parametry KDF (tekst lub słownik, None - default_kdf()).
+    #  @return Nagłówek + szyfrogram + znacznik GCM.
     @staticmethod
-    def encrypt_private_data(private_data, pin):
-        iv = get_random_bytes(16)
-        key = KeySecurity.derive_key_from_pin(pin)
-        cipher = AES.new(key, AES.MODE_CFB, iv)
-        return iv + cipher.encrypt(private_data)
+    def seal(private_data, pin, kdf=None):
+        from Cryptodome.Cipher import AES
+        params = KeyContainer.default_kdf() if kdf is None else KeyContainer.parse_kdf(kdf)
+        salt, nonce = os.urandom(16), os.urandom(12)
+        if params["kdf"] == "scrypt":
+            cost, r, p = params["n"].bit_length() - 1, params["r"], params["p"]
+        else:
+            cost, r, p = params["iterations"], 0, 0
+        header = KeyContainer.HEADER.pack(KeyContainer.MAGIC, KeyContainer.VERSION, KeyContainer.KDF_IDS[params["kdf"]],
+                                          cost, r, p, salt, nonce)
+        key = KeyContainer.derive_key(pin, salt, params)
+        with instrumentation.stage("key.encrypt", len(private_data)):
+            cipher = AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=KeyContainer.TAG_SIZE)
+            cipher.update(header)
+            ciphertext, tag = cipher.encrypt_and_digest(private_data)
+        return header + ciphertext + tag
+
+    ## @brief Odszyfrowuje dane do podanego bufora i sprawdza znacznik GCM.
+    #  @param data Zawartość pliku.
+    #  @param pin Kod PIN jako string.
+    #  @param output Bytearray o długości payload_size(data); przy błędnym PIN-ie jest zerowany.
+    #  @throw ValueError gdy PIN jest błędny lub plik został zmieniony.
+    @staticmethod
+    def unseal_into(data, pin, output):
+        from Cryptodome.Cipher import AES
+        params, salt, nonce, header_size = KeyContainer.read_header(data)
+        key = KeyContainer.derive_key(pin, salt, params)
+        with memoryview(data) as view, instrumentation.stage("key.decrypt", len(output)):
+            cipher = AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=KeyContainer.TAG_SIZE)
+            cipher.update(view[:header_size])
+            cipher.decrypt(view[header_size:-KeyContainer.TAG_SIZE], output=output)
+            try:
+                cipher.verify(view[-KeyContainer.TAG_SIZE:])
+            except ValueError:
+                output[:] = bytes(len(output))
+                raise ValueError("Incorrect PIN or damaged key file") from None
+
+    ## @brief Długość odszyfrowanych danych.
+    @staticmethod
+    def payload_size(data):
+        return max(len(data) - KeyContainer.HEADER.size - KeyContainer.TAG_SIZE, 0)
 
 ## @class DriveWatcher
-#  @brief Monitoruje podłączone dyski i sprawdza, czy zawierają dany plik.
+#  @brief Sprawdza podłączane dyski (zdarzenia z DeviceEventHub), szukając na nich danego pliku.
 class DriveWatcher:
     ## @brief Konstruktor klasy.
     #  @param target_filename Nazwa pliku, którego szukamy.
-    def __init__(self, target_filename):
+    #  @param events Hub zdarzeń urządzeń (None - wspólny hub aplikacji).
+    def __init__(self, target_filename, events=None):
         self.filename = target_filename
+        self.events = events
+
+    ## @brief Sprawdza, czy plik znajduje się na danym dysku.
+    #  @param drive Ścieżka montowania dysku.
+    #  @return Pełna ścieżka do pliku lub None.
+    def locate(self, drive):
+        candidate = os.path.join(drive, self.filename)
+        return candidate if os.path.isfile(candidate) else None
 
     ## @brief Czeka, aż plik pojawi się na którymkolwiek z dysków.
-    #  @return Pełna ścieżka do odnalezionego pliku.
-    def wait_for_media(self):
-        while True:
-            drives = win32api.GetLogicalDriveStrings().split('\x00')[:-1]
-            for disk in drives:
-                candidate = os.path.join(disk, self.filename)
-                if os.path.isfile(candidate):
-                    return candidate
-            time.sleep(1.5)
+    #  @param timeout Maksymalny czas oczekiwania w sekundach (None - bez limitu).
+    #  @return Pełna ścieżka do odnalezionego pliku lub None po przekroczeniu czasu.
+    def wait_for_media(self, timeout=None):
+        events = (self.events or shared_hub()).start()
+        return events.wait_for(self.locate, timeout)
 ## @class KeyDecryptor
 #  @brief Deszyfruje klucz prywatny zaszyfrowany przy pomocy PIN-u.
 class KeyDecryptor:
     ## @brief Konstruktor klasy.
-    #  @param encrypted_bytes Dane zaszyfrowane (IV + ciphertext).
+    #  @param encrypted_bytes Dane zaszyfrowane (KeyContainer lub historyczne IV + ciphertext).
     #  @param pin_code Kod PIN jako string.
     def __init__(self, encrypted_bytes, pin_code):
         self.data = encrypted_bytes
         self.pin = pin_code
 
     ## @brief Odszyfrowuje dane i zwraca klucz RSA.
+    #  Odszyfrowany PEM trafia do bufora bytearray, który jest zerowany zaraz po sparsowaniu klucza.
+    #  W formacie KeyContainer błędny PIN wykrywa znacznik GCM, a klucz z uwierzytelnionego pliku
+    #  ładowany jest bez kosztownej walidacji RSA.
     #  @return Odszyfrowany klucz prywatny RSA.
+    #  @throw ValueError gdy PIN jest błędny lub plik jest uszkodzony.
     def get_private_key(self):
+        if KeyContainer.is_container(self.data):
+            decrypted = bytearray(KeyContainer.payload_size(self.data))
+            try:
+                KeyContainer.unseal_into(self.data, self.pin, decrypted)
+                with instrumentation.stage("key.parse", len(decrypted)):
+                    return serialization.load_pem_private_key(decrypted, password=None,
+                                                              unsafe_skip_rsa_key_validation=True)
+            finally:
+                decrypted[:] = bytes(len(decrypted))
+
+        from Cryptodome.Cipher import AES
         iv_part = self.data[:16]
         encrypted_part = self.data[16:]
-        key_material = SHA256.new(self.pin.encode()).digest()
-        cipher = AES.new(key_material, AES.MODE_CFB, iv_part)
-        decrypted = cipher.decrypt(encrypted_part)
-        return serialization.load_pem_private_key(decrypted, password=None)
+        key_material = KeySecurity.derive_key_from_pin(self.pin)
+        decrypted = bytearray(len(encrypted_part))
+        try:
+            with instrumentation.stage("key.decrypt", len(encrypted_part)):
+                cipher = AES.new(key_material, AES.MODE_CFB, iv_part)
+                cipher.decrypt(encrypted_part, output=decrypted)
+            with instrumentation.stage("key.parse", len(decrypted)):
+                return serialization.load_pem_private_key(decrypted, password=None)
+        finally:
+            decrypted[:] = bytes(len(decrypted))
+## @class PublicKeyCache
+#  @brief Pamięć podręczna LRU sparsowanych kluczy publicznych, indeksowana odciskiem klucza.
+#  Odcisk (SHA-256 z DER SubjectPublicKeyInfo) odczytywany jest wprost z pancerza PEM,
+#  więc ponowne wczytanie tego samego klucza nie wymaga parsowania ASN.1.
+class PublicKeyCache:
+    _PEM_BLOCK = re.compile(rb"-----BEGIN PUBLIC KEY-----(.+?)-----END PUBLIC KEY-----", re.S)
+
+    ## @brief Konstruktor klasy.
+    #  @param capacity Maksymalna liczba przechowywanych kluczy.
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    ## @brief Liczy odcisk klucza publicznego.
+    #  @param public_key Obiekt klucza publicznego.
+    #  @return Odcisk SHA-256 (hex) z DER SubjectPublicKeyInfo.
+    @staticmethod
+    def fingerprint(public_key):
+        der = public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return hashlib.sha256(der).hexdigest()
+
+    ## @brief Liczy odcisk klucza bezpośrednio z bajtów PEM, bez parsowania klucza.
+    #  @param pem_bytes Klucz publiczny w formacie PEM.
+    #  @return Odcisk (hex) lub None, gdy PEM nie zawiera bloku "PUBLIC KEY".
+    @staticmethod
+    def pem_fingerprint(pem_bytes):
+        match = PublicKeyCache._PEM_BLOCK.search(pem_bytes)
+        if not match:
+            return None
+        try:
+            der = base64.b64decode(b"".join(match.group(1).split()), validate=True)
+        except binascii.Error:
+            return None
+        return hashlib.sha256(der).hexdigest()
+
+    ## @brief Zwraca klucz z pamięci podręcznej lub None.
+    #  @param key_fingerprint Odcisk klucza.
+    def get(self, key_fingerprint):
+        with self.lock:
+            key = self.entries.get(key_fingerprint)
+            if key is not None:
+                self.entries.move_to_end(key_fingerprint)
+            return key
+
+    ## @brief Zwraca sparsowany klucz dla podanych bajtów PEM, parsując je tylko przy pierwszym użyciu.
+    #  @param pem_bytes Klucz publiczny w formacie PEM.
+    #  @return Krotka (odcisk, klucz publiczny).
+    def load_pem(self, pem_bytes):
+        key_fingerprint = PublicKeyCache.pem_fingerprint(pem_bytes)
+        if key_fingerprint is not None:
+            key = self.get(key_fingerprint)
+            if key is not None:
+                self.hits += 1
+                return key_fingerprint, key
+
+        self.misses += 1
+        key = serialization.load_pem_public_key(pem_bytes)
+        key_fingerprint = PublicKeyCache.fingerprint(key)
+        with self.lock:
+            self.entries[key_fingerprint] = key
+            self.entries.move_to_end(key_fingerprint)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return key_fingerprint, key
+
+    ## @brief Wczytuje klucz publiczny z pliku PEM przez pamięć podręczną.
+    #  @param path Ścieżka do pliku PEM.
+    #  @return Krotka (odcisk, klucz publiczny).
+    def load_file(self, path):
+        with open(path, 'rb') as keyfile:
+            return self.load_pem(keyfile.read())
+## @class StreamHasher
+#  @brief Liczy skrót pliku blokami o stałym rozmiarze, bez wczytywania go w całości do pamięci.
+#  Algorytm (domyślnie SHA-256) i jego implementacja pochodzą z rejestru hash_backends.
+class StreamHasher:
+    ## @brief Tworzy nowy obiekt hashujący (metody update() i digest()).
+    #  @param algorithm Nazwa algorytmu z rejestru hash_backends.
+    #  @throw ValueError gdy algorytm nie jest dostępny.
+    @staticmethod
+    def new_hasher(algorithm=hash_backends.DEFAULT_ALGORITHM):
+        return hash_backends.get(algorithm).new()
+
+    ## @brief Liczy skrót danych w pamięci.
+    #  @param data Dane do zahashowania.
+    #  @param algorithm Nazwa algorytmu z rejestru hash_backends.
+    #  @return Skrót (bajty).
+    @staticmethod
+    def hash_bytes(data, algorithm=hash_backends.DEFAULT_ALGORITHM):
+        with instrumentation.stage("hash", len(data)):
+            hasher = StreamHasher.new_hasher(algorithm)
+            hasher.update(data)
+            return hasher.digest()
+
+    ## @brief Hashuje dane ze strumienia, zaczynając od jego bieżącej pozycji.
+    #  @param stream Plik otwarty w trybie binarnym.
+    #  @param length Liczba bajtów do przetworzenia (None - do końca strumienia).
+    #  @param sink Opcjonalny plik, do którego kopiowany jest każdy odczytany blok.
+    #  @param chunk_size Rozmiar pojedynczego bloku odczytu (None - preferowany przez implementację algorytmu).
+    #  @param progress Opcjonalna funkcja wywoływana po każdym bloku z łączną liczbą przetworzonych bajtów;
+    #  wyjątek zgłoszony przez nią przerywa hashowanie.
+    #  @param algorithm Nazwa algorytmu z rejestru hash_backends.
+    #  @return Skrót (bajty).
+    #  @throw EOFError gdy strumień skończy się przed odczytaniem length bajtów.
+    @staticmethod
+    def hash_stream(stream, length=None, sink=None, chunk_size=None, progress=None,
+                    algorithm=hash_backends.DEFAULT_ALGORITHM):
+        backend = hash_backends.get(algorithm)
+        hasher = backend.new()
+        chunk_size = chunk_size or backend.chunk_size
+        buffer = memoryview(bytearray(chunk_size))
+        remaining = length
+        done = 0
+        with instrumentation.stage("hash" if sink is None else "hash.copy") as timing:
+            while remaining is None or remaining > 0:
+                wanted = chunk_size if remaining is None else min(chunk_size, remaining)
+                count = stream.readinto(buffer[:wanted])
+                if not count:
+                    break
+                block = buffer[:count]
+                hasher.update(block)
+                if sink is not None:
+                    sink.write(block)
+                if remaining is not None:
+                    remaining -= count
+                done += count
+                if progress is not None:
+                    progress(done)
+            timing.add_bytes(done)
+            if remaining:
+                raise EOFError(f"Stream ended {remaining} bytes early")
+            return hasher.digest()
+
+    ## @brief Hashuje bufor (np. memoryview nad mmap) blokami, bez kopiowania danych.
+    #  @param buffer Obiekt obsługujący protokół bufora.
+    #  @param chunk_size Rozmiar pojedynczego bloku (None - preferowany przez implementację algorytmu).
+    #  @param progress Opcjonalna funkcja postępu (patrz hash_stream).
+    #  @param algorithm Nazwa algorytmu z rejestru hash_backends.
+    #  @return Skrót (bajty).
+    @staticmethod
+    def hash_buffer(buffer, chunk_size=None, progress=None, algorithm=hash_backends.DEFAULT_ALGORITHM):
+        backend = hash_backends.get(algorithm)
+        hasher = backend.new()
+        chunk_size = chunk_size or backend.chunk_size
+        with memoryview(buffer) as view, instrumentation.stage("hash", view.nbytes):
+            for start in range(0, len(view), chunk_size):
+                hasher.update(view[start:start + chunk_size])
+                if progress is not None:
+                    progress(min(start + chunk_size, len(view)))
+        return hasher.digest()
+
+    ## @brief Hashuje początkowy fragment pliku lub cały plik.
+    #  @param path Ścieżka do pliku.
+    #  @param length Liczba bajtów od początku pliku (None - cały plik).
+    #  @param progress Opcjonalna funkcja postępu (patrz hash_stream).
+    #  @param algorithm Nazwa algorytmu z rejestru hash_backends.
+    #  @return Skrót (bajty).
+    @staticmethod
+    def hash_file(path, length=None, progress=None, algorithm=hash_backends.DEFAULT_ALGORITHM):
+        with open(path, 'rb') as f:
+            return StreamHasher.hash_stream(f, length, progress=progress, algorithm=algorithm)
+## @class SignatureTrailer
+#  @brief Opisuje format podpisu dopisywanego na końcu dokumentu.
+#  Wersja 1 (historyczna, tylko weryfikacja): treść + podpis RSA (512 B) nad SHA256(SHA256(treść)).
+#  Wersja 2: treść + podpis RSA + stopka (znacznik "SPDFSIG", wersja, algorytm skrótu,
+#  długość podpisu). Podpis liczony jest przez Prehashed nad SHA256(znacznik || wersja || identyfikator
+#  algorytmu || skrót treści), więc dokument hashowany jest tylko raz, a podpis wiąże się z formatem
+#  i algorytmem zapisanym w stopce. Podpis wersji 1 nie jest przez to poprawnym podpisem wersji 2
+#  dla dokumentu o treści SHA256(treść), ani podpisem żadnego z formatów odłączonych.
+class SignatureTrailer:
+    MAGIC = b"SPDFSIG"
+    FOOTER = struct.Struct(">7sBBH")
+    VERSION_LEGACY = 1
+    VERSION_PREHASHED = 2
+
+    ## @brief Zwraca algorytm przekazywany do sign/verify dla danej wersji formatu.
+    #  @param version Wersja formatu podpisu.
+    @staticmethod
+    def signature_hash(version):
+        if version == SignatureTrailer.VERSION_LEGACY:
+            return hashes.SHA256()
+        if version == SignatureTrailer.VERSION_PREHASHED:
+            return Prehashed(hashes.SHA256())
+        raise ValueError(f"Unsupported signature version: {version}")
+
+    ## @brief Zwraca wartość przekazywaną do operacji RSA dla skrótu treści.
+    #  @param doc_hash Skrót treści.
+    #  @param version Wersja formatu podpisu.
+    #  @param hash_name Algorytm, którym policzono skrót.
+    @staticmethod
+    def statement(doc_hash, version, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        if version == SignatureTrailer.VERSION_LEGACY:
+            return doc_hash
+        return StreamHasher.hash_bytes(
+            SignatureTrailer.MAGIC + bytes([version, hash_backends.ALGORITHM_IDS[hash_name]]) + doc_hash)
+
+    ## @brief Buduje bajty dopisywane do dokumentu za treścią.
+    #  @param signature Podpis RSA.
+    #  @param version Wersja formatu podpisu.
+    #  @param hash_name Algorytm skrótu treści.
+    #  @return Podpis ze stopką.
+    #  @throw ValueError dla wersji 1 - podpisy historyczne są tylko weryfikowane.
+    @staticmethod
+    def build(signature, version, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        if version != SignatureTrailer.VERSION_PREHASHED:
+            raise ValueError(f"Signatures can no longer be created in format version {version}")
+        return signature + SignatureTrailer.FOOTER.pack(
+            SignatureTrailer.MAGIC, version, hash_backends.ALGORITHM_IDS[hash_name], len(signature))
+
+    ## @brief Rozpoznaje format na podstawie końcówki pliku.
+    #  @param tail Ostatnie bajty pliku (co najmniej FOOTER.size, o ile plik jest dłuższy).
+    #  @param file_size Całkowity rozmiar pliku.
+    #  @return Krotka (wersja, przesunięcie podpisu, długość podpisu, algorytm skrótu); przesunięcie podpisu
+    #  jest zarazem długością treści.
+    #  @throw ValueError gdy plik jest za krótki lub stopka jest nieprawidłowa.
+    @staticmethod
+    def locate(tail, file_size):
+        footer = tail[-SignatureTrailer.FOOTER.size:]
+        if len(footer) == SignatureTrailer.FOOTER.size and footer.startswith(SignatureTrailer.MAGIC):
+            _, version, hash_id, sig_len = SignatureTrailer.FOOTER.unpack(footer)
+            hash_name = hash_backends.algorithm_for_id(hash_id)
+            SignatureTrailer.signature_hash(version)
+            offset = file_size - SignatureTrailer.FOOTER.size - sig_len
+        else:
+            version, sig_len = SignatureTrailer.VERSION_LEGACY, SIGNATURE_SIZE
+            hash_name = hash_backends.DEFAULT_ALGORITHM
+            offset = file_size - SIGNATURE_SIZE
+        if offset < 0:
+            raise ValueError("File is too short to contain a signature")
+        return version, offset, sig_len, hash_name
+
+    ## @brief Odczytuje podpis z otwartego pliku przy użyciu seek.
+    #  @param f Plik otwarty w trybie binarnym.
+    #  @param file_size Rozmiar pliku.
+    #  @return Krotka (wersja, podpis, długość treści, algorytm skrótu).
+    @staticmethod
+    def read(f, file_size):
+        f.seek(max(file_size - SignatureTrailer.FOOTER.size, 0))
+        version, offset, sig_len, hash_name = SignatureTrailer.locate(f.read(), file_size)
+        f.seek(offset)
+        return version, f.read(sig_len), offset, hash_name
+
+    ## @brief Sprawdza podpis skrótu treści zgodnie z wersją formatu.
+    #  @param rsa_pub_key Klucz publiczny RSA.
+    #  @param signature Podpis RSA.
+    #  @param doc_hash Skrót treści.
+    #  @param version Wersja formatu podpisu.
+    #  @param hash_name Algorytm, którym policzono skrót treści.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    @staticmethod
+    def verify(rsa_pub_key, signature, doc_hash, version, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        statement = SignatureTrailer.statement(doc_hash, version, hash_name)
+        with instrumentation.stage("rsa.verify"):
+            rsa_pub_key.verify(signature, statement, padding.PKCS1v15(), SignatureTrailer.signature_hash(version))
+## @class SignedStatement
+#  @brief Podpis RSA kanonicznych danych podpisu odłączonego. Podpisywany jest (przez Prehashed)
+#  SHA256(etykieta || dane), z osobną etykietą dla każdego formatu. Dane podpisu dopisywanego do dokumentu
+#  zaczynają się od SignatureTrailer.MAGIC, więc podpisu jednego formatu nie da się użyć w innym.
+class SignedStatement:
+    MANIFEST = b"SPDF-MANIFEST\0"
+    MERKLE_ROOT = b"SPDF-MERKLE-ROOT\0"
+    CHAIN = b"SPDF-CHAIN\0"
+
+    ## @brief Zwraca skrót podpisywany dla danych z etykietą.
+    #  @param tag Etykieta formatu.
+    #  @param body Kanoniczne dane.
+    @staticmethod
+    def digest(tag, body):
+        return StreamHasher.hash_bytes(tag + body)
+
+    ## @brief Podpisuje dane z etykietą.
+    #  @param rsa_key Klucz prywatny RSA.
+    #  @param tag Etykieta formatu.
+    #  @param body Kanoniczne dane.
+    #  @return Podpis RSA.
+    @staticmethod
+    def sign(rsa_key, tag, body):
+        with instrumentation.stage("rsa.sign"):
+            return rsa_key.sign(SignedStatement.digest(tag, body), padding.PKCS1v15(), Prehashed(hashes.SHA256()))
+
+    ## @brief Sprawdza podpis danych z etykietą.
+    #  @param rsa_pub_key Klucz publiczny RSA.
+    #  @param signature Podpis RSA.
+    #  @param tag Etykieta formatu.
+    #  @param body Kanoniczne dane.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    @staticmethod
+    def verify(rsa_pub_key, signature, tag, body):
+        with instrumentation.stage("rsa.verify"):
+            rsa_pub_key.verify(signature, SignedStatement.digest(tag, body), padding.PKCS1v15(),
+                               Prehashed(hashes.SHA256()))
+
+## @class SignatureManifest
+#  @brief Podpis odłączony (detached) - plik JSON ze skrótami dokumentów, odciskiem klucza
+#  i jednym podpisem RSA nad kanoniczną postacią tych danych. Dokumenty pozostają niezmienione.
+#  Pole "hash" podaje algorytm skrótów dokumentów; dane podpisywane (manifest, korzeń drzewa,
+#  ogniwa łańcucha) zawsze hashowane są SHA-256.
+#  Plik ".sig" obok dokumentu to manifest z jednym wpisem; manifest może też obejmować wiele plików.
+#  Ścieżki wpisów są względne wobec katalogu manifestu.
+class SignatureManifest:
+    FORMAT = "spdf-manifest"
+    VERSION = 1
+    SUFFIX = ".sig"
+    ALGORITHM = "rsa-pkcs1v15"
+
+    ## @brief Konstruktor klasy.
+    #  @param entries Słownik nazwa -> (rozmiar, skrót).
+    #  @param key_id Odcisk klucza publicznego podpisującego.
+    #  @param signature Podpis RSA nad kanoniczną treścią manifestu.
+    #  @param hash_name Algorytm skrótów dokumentów (z rejestru hash_backends).
+    def __init__(self, entries=None, key_id=None, signature=None, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        self.entries = dict(entries or {})
+        self.key_id = key_id
+        self.signature = signature
+        self.hash_name = hash_name
+
+    ## @brief Zwraca ścieżkę pliku ".sig" dla dokumentu.
+    @staticmethod
+    def sidecar_path(document_path):
+        return document_path + SignatureManifest.SUFFIX
+
+    ## @brief Sprawdza, czy plik podpisu można zastąpić manifestem lub dowodem Merkle.
+    #  Podpis łańcuchowy obejmuje wszystkie podpisane wersje dokumentu, więc nie jest zastępowany.
+    #  @param path Ścieżka pliku podpisu.
+    #  @throw ValueError gdy pod ścieżką jest podpis łańcuchowy.
+    @staticmethod
+    def ensure_replaceable(path):
+        if not os.path.isfile(path):
+            return
+        try:
+            existing = SignatureManifest.load(path)
+        except ValueError:
+            return
+        if isinstance(existing, ChainedSignature):
+            raise ValueError(f"{path} is a signature chain; refusing to replace it")
+
+    ## @brief Zwraca nazwę wpisu dokumentu względem katalogu manifestu.
+    @staticmethod
+    def entry_name(document_path, manifest_path):
+        base = os.path.dirname(os.path.abspath(manifest_path))
+        return os.path.relpath(os.path.abspath(document_path), base).replace(os.sep, "/")
+
+    ## @brief Dodaje dokument do manifestu.
+    #  @param name Nazwa wpisu (patrz entry_name).
+    #  @param size Rozmiar dokumentu w bajtach.
+    #  @param digest Skrót dokumentu.
+    def add(self, name, size, digest):
+        self.entries[name] = (size, digest)
+
+    ## @brief Zwraca kanoniczną postać podpisywanych danych (bez podpisu).
+    def body(self):
+        return json.dumps({
+            "format": self.FORMAT, "version": self.VERSION, "hash": self.hash_name, "algorithm": self.ALGORITHM,
+            "key_id": self.key_id,
+            "entries": [{"path": name, "size": size, "digest": digest.hex()}
+                        for name, (size, digest) in sorted(self.entries.items())],
+        }, sort_keys=True, separators=(",", ":")).encode()
+
+    ## @brief Podpisuje manifest kluczem prywatnym (jedna operacja RSA niezależnie od liczby wpisów).
+    #  @param signer Obiekt DigitalSigner.
+    def sign(self, signer):
+        self.key_id = PublicKeyCache.fingerprint(signer.key.public_key())
+        self.signature = SignedStatement.sign(signer.key, SignedStatement.MANIFEST, self.body())
+
+    ## @brief Sprawdza podpis manifestu.
+    #  @param rsa_pub_key Klucz publiczny RSA.
+    #  @throw InvalidSignature gdy podpis się nie zgadza.
+    def verify(self, rsa_pub_key):
+        SignedStatement.verify(rsa_pub_key, self.signature, SignedStatement.MANIFEST, self.body())
+
+    ## @brief Serializuje podpisany manifest.
+    def to_bytes(self):
+        document = json.loads(self.body())
+        document["signature"] = base64.b64encode(self.signature).decode()
+        return json.dumps(document, separators=(",", ":")).encode() + b"\n"
+
+    ## @brief Zapisuje manifest atomowo (plik tymczasowy + os.replace).
+    #  @param path Ścieżka pliku wynikowego.
+    def save(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as out:
+            out.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    ## @brief Zwraca oczekiwany skrót dokumentu.
+    #  @param document_path Ścieżka dokumentu.
+    #  @param manifest_path Ścieżka manifestu (wpisy są względne wobec jego katalogu).
+    #  @throw ValueError gdy manifest nie obejmuje dokumentu.
+    def digest_for(self, document_path, manifest_path):
+        name = SignatureManifest.entry_name(document_path, manifest_path)
+        if name not in self.entries:
+            raise ValueError(f"{name} is not covered by {manifest_path}")
+        return self.entries[name][1]
+
+    ## @brief Odczytuje podpis odłączony z pliku.
+    #  @param path Ścieżka do pliku ".sig" lub manifestu.
+    #  @return Obiekt SignatureManifest, MerkleProof lub ChainedSignature (zależnie od pola "format").
+    #  @throw ValueError gdy plik nie jest obsługiwanym podpisem odłączonym.
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            try:
+                document = json.load(f)
+                if document.get("format") == MerkleProof.FORMAT:
+                    return MerkleProof.from_document(document)
+                if document.get("format") == ChainedSignature.FORMAT:
+                    return ChainedSignature.from_document(document)
+                if document.get("format") != SignatureManifest.FORMAT:
+                    raise ValueError("not a signature manifest")
+                if document.get("version") != SignatureManifest.VERSION:
+                    raise ValueError(f"unsupported manifest version {document.get('version')}")
+                hash_name = SignatureManifest.hash_name_of(document)
+                entries = {e["path"]: (int(e["size"]), bytes.fromhex(e["digest"])) for e in document["entries"]}
+                return SignatureManifest(entries, document["key_id"], base64.b64decode(document["signature"]),
+                                         hash_name)
+            except (KeyError, TypeError, AttributeError, ValueError) as error:
+                raise ValueError(f"Malformed signature manifest {path}: {error}") from error
+
+    ## @brief Sprawdza pola "hash" i "algorithm" odczytanego podpisu odłączonego.
+    #  @param document Odczytany dokument JSON.
+    #  @return Algorytm skrótów dokumentów.
+    #  @throw ValueError gdy algorytm nie jest obsługiwany.
+    @staticmethod
+    def hash_name_of(document):
+        hash_name, algorithm = document.get("hash"), document.get("algorithm")
+        if hash_name not in hash_backends.ALGORITHM_IDS or algorithm != SignatureManifest.ALGORITHM:
+            raise ValueError(f"unsupported algorithm {algorithm}/{hash_name}")
+        return hash_name
+
+## @class MerkleTree
+#  @brief Drzewo skrótów SHA-256 nad dokumentami partii. Liście i węzły wewnętrzne mają różne prefiksy
+#  (jak w RFC 6962), a węzeł bez pary przechodzi na wyższy poziom bez zmian.
+class MerkleTree:
+    LEAF_PREFIX = b"\x00"
+    NODE_PREFIX = b"\x01"
+
+    ## @brief Konstruktor klasy - buduje wszystkie poziomy drzewa.
+    #  @param leaves Lista skrótów liści (patrz leaf_hash).
+    #  @throw ValueError gdy lista liści jest pusta.
+    def __init__(self, leaves):
+        if not leaves:
+            raise ValueError("Merkle tree needs at least one leaf")
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [MerkleTree.node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    ## @brief Skrót liścia - wiąże rozmiar i skrót dokumentu.
+    @staticmethod
+    def leaf_hash(size, digest):
+        return StreamHasher.hash_bytes(MerkleTree.LEAF_PREFIX + struct.pack(">Q", size) + digest)
+
+    ## @brief Skrót węzła wewnętrznego.
+    @staticmethod
+    def node_hash(left, right):
+        return StreamHasher.hash_bytes(MerkleTree.NODE_PREFIX + left + right)
+
+    ## @brief Korzeń drzewa.
+    def root(self):
+        return self.levels[-1][0]
+
+    ## @brief Zwraca dowód przynależności liścia - skróty sąsiadów od liścia do korzenia.
+    #  @param index Numer liścia.
+    def proof(self, index):
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append(level[sibling])
+            index //= 2
+        return path
+
+    ## @brief Odtwarza korzeń z liścia i dowodu przynależności.
+    #  @param leaf Skrót liścia.
+    #  @param index Numer liścia.
+    #  @param leaf_count Liczba liści w drzewie.
+    #  @param proof Lista skrótów sąsiadów.
+    #  @return Korzeń lub None, gdy dowód nie pasuje do kształtu drzewa.
+    @staticmethod
+    def root_from_proof(leaf, index, leaf_count, proof):
+        if not 0 <= index < leaf_count:
+            return None
+        node, width, remaining = leaf, leaf_count, list(proof)
+        while width > 1:
+            sibling = index ^ 1
+            if sibling < width:
+                if not remaining:
+                    return None
+                other = remaining.pop(0)
+                node = MerkleTree.node_hash(node, other) if index % 2 == 0 else MerkleTree.node_hash(other, node)
+            index //= 2
+            width = (width + 1) // 2
+        return node if not remaining else None
+
+## @class MerkleProof
+#  @brief Podpis odłączony jednego dokumentu z partii podpisanej drzewem Merkle: skrót dokumentu,
+#  dowód przynależności i wspólny dla całej partii podpis RSA nad korzeniem.
+#  Sprawdzone korzenie zapamiętywane są w pamięci procesu, więc kolejne dokumenty tej samej partii
+#  weryfikowane są bez operacji RSA.
+class MerkleProof:
+    FORMAT = "spdf-merkle"
+    VERSION = 1
+    ROOT_CACHE_SIZE = 1024
+    _verified_roots = OrderedDict()
+    _roots_lock = threading.Lock()
+
+    ## @brief Konstruktor klasy.
+    #  @param root Korzeń drzewa.
+    #  @param leaf_count Liczba dokumentów w partii.
+    #  @param index Numer dokumentu w partii.
+    #  @param size Rozmiar dokumentu.
+    #  @param digest Skrót dokumentu.
+    #  @param proof Lista skrótów sąsiadów.
+    #  @param key_id Odcisk klucza publicznego.
+    #  @param signature Podpis RSA nad korzeniem.
+    #  @param hash_name Algorytm skrótów dokumentów partii.
+    def __init__(self, root, leaf_count, index, size, digest, proof, key_id, signature,
+                 hash_name=hash_backends.DEFAULT_ALGORITHM):
+        self.root = root
+        self.leaf_count = leaf_count
+        self.index = index
+        self.size = size
+        self.digest = digest
+        self.proof = proof
+        self.key_id = key_id
+        self.signature = signature
+        self.hash_name = hash_name
+
+    ## @brief Podpisuje partię dokumentów jedną operacją RSA.
+    #  @param signer Obiekt DigitalSigner (jego hash_name to algorytm skrótów dokumentów).
+    #  @param entries Lista krotek (rozmiar, skrót) w kolejności dokumentów.
+    #  @return Lista obiektów MerkleProof w tej samej kolejności.
+    @staticmethod
+    def sign_batch(signer, entries):
+        tree = MerkleTree([MerkleTree.leaf_hash(size, digest) for size, digest in entries])
+        key_id = PublicKeyCache.fingerprint(signer.key.public_key())
+        root = tree.root()
+        statement = MerkleProof.root_statement(root, len(entries), key_id, signer.hash_name)
+        signature = SignedStatement.sign(signer.key, SignedStatement.MERKLE_ROOT, statement)
+        return [MerkleProof(root, len(entries), index, size, digest, tree.proof(index), key_id, signature,
+                            signer.hash_name)
+                for index, (size, digest) in enumerate(entries)]
+
+    ## @brief Zwraca kanoniczną postać podpisywanych danych partii.
+    @staticmethod
+    def root_statement(root, leaf_count, key_id, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        return json.dumps({
+            "format": MerkleProof.FORMAT, "version": MerkleProof.VERSION, "hash": hash_name,
+            "algorithm": SignatureManifest.ALGORITHM, "key_id": key_id, "root": root.hex(),
+            "leaf_count": leaf_count,
+        }, sort_keys=True, separators=(",", ":")).encode()
+
+    ## @brief Zwraca oczekiwany skrót dokumentu (dowód dotyczy jednego dokumentu).
+    def digest_for(self, document_path, signature_path):
+        return self.digest
+
+    ## @brief Sprawdza dowód przynależności i podpis korzenia.
+    #  @param rsa_pub_key Klucz publiczny RSA.
+    #  @throw InvalidSignature gdy dowód lub podpis się nie zgadza.
+    def verify(self, rsa_pub_key):
+        leaf = MerkleTree.leaf_hash(self.size, self.digest)
+        if MerkleTree.root_from_proof(leaf, self.index, self.leaf_count, self.proof) != self.root:
+            raise InvalidSignature("Inclusion proof does not lead to the signed root")
+        cache_key = (PublicKeyCache.fingerprint(rsa_pub_key), self.root, self.leaf_count, self.hash_name,
+                     self.signature)
+        with MerkleProof._roots_lock:
+            if cache_key in MerkleProof._verified_roots:
+                MerkleProof._verified_roots.move_to_end(cache_key)
+                return
+        statement = MerkleProof.root_statement(self.root, self.leaf_count, self.key_id, self.hash_name)
+        SignedStatement.verify(rsa_pub_key, self.signature, SignedStatement.MERKLE_ROOT, statement)
+        with MerkleProof._roots_lock:
+            MerkleProof._verified_roots[cache_key] = True
+            if len(MerkleProof._verified_roots) > MerkleProof.ROOT_CACHE_SIZE:
+                MerkleProof._verified_roots.popitem(last=False)
+
+    ## @brief Serializuje dowód do pliku ".sig".
+    def to_bytes(self):
+        return json.dumps({
+            "format": self.FORMAT, "version": self.VERSION, "hash": self.hash_name,
+            "algorithm": SignatureManifest.ALGORITHM, "key_id": self.key_id, "root": self.root.hex(),
+            "leaf_count": self.leaf_count, "index": self.index, "size": self.size, "digest": self.digest.hex(),
+            "proof": [node.hex() for node in self.proof], "signature": base64.b64encode(self.signature).decode(),
+        }, separators=(",", ":")).encode() + b"\n"
+
+    ## @brief Zapisuje dowód atomowo (plik tymczasowy + os.replace).
+    def save(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as out:
+            out.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    ## @brief Tworzy obiekt z odczytanego dokumentu JSON (patrz SignatureManifest.load).
+    #  @throw ValueError gdy wersja lub algorytm nie są obsługiwane.
+    @staticmethod
+    def from_document(document):
+        if document.get("version") != MerkleProof.VERSION:
+            raise ValueError(f"unsupported Merkle proof version {document.get('version')}")
+        hash_name = SignatureManifest.hash_name_of(document)
+        return MerkleProof(bytes.fromhex(document["root"]), int(document["leaf_count"]), int(document["index"]),
+                           int(document["size"]), bytes.fromhex(document["digest"]),
+                           [bytes.fromhex(node) for node in document["proof"]], document["key_id"],
+                           base64.b64decode(document["signature"]), hash_name)
+
+## @class ChainedSignature
+#  @brief Podpis odłączony dokumentu zmienianego przez dopisywanie (przyrostowe aktualizacje PDF).
+#  Plik dzielony jest na segmenty - po jednym na każde podpisanie. Dla każdego segmentu zapisywany jest
+#  jego skrót (algorytmem z pola "hash") oraz wartość łańcucha:
+#  chain_i = SHA256(0x02 || chain_{i-1} || koniec_i (8 bajtów) || skrót_i), chain_0 = 32 bajty zerowe,
+#  podpisana kluczem RSA. Ponowne podpisanie hashuje więc tylko dopisane bajty.
+class ChainedSignature:
+    FORMAT = "spdf-chain"
+    VERSION = 1
+    LINK_PREFIX = b"\x02"
+    GENESIS = bytes(32)
+
+    ## @brief Konstruktor klasy.
+    #  @param key_id Odcisk klucza publicznego.
+    #  @param segments Lista krotek (koniec segmentu, skrót segmentu, wartość łańcucha, podpis).
+    #  @param hash_name Algorytm skrótów segmentów.
+    def __init__(self, key_id=None, segments=None, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        self.key_id = key_id
+        self.segments = list(segments or [])
+        self.hash_name = hash_name
+
+    ## @brief Liczy kolejne ogniwo łańcucha.
+    @staticmethod
+    def link(previous, end, digest):
+        return StreamHasher.hash_bytes(ChainedSignature.LINK_PREFIX + previous + struct.pack(">Q", end) + digest)
+
+    ## @brief Zwraca kanoniczną postać danych podpisywanych dla jednej wersji dokumentu.
+    def statement(self, end, chain):
+        return json.dumps({
+            "format": self.FORMAT, "version": self.VERSION, "hash": self.hash_name,
+            "algorithm": SignatureManifest.ALGORITHM, "key_id": self.key_id, "end": end, "chain": chain.hex(),
+        }, sort_keys=True, separators=(",", ":")).encode()
+
+    ## @brief Podpis ostatniej wersji dokumentu.
+    @property
+    def signature(self):
+        return self.segments[-1][3] if self.segments else None
+
+    ## @brief Liczba bajtów objętych ostatnim podpisem.
+    def size(self):
+        return self.segments[-1][0] if self.segments else 0
+
+    ## @brief Zwraca identyfikator podziału dokumentu na segmenty.
+    #  Wartość łańcucha zależy od końców segmentów, a nie tylko od treści dokumentu, więc identyfikator
+    #  odróżnia w pamięci podręcznej skróty tego samego pliku liczone dla różnych łańcuchów.
+    def layout(self):
+        ends = ",".join(str(segment[0]) for segment in self.segments)
+        return "chain-" + StreamHasher.hash_bytes(ends.encode()).hex()[:32]
+
+    ## @brief Wartość łańcucha po ostatnim podpisanym segmencie.
+    def chain(self):
+        return self.segments[-1][2] if self.segments else self.GENESIS
+
+    ## @brief Dopisuje i podpisuje nowy segment.
+    #  @param signer Obiekt DigitalSigner.
+    #  @param end Koniec segmentu (rozmiar dokumentu po aktualizacji).
+    #  @param digest Skrót bajtów od końca poprzedniego segmentu do end.
+    def append(self, signer, end, digest):
+        chain = ChainedSignature.link(self.chain(), end, digest)
+        signature = SignedStatement.sign(signer.key, SignedStatement.CHAIN, self.statement(end, chain))
+        self.segments.append((end, digest, chain, signature))
+
+    ## @brief Zwraca oczekiwaną wartość łańcucha dla całego dokumentu.
+    def digest_for(self, document_path, signature_path):
+        return self.chain()
+
+    ## @brief Liczy łańcuch z treści dokumentu, segment po segmencie.
+    #  Bajty za ostatnim podpisanym segmentem tworzą dodatkowy segment, więc niepodpisane dopiski
+    #  dają inną wartość łańcucha.
+    #  @param read_segment Funkcja (początek, koniec) -> skrót tego zakresu (algorytmem hash_name).
+    #  @param size Rozmiar dokumentu.
+    #  @return Wartość łańcucha.
+    def chain_content(self, read_segment, size):
+        ends = [segment[0] for segment in self.segments if segment[0] <= size]
+        if not ends or ends[-1] != size:
+            ends.append(size)
+        chain, start = self.GENESIS, 0
+        for end in ends:
+            chain = ChainedSignature.link(chain, end, read_segment(start, end))
+            start = end
+        return chain
+
+    ## @brief Sprawdza ciągłość łańcucha i podpisy wszystkich wersji dokumentu.
+    #  @param rsa_pub_key Klucz publiczny RSA.
+    #  @throw InvalidSignature gdy ogniwo lub podpis którejkolwiek wersji się nie zgadza.
+    def verify(self, rsa_pub_key):
+        chain, start = self.GENESIS, 0
+        for number, (end, digest, stored_chain, signature) in enumerate(self.segments, 1):
+            chain = ChainedSignature.link(chain, end, digest)
+            if end < start or chain != stored_chain:
+                raise InvalidSignature(f"Signature chain is broken at revision {number}")
+            try:
+                SignedStatement.verify(rsa_pub_key, signature, SignedStatement.CHAIN, self.statement(end, chain))
+            except InvalidSignature:
+                raise InvalidSignature(f"Signature of revision {number} does not match") from None
+            start = end
+
+    ## @brief Serializuje podpis do pliku ".sig".
+    def to_bytes(self):
+        return json.dumps({
+            "format": self.FORMAT, "version": self.VERSION, "hash": self.hash_name,
+            "algorithm": SignatureManifest.ALGORITHM, "key_id": self.key_id,
+            "segments": [{"end": end, "digest": digest.hex(), "chain": chain.hex(),
+                          "signature": base64.b64encode(signature).decode()}
+                         for end, digest, chain, signature in self.segments],
+        }, separators=(",", ":")).encode() + b"\n"
+
+    ## @brief Zapisuje podpis atomowo (plik tymczasowy + os.replace).
+    def save(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as out:
+            out.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    ## @brief Tworzy obiekt z odczytanego dokumentu JSON (patrz SignatureManifest.load).
+    #  @throw ValueError gdy wersja lub algorytm nie są obsługiwane.
+    @staticmethod
+    def from_document(document):
+        if document.get("version") != ChainedSignature.VERSION:
+            raise ValueError(f"unsupported chained signature version {document.get('version')}")
+        hash_name = SignatureManifest.hash_name_of(document)
+        return ChainedSignature(document["key_id"], [
+            (int(s["end"]), bytes.fromhex(s["digest"]), bytes.fromhex(s["chain"]), base64.b64decode(s["signature"]))
+            for s in document["segments"]], hash_name)
+
 ## @class DigitalSigner
 #  @brief Obsługuje podpisywanie danych za pomocą klucza RSA.
 class DigitalSigner:
     ## @brief Konstruktor klasy.
+    #  Podpisy tworzone są zawsze w formacie wersji 2; wersja 1 jest obsługiwana tylko przy weryfikacji.
     #  @param rsa_key Klucz RSA (prywatny).
-    def __init__(self, rsa_key):
+    #  @param hash_name Algorytm skrótu treści dokumentów (z rejestru hash_backends).
+    #  @throw ValueError gdy algorytm nie jest dostępny.
+    def __init__(self, rsa_key, hash_name=hash_backends.DEFAULT_ALGORITHM):
+        hash_backends.get(hash_name)
         self.key = rsa_key
+        self.version = SignatureTrailer.VERSION_PREHASHED
+        self.hash_name = hash_name
 
     ## @brief Tworzy podpis cyfrowy dla przekazanych danych.
     #  @param raw_bytes Surowe dane do podpisania.
     #  @return Podpis cyfrowy (bajty).
     def sign_data(self, raw_bytes):
-        doc_hash = SHA256.new(raw_bytes).digest()
-        return self.key.sign(doc_hash, padding.PKCS1v15(), hashes.SHA256())
\ No newline at end of file
+        return self.sign_digest(StreamHasher.hash_bytes(raw_bytes, self.hash_name))
+
+    ## @brief Podpisuje gotowy skrót treści dokumentu.
+    #  @param doc_hash Skrót treści policzony algorytmem hash_name.
+    #  @return Podpis cyfrowy (bajty).
+    def sign_digest(self, doc_hash):
+        statement = SignatureTrailer.statement(doc_hash, self.version, self.hash_name)
+        with instrumentation.stage("rsa.sign"):
+            return self.key.sign(statement, padding.PKCS1v15(), SignatureTrailer.signature_hash(self.version))
+
+    ## @brief Zwraca bajty do dopisania za treścią dokumentu.
+    #  @param signature Podpis zwrócony przez sign_data lub sign_digest.
+    def trailer(self, signature):
+        return SignatureTrailer.build(signature, self.version, self.hash_name)
+
+    ## @brief Podpisuje plik strumieniowo, przy stałym zużyciu pamięci niezależnym od rozmiaru pliku.
+    #  Gdy target_path jest pusty, podpis dopisywany jest na końcu pliku źródłowego.
+    #  W przeciwnym razie plik kopiowany jest blokami (w tym samym przebiegu co hashowanie),
+    #  a podpis dopisywany na końcu kopii.
+    #  @param source_path Ścieżka do podpisywanego pliku.
+    #  @param target_path Ścieżka pliku wynikowego lub None.
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream). Przerwanie przez nią
+    #  operacji nie zmienia pliku źródłowego, a niedokończona kopia jest usuwana.
+    #  @return Podpis cyfrowy (bajty).
+    def sign_file(self, source_path, target_path=None, progress=None):
+        if target_path is None or os.path.abspath(target_path) == os.path.abspath(source_path):
+            signature = self.sign_digest(StreamHasher.hash_file(source_path, progress=progress,
+                                                                algorithm=self.hash_name))
+            with open(source_path, 'ab') as doc:
+                doc.write(self.trailer(signature))
+            return signature
+
+        try:
+            with open(source_path, 'rb') as src, open(target_path, 'wb') as dst:
+                signature = self.sign_digest(StreamHasher.hash_stream(src, sink=dst, progress=progress,
+                                                                      algorithm=self.hash_name))
+                dst.write(self.trailer(signature))
+        except BaseException:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
+        return signature
+
+    ## @brief Podpisuje plik bez jego modyfikacji - zapisuje obok niego plik ".sig" (kilkaset bajtów).
+    #  @param source_path Ścieżka do podpisywanego pliku.
+    #  @param signature_path Ścieżka pliku podpisu (None - source_path + ".sig").
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @param overwrite True - zastępuje także istniejący podpis łańcuchowy.
+    #  @return Ścieżka zapisanego pliku podpisu.
+    #  @throw ValueError gdy plik podpisu jest podpisem łańcuchowym, a overwrite jest False.
+    def sign_detached(self, source_path, signature_path=None, progress=None, overwrite=False):
+        signature_path = signature_path or SignatureManifest.sidecar_path(source_path)
+        self.sign_manifest([source_path], signature_path, progress, overwrite)
+        return signature_path
+
+    ## @brief Podpisuje wiele plików jednym manifestem i jedną operacją RSA.
+    #  @param document_paths Lista ścieżek dokumentów.
+    #  @param manifest_path Ścieżka pliku manifestu.
+    #  @param progress Opcjonalna funkcja postępu wywoływana z łączną liczbą bajtów wszystkich plików.
+    #  @param overwrite True - zastępuje także istniejący podpis łańcuchowy.
+    #  @return Obiekt SignatureManifest.
+    #  @throw ValueError gdy plik manifestu jest podpisem łańcuchowym, a overwrite jest False.
+    def sign_manifest(self, document_paths, manifest_path, progress=None, overwrite=False):
+        if not overwrite:
+            SignatureManifest.ensure_replaceable(manifest_path)
+        manifest = SignatureManifest(hash_name=self.hash_name)
+        done = 0
+        for path in document_paths:
+            offset = done
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                digest = StreamHasher.hash_stream(
+                    f, size, progress=progress and (lambda count, offset=offset: progress(offset + count)),
+                    algorithm=self.hash_name)
+            manifest.add(SignatureManifest.entry_name(path, manifest_path), size, digest)
+            done += size
+        manifest.sign(self)
+        manifest.save(manifest_path)
+        return manifest
+
+    ## @brief Podpisuje partię plików drzewem Merkle - jedna operacja RSA nad korzeniem,
+    #  a obok każdego dokumentu plik ".sig" z jego dowodem przynależności.
+    #  @param document_paths Lista ścieżek dokumentów.
+    #  @param progress Opcjonalna funkcja postępu wywoływana z łączną liczbą bajtów wszystkich plików.
+    #  @param overwrite True - zastępuje także istniejące podpisy łańcuchowe.
+    #  @return Lista obiektów MerkleProof.
+    #  @throw ValueError gdy plik ".sig" któregoś dokumentu jest podpisem łańcuchowym, a overwrite jest False
+    #  (żaden dowód nie jest wtedy zapisywany).
+    def sign_merkle_batch(self, document_paths, progress=None, overwrite=False):
+        if not overwrite:
+            for path in document_paths:
+                SignatureManifest.ensure_replaceable(SignatureManifest.sidecar_path(path))
+        entries = []
+        done = 0
+        for path in document_paths:
+            offset = done
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                entries.append((size, StreamHasher.hash_stream(
+                    f, size, progress=progress and (lambda count, offset=offset: progress(offset + count)),
+                    algorithm=self.hash_name)))
+            done += size
+        proofs = MerkleProof.sign_batch(self, entries)
+        for path, proof in zip(document_paths, proofs):
+            proof.save(SignatureManifest.sidecar_path(path))
+        return proofs
+
+    ## @brief Podpisuje przyrostowo dokument zmieniany przez dopisywanie na końcu.
+    #  Jeśli obok dokumentu jest już podpis łańcuchowy, do łańcucha dodawany jest nowy, podpisany segment
+    #  ze skrótem bajtów dopisanych od ostatniego podpisu (algorytmem zapisanym w łańcuchu).
+    #  Gdy podpisu nie ma, łańcuch zaczyna się od całego dokumentu. Innego podpisu odłączonego
+    #  (manifestu, dowodu Merkle) funkcja nie zastępuje.
+    #  @param source_path Ścieżka dokumentu.
+    #  @param signature_path Ścieżka pliku podpisu (None - source_path + ".sig").
+    #  @param progress Opcjonalna funkcja postępu (patrz StreamHasher.hash_stream).
+    #  @param verify_prefix True - przed dopisaniem segmentu sprawdzana jest (pełnym odczytem) niezmienność
+    #  już podpisanej części, aby nie podpisać wersji, której łańcuch nie da się zweryfikować;
+    #  False (domyślnie) - hashowane są tylko dopisane bajty, a zmiana podpisanej części wychodzi przy weryfikacji.
+    #  @return Obiekt ChainedSignature.
+    #  @throw ValueError gdy plik podpisu nie jest podpisem łańcuchowym, dokument jest krótszy niż podpisana
+    #  część, łańcuch podpisano innym kluczem albo (przy verify_prefix) podpisana część została zmieniona.
+    def sign_incremental(self, source_path, signature_path=None, progress=None, verify_prefix=False):
+        signature_path = signature_path or SignatureManifest.sidecar_path(source_path)
+        key_id = PublicKeyCache.fingerprint(self.key.public_key())
+        chained = None
+        if os.path.isfile(signature_path):
+            chained = SignatureManifest.load(signature_path)
+            if not isinstance(chained, ChainedSignature):
+                raise ValueError(f"{signature_path} is not a signature chain; refusing to replace it")
+        if chained is None:
+            chained = ChainedSignature(key_id, hash_name=self.hash_name)
+        elif chained.key_id != key_id:
+            raise ValueError("Signature chain was created with a different key")
+
+        with open(source_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            start = chained.size()
+            if size < start:
+                raise ValueError(f"Document is {start - size} bytes shorter than its signed part")
+            if verify_prefix and chained.segments:
+                def read_segment(begin, end):
+                    f.seek(begin)
+                    return StreamHasher.hash_stream(f, end - begin, algorithm=chained.hash_name)
+                if chained.chain_content(read_segment, start) != chained.chain():
+                    raise ValueError("Signed part of the document was modified")
+            if size == start and chained.segments:
+                return chained
+            f.seek(start)
+            digest = StreamHasher.hash_stream(f, size - start, progress=progress, algorithm=chained.hash_name)
+        chained.append(self, size, digest)
+        chained.save(signature_path)
+        return chained
\ No newline at end of file
@@ -0,0 +1,170 @@
+## @file verification_cache.py
+#  @brief Trwała pamięć podręczna wyników weryfikacji (SQLite) - niezmienione pliki nie są ponownie
+#  hashowane ani weryfikowane kluczem RSA.
+import os
+import sqlite3
+import threading
+import time
+
+import hash_backends
+
+## @class CachedVerdict
+#  @brief Zapamiętany wynik weryfikacji jednego pliku jednym kluczem.
+class CachedVerdict:
+    ## @brief Konstruktor klasy.
+    #  @param valid True, gdy podpis był poprawny.
+    #  @param digest Skrót SHA-256 treści dokumentu.
+    #  @param version Wersja formatu podpisu.
+    def __init__(self, valid, digest, version):
+        self.valid = valid
+        self.digest = digest
+        self.version = version
+
+## @class VerificationCache
+#  @brief Indeks wyników weryfikacji z kluczem (urządzenie, i-węzeł, rozmiar, mtime_ns, odcisk klucza)
+#  i usuwaniem najdawniej używanych wpisów (LRU).
+class VerificationCache:
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS verdicts (
+            device INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            key_fingerprint TEXT NOT NULL,
+            digest BLOB NOT NULL,
+            valid INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (device, inode, size, mtime_ns, key_fingerprint)
+        );
+        CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used);
+    """
+    EVICT_EVERY = 256
+    TOUCH_BATCH = 256
+
+    ## @brief Konstruktor klasy - otwiera (lub tworzy) bazę.
+    #  @param path Ścieżka do pliku bazy SQLite.
+    #  @param max_entries Maksymalna liczba przechowywanych wyników.
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.writes_since_evict = 0
+        self.touched = {}
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self._SCHEMA)
+
+    ## @brief Zwraca tożsamość pliku używaną jako klucz wpisu.
+    #  @param path Ścieżka do pliku.
+    #  @return Krotka (urządzenie, i-węzeł, rozmiar, mtime_ns).
+    @staticmethod
+    def file_identity(path):
+        info = os.stat(path)
+        return info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns
+
+    ## @brief Zwraca klucz wpisu dla dokumentu z podpisem odłączonym.
+    #  Takie wpisy przechowują tylko skrót treści i nie mogą zostać pomylone z wynikiem dla podpisu w pliku.
+    #  Skrót zależy od algorytmu z podpisu odłączonego, więc algorytm inny niż SHA-256 jest częścią klucza,
+    #  a dla podpisu łańcuchowego (skrót = wartość łańcucha) także podział dokumentu na segmenty.
+    #  @param key_fingerprint Odcisk klucza publicznego.
+    #  @param hash_name Algorytm skrótu treści.
+    #  @param layout Identyfikator podziału na segmenty (ChainedSignature.layout) lub None dla skrótu całości.
+    @staticmethod
+    def detached_key(key_fingerprint, hash_name=hash_backends.DEFAULT_ALGORITHM, layout=None):
+        prefix = "detached:" if hash_name == hash_backends.DEFAULT_ALGORITHM else f"detached:{hash_name}:"
+        if layout:
+            prefix += layout + ":"
+        return prefix + key_fingerprint
+
+    ## @brief Szuka zapamiętanego wyniku dla pliku i klucza.
+    #  Czas użycia trafienia jest tylko zapamiętywany w pamięci i zapisywany do bazy zbiorczo
+    #  (przy store, evict, close lub po TOUCH_BATCH trafieniach), więc odczyt nie wykonuje zatwierdzenia transakcji.
+    #  @param identity Tożsamość pliku z file_identity.
+    #  @param key_fingerprint Odcisk klucza publicznego.
+    #  @return Obiekt CachedVerdict lub None.
+    def lookup(self, identity, key_fingerprint):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT valid, digest, version FROM verdicts WHERE device=? AND inode=? AND size=? AND mtime_ns=?"
+                " AND key_fingerprint=?", (*identity, key_fingerprint)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[(*identity, key_fingerprint)] = time.time()
+            if len(self.touched) >= self.TOUCH_BATCH:
+                self._flush_touched_locked()
+                self.db.commit()
+        return CachedVerdict(bool(row[0]), bytes(row[1]), row[2])
+
+    ## @brief Zapisuje wynik weryfikacji.
+    #  @param identity Tożsamość pliku odczytana przed hashowaniem.
+    #  @param key_fingerprint Odcisk klucza publicznego.
+    #  @param digest Skrót SHA-256 treści.
+    #  @param valid Wynik weryfikacji.
+    #  @param version Wersja formatu podpisu.
+    def store(self, identity, key_fingerprint, digest, valid, version):
+        with self.lock:
+            self._flush_touched_locked()
+            self.db.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*identity, key_fingerprint, digest, int(valid), version, time.time()))
+            self.db.commit()
+            self.writes_since_evict += 1
+            if self.writes_since_evict >= self.EVICT_EVERY:
+                self._evict_locked()
+
+    ## @brief Usuwa wpisy pasujące do kryteriów.
+    #  @param path Plik, którego wpisy mają zostać usunięte (wszystkie wersje tego i-węzła).
+    #  @param key_fingerprint Klucz, którego wpisy mają zostać usunięte.
+    #  Bez argumentów czyści całą pamięć podręczną.
+    #  @return Liczba usuniętych wpisów.
+    def invalidate(self, path=None, key_fingerprint=None):
+        conditions, params = [], []
+        if path is not None:
+            info = os.stat(path)
+            conditions.append("device=? AND inode=?")
+            params += [info.st_dev, info.st_ino]
+        if key_fingerprint is not None:
+            conditions.append("key_fingerprint=?")
+            params.append(key_fingerprint)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with self.lock:
+            removed = self.db.execute("DELETE FROM verdicts" + where, params).rowcount
+            self.db.commit()
+        return removed
+
+    ## @brief Usuwa najdawniej używane wpisy ponad limit max_entries.
+    def evict(self):
+        with self.lock:
+            self._evict_locked()
+
+    ## @brief Zapisuje zmiany i zamyka bazę.
+    def close(self):
+        with self.lock:
+            self._evict_locked()
+            self.db.close()
+
+    def _flush_touched_locked(self):
+        if not self.touched:
+            return
+        self.db.executemany(
+            "UPDATE verdicts SET last_used=? WHERE device=? AND inode=? AND size=? AND mtime_ns=?"
+            " AND key_fingerprint=?", [(used, *entry) for entry, used in self.touched.items()])
+        self.touched.clear()
+
+    def _evict_locked(self):
+        self.writes_since_evict = 0
+        if self.touched:
+            self._flush_touched_locked()
+            self.db.commit()
+        count = self.db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        if count > self.max_entries:
+            self.db.execute(
+                "DELETE FROM verdicts WHERE rowid IN (SELECT rowid FROM verdicts ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+            self.db.commit()
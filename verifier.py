@@ -3,9 +3,12 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from Cryptodome.Hash import SHA256
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+from signature_checker import PDFSignatureChecker
+from task_executor import Task, TaskExecutor
+from utils import PublicKeyCache
+
+## @brief Wspólna pamięć podręczna kluczy publicznych wybieranych w GUI.
+KEY_CACHE = PublicKeyCache()
 ## @class PDFSelector
 #  @brief Klasa zawierająca metody do wyboru plików PDF i kluczy publicznych z dysku.
 class PDFSelector:
@@ -29,34 +32,7 @@ class PDFSelector:
         )
         if not path:
             return None
-        with open(path, 'rb') as keyfile:
-            key_bytes = keyfile.read()
-        return serialization.load_pem_public_key(key_bytes)
-## @class PDFSignatureChecker
-#  @brief Klasa odpowiadająca za weryfikację podpisów PDF.
-class PDFSignatureChecker:
-    ## @brief Inicjalizuje weryfikator.
-    #  @param document_path Ścieżka do podpisanego PDF.
-    #  @param rsa_pub_key Klucz publiczny RSA do weryfikacji.
-    def __init__(self, document_path, rsa_pub_key):
-        self.pdf_path = document_path
-        self.pub_key = rsa_pub_key
-        self.data = None
-        self.signature = None
-        self.content = None
-
-    ## @brief Oddziela treść pliku PDF od podpisu (ostatnie 512 bajtów).
-    def split_content_and_signature(self):
-        with open(self.pdf_path, 'rb') as f:
-            self.data = f.read()
-        self.signature = self.data[-512:]
-        self.content = self.data[:-512]
-
-    ## @brief Weryfikuje podpis przy pomocy klucza publicznego.
-    #  @throw InvalidSignature gdy podpis się nie zgadza.
-    def perform_check(self):
-        document_hash = SHA256.new(self.content).digest()
-        self.pub_key.verify(self.signature, document_hash, padding.PKCS1v15(), hashes.SHA256())
+        return KEY_CACHE.load_file(path)[1]
 ## @class VerifierGui
 #  @brief Prosty interfejs graficzny do weryfikacji podpisu pliku PDF.
 class VerifierGui(tk.Tk):
@@ -66,14 +42,20 @@ class VerifierGui(tk.Tk):
         self.title("Document Signature Checker")
         self.geometry("320x160")
         self.resizable(False, False)
+        self.executor = TaskExecutor(self)
+        self.current_task = None
         self.setup_interface()
 
     ## @brief Tworzy przyciski w GUI.
     def setup_interface(self):
         button = tk.Button(self, text="Verify PDF Signature", command=self.start_verification, padx=12, pady=6)
         button.pack(expand=True)
+        self.status = tk.Label(self, text="", wraplength=300)
+        self.status.pack()
+        tk.Button(self, text="Cancel", command=self.cancel_verification).pack(pady=4)
 
     ## @brief Obsługuje logikę weryfikacji po kliknięciu przycisku.
+    #  Sama weryfikacja wykonywana jest w tle; kolejne kliknięcia kolejkują następne dokumenty.
     def start_verification(self):
         pdf_path = PDFSelector.pick_signed_pdf()
         if not pdf_path:
@@ -85,10 +67,24 @@ class VerifierGui(tk.Tk):
             messagebox.showerror("Missing", "Public key was not provided.")
             return
 
-        try:
-            verifier = PDFSignatureChecker(pdf_path, pub_key)
-            verifier.split_content_and_signature()
-            verifier.perform_check()
-            messagebox.showinfo("Success", "Signature is VALID. File was not modified.")
-        except Exception as err:
-            messagebox.showerror("Failed", f"Signature check FAILED:\n{type(err).__name__}: {err}")
\ No newline at end of file
+        verifier = PDFSignatureChecker(pdf_path, pub_key)
+        self.current_task = self.executor.submit(
+            os.path.basename(pdf_path),
+            lambda task: verifier.perform_streaming_check(progress=task.report),
+            os.path.getsize(pdf_path),
+            on_update=lambda task: self.status.config(text=task.describe()),
+            on_done=self.verification_finished)
+
+    ## @brief Anuluje ostatnio zlecone sprawdzenie.
+    def cancel_verification(self):
+        if self.current_task is not None:
+            self.current_task.cancel()
+
+    ## @brief Pokazuje wynik zakończonej weryfikacji.
+    #  @param task Obiekt Task.
+    def verification_finished(self, task):
+        if task.state == Task.DONE:
+            messagebox.showinfo("Success", f"{task.name}\nSignature is VALID. File was not modified.")
+        elif task.state == Task.FAILED:
+            err = task.error
+            messagebox.showerror("Failed", f"{task.name}\nSignature check FAILED:\n{type(err).__name__}: {err}")